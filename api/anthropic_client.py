@@ -2,7 +2,7 @@
 import asyncio
 import time
 import logging
-from typing import List, Dict, Any, AsyncGenerator
+from typing import List, Dict, Any, AsyncGenerator, AsyncIterator, Optional
 from api.base_client import APIClient
 from config import ANTHROPIC_API_KEY
 
@@ -11,12 +11,15 @@ logger = logging.getLogger(__name__)
 class AnthropicClient(APIClient):
     """Klient API Anthropic (Claude) z obsługą błędów i ponawianiem"""
     
-    def __init__(self, api_key: str = ANTHROPIC_API_KEY, max_retries: int = 3, retry_delay: float = 1.0):
+    def __init__(self, api_key: str = ANTHROPIC_API_KEY, max_retries: int = 3, retry_delay: float = 1.0, http_client=None):
         super().__init__(max_retries, retry_delay)
-        from httpx import AsyncClient
         from anthropic import AsyncAnthropic
         
-        self.client = AsyncAnthropic(api_key=api_key)
+        if http_client is None:
+            from api.http_client import create_http_client
+            http_client = create_http_client()
+        # Ponawianiem zajmuje się _request_with_retry - wbudowane ponowienia SDK mnożyłyby zapytania przy 429
+        self.client = AsyncAnthropic(api_key=api_key, http_client=http_client, max_retries=0)
         logger.info(f"Klient Anthropic zainicjalizowany z kluczem API: {'ważny' if api_key else 'brak'}")
     
     async def chat_completion(self, messages: List[Dict[str, str]], model: str = "claude-3-5-sonnet", stream: bool = False, **kwargs) -> Any:
@@ -91,7 +94,8 @@ class AnthropicClient(APIClient):
             
         anthropic_messages = self._convert_to_anthropic_format(messages)
         
-        response = await self.client.messages.create(
+        response = await self._request_with_retry(
+            self.client.messages.create,
             model=model,
             messages=anthropic_messages,
             system=system_prompt,
@@ -104,6 +108,11 @@ class AnthropicClient(APIClient):
     
     async def chat_completion_stream(self, messages: List[Dict[str, str]], model: str = "claude-3-5-sonnet", **kwargs) -> AsyncGenerator[str, None]:
         """Generuje strumieniową odpowiedź czatu"""
+        async for chunk in super().chat_completion_stream(messages, model, **kwargs):
+            yield chunk
+    
+    async def _open_stream(self, messages: List[Dict[str, str]], model: str, **kwargs) -> AsyncIterator[str]:
+        """Nawiązuje strumień odpowiedzi Anthropic"""
         system_prompt = None
         if messages and messages[0]['role'] == 'system':
             system_prompt = messages[0]['content']
@@ -111,16 +120,29 @@ class AnthropicClient(APIClient):
             
         anthropic_messages = self._convert_to_anthropic_format(messages)
         
+        params = dict(kwargs)
         stream = await self.client.messages.create(
             model=model,
             messages=anthropic_messages,
             system=system_prompt,
-            max_tokens=kwargs.pop('max_tokens', 4096),
-            temperature=kwargs.pop('temperature', 0.7),
+            max_tokens=params.pop('max_tokens', 4096),
+            temperature=params.pop('temperature', 0.7),
             stream=True,
-            **kwargs
+            **params
         )
-        
-        async for chunk in stream:
-            if chunk.delta.text:
-                yield chunk.delta.text
\ No newline at end of file
+        return self._iter_text(stream)
+    
+    @staticmethod
+    async def _iter_text(stream) -> AsyncGenerator[str, None]:
+        """Wyciąga fragmenty tekstu ze zdarzeń strumienia Anthropic (pozostałe zdarzenia nie mają delta.text)"""
+        try:
+            async for event in stream:
+                if event.type == "content_block_delta" and getattr(event.delta, 'text', None):
+                    yield event.delta.text
+        finally:
+            await stream.close()
+    
+    def _continuation_messages(self, messages: List[Dict[str, str]], partial_text: str) -> Optional[List[Dict[str, str]]]:
+        """Claude kontynuuje odpowiedź od podanego początku wiadomości asystenta"""
+        # API odrzuca wiadomość asystenta zakończoną białym znakiem
+        return messages + [{"role": "assistant", "content": partial_text.rstrip()}]
\ No newline at end of file
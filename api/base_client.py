@@ -1,11 +1,63 @@
 # api/base_client.py
 import logging
 import time
+import random
 import asyncio
-from typing import Any, Dict, Optional, Callable
+import inspect
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Callable, AsyncGenerator, AsyncIterator
+from config import API_MAX_RETRY_AFTER, STREAM_FIRST_TOKEN_TIMEOUTS, STREAM_STALL_TIMEOUT, STREAM_MAX_RECONNECTS
 
 logger = logging.getLogger(__name__)
 
+# Kody HTTP, po których ponowienie zapytania ma szansę się powieść (529 - przeciążenie Anthropic)
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Błędy sieciowe SDK OpenAI/Anthropic (APIConnectionError, APITimeoutError) i httpx (TransportError)
+RETRYABLE_ERROR_TYPES = {"APIConnectionError", "TransportError"}
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Zwraca kod HTTP odpowiedzi, która spowodowała błąd"""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None:
+        status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code
+
+def is_retryable_error(error: Exception) -> bool:
+    """Sprawdza, czy błąd jest przejściowy (przeciążenie, limit, błąd sieci)"""
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+    return any(cls.__name__ in RETRYABLE_ERROR_TYPES for cls in type(error).__mro__)
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Zwraca czas oczekiwania (s) z nagłówków retry-after-ms / retry-after odpowiedzi"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+
+        retry_after = headers.get('retry-after')
+        if not retry_after:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            # Nagłówek w formacie daty HTTP
+            return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class StreamStalledError(Exception):
+    """Strumień odpowiedzi modelu zawiesił się lub został zerwany i nie udało się go wznowić"""
+    
+    def __init__(self, message: str, partial_text: str = ""):
+        super().__init__(message)
+        self.partial_text = partial_text
+
 class APIClient:
     """Bazowa klasa dla klientów API z wspólną funkcjonalnością"""
     
@@ -14,27 +66,102 @@ class APIClient:
         self.retry_delay = retry_delay
     
     async def _request_with_retry(self, request_func, *args, **kwargs) -> Any:
-        """Wykonuje żądanie z logiką ponawiania"""
-        retries = 0
-        last_error = None
+        """
+        Wykonuje żądanie z logiką ponawiania
+        
+        Ponawiane są tylko błędy przejściowe (is_retryable_error). Czas oczekiwania wynika
+        z nagłówka retry-after, a bez niego - z wykładniczego opóźnienia z losowym rozrzutem.
+        """
+        attempt = 0
         
-        while retries < self.max_retries:
+        while True:
             try:
-                # Rozróżnienie między funkcjami sync i async
-                if asyncio.iscoroutinefunction(request_func):
-                    return await request_func(*args, **kwargs)
-                else:
-                    # Dla funkcji synchronicznych nie używamy await
-                    return request_func(*args, **kwargs)
+                # Metody SDK (np. chat.completions.create) są opakowane dekoratorami i nie są
+                # rozpoznawane jako funkcje async - sprawdzamy wynik zamiast samej funkcji
+                result = request_func(*args, **kwargs)
+                if inspect.isawaitable(result):
+                    result = await result
+                return result
             except Exception as e:
-                retries += 1
-                last_error = e
-                logger.warning(f"Żądanie API nie powiodło się (próba {retries}/{self.max_retries}): {str(e)}")
+                attempt += 1
+                
+                if not is_retryable_error(e):
+                    raise
+                
+                if attempt >= self.max_retries:
+                    logger.error(f"Żądanie API nie powiodło się po {attempt} próbach: {str(e)}")
+                    raise
+                
+                sleep_time = self._get_retry_delay(e, attempt)
+                if sleep_time is None:
+                    logger.error(f"Żądanie API nie powiodło się, serwer wymaga zbyt długiego oczekiwania: {str(e)}")
+                    raise
                 
-                if retries < self.max_retries:
-                    sleep_time = self.retry_delay * (2 ** (retries - 1))
-                    logger.info(f"Ponowna próba za {sleep_time:.2f} sekund...")
-                    await asyncio.sleep(sleep_time)
+                logger.warning(f"Żądanie API nie powiodło się (próba {attempt}/{self.max_retries}): {str(e)}")
+                logger.info(f"Ponowna próba za {sleep_time:.2f} sekund...")
+                await asyncio.sleep(sleep_time)
+    
+    def _get_retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Zwraca opóźnienie przed kolejną próbą lub None, jeśli nie warto czekać"""
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return retry_after if retry_after <= API_MAX_RETRY_AFTER else None
+        
+        # Losowy rozrzut zapobiega jednoczesnym ponowieniom wielu zapytań
+        return random.uniform(0, self.retry_delay * (2 ** (attempt - 1)))
+    
+    async def _open_stream(self, messages: List[Dict[str, str]], model: str, **kwargs) -> AsyncIterator[str]:
+        """Nawiązuje strumień odpowiedzi i zwraca iterator fragmentów tekstu (implementują klienci dostawców)"""
+        raise NotImplementedError
+    
+    def _continuation_messages(self, messages: List[Dict[str, str]], partial_text: str) -> Optional[List[Dict[str, str]]]:
+        """Zwraca wiadomości kontynuujące przerwaną odpowiedź lub None, jeśli dostawca tego nie obsługuje"""
+        return None
+    
+    async def chat_completion_stream(self, messages: List[Dict[str, str]], model: str, **kwargs) -> AsyncGenerator[str, None]:
+        """
+        Generuje strumieniową odpowiedź czatu pod nadzorem
+        
+        Nawiązanie połączenia jest ponawiane jak każde zapytanie. Brak pierwszego tokenu
+        w STREAM_FIRST_TOKEN_TIMEOUTS lub przerwa dłuższa niż STREAM_STALL_TIMEOUT (albo
+        zerwane połączenie) powoduje ponowne połączenie - od początku, jeśli nic jeszcze
+        nie zostało wysłane, lub z kontynuacją odpowiedzi, jeśli dostawca ją obsługuje.
+        W pozostałych przypadkach zgłaszany jest StreamStalledError.
+        """
+        first_token_timeout = STREAM_FIRST_TOKEN_TIMEOUTS.get(model, STREAM_FIRST_TOKEN_TIMEOUTS["default"])
+        request_messages = messages
+        partial_text = ""
+        reconnects = 0
+        
+        while True:
+            stream = await self._request_with_retry(self._open_stream, request_messages, model, **kwargs)
+            received = False
+            
+            try:
+                while True:
+                    timeout = STREAM_STALL_TIMEOUT if received else first_token_timeout
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                    except StopAsyncIteration:
+                        return
                     
-        logger.error(f"Żądanie API nie powiodło się po {self.max_retries} próbach: {str(last_error)}")
-        raise last_error
\ No newline at end of file
+                    received = True
+                    partial_text += chunk
+                    yield chunk
+            except Exception as e:
+                if not isinstance(e, asyncio.TimeoutError) and not is_retryable_error(e):
+                    raise
+                
+                reason = "brak tokenów" if isinstance(e, asyncio.TimeoutError) else str(e)
+                reconnects += 1
+                if reconnects > STREAM_MAX_RECONNECTS:
+                    raise StreamStalledError(f"Strumień modelu {model} przerwany ({reason})", partial_text)
+                
+                if partial_text:
+                    request_messages = self._continuation_messages(messages, partial_text)
+                    if request_messages is None:
+                        raise StreamStalledError(f"Strumień modelu {model} przerwany ({reason})", partial_text)
+                
+                logger.warning(f"Strumień modelu {model} przerwany ({reason}) - ponowne połączenie")
+            finally:
+                await stream.aclose()
@@ -0,0 +1,28 @@
+# api/http_client.py
+import logging
+import httpx
+from config import HTTP_TIMEOUT, HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS, HTTP_KEEPALIVE_EXPIRY
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 wymaga pakietu h2 - bez niego używamy HTTP/1.1 z keep-alive
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def create_http_client(**kwargs) -> httpx.AsyncClient:
+    """Tworzy klienta httpx ze wspólnymi ustawieniami puli połączeń"""
+    client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+        ),
+        **kwargs
+    )
+    logger.info(f"Utworzono pulę połączeń HTTP (HTTP/2: {'tak' if HTTP2_AVAILABLE else 'nie'})")
+    return client
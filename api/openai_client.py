@@ -1,9 +1,8 @@
 # Modyfikacja w api/openai_client.py
 
-import asyncio
 import time
 import logging
-from typing import List, Dict, Any, AsyncGenerator
+from typing import List, Dict, Any, AsyncGenerator, AsyncIterator
 from openai import AsyncOpenAI
 from api.base_client import APIClient
 from config import OPENAI_API_KEY, DEFAULT_MODEL, DALL_E_MODEL
@@ -13,11 +12,13 @@ logger = logging.getLogger(__name__)
 class OpenAIClient(APIClient):
     """Klient API OpenAI z obsługą błędów i ponawianiem"""
     
-    def __init__(self, api_key: str = OPENAI_API_KEY, max_retries: int = 3, retry_delay: float = 1.0):
+    def __init__(self, api_key: str = OPENAI_API_KEY, max_retries: int = 3, retry_delay: float = 1.0, http_client=None):
         super().__init__(max_retries, retry_delay)
-        from httpx import AsyncClient
-        http_client = AsyncClient()
-        self.client = AsyncOpenAI(api_key=api_key, http_client=http_client)
+        if http_client is None:
+            from api.http_client import create_http_client
+            http_client = create_http_client()
+        # Ponawianiem zajmuje się _request_with_retry - wbudowane ponowienia SDK mnożyłyby zapytania przy 429
+        self.client = AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
         logger.info(f"Klient OpenAI zainicjalizowany z kluczem API: {'ważny' if api_key else 'brak'}")
         
         # Mapowanie modeli na identyfikatory API
@@ -32,9 +33,6 @@ class OpenAIClient(APIClient):
             # Mapowanie identyfikatorów modeli na identyfikatory API
             actual_model = self.model_mapping.get(model, model)
             
-            if "gpt-4" in model and not stream:
-                await asyncio.sleep(0.5)
-                
             logger.info(f"Używam modelu API: {actual_model} (wewnętrzny: {model})")
             
             return await self._request_with_retry(
@@ -56,11 +54,37 @@ class OpenAIClient(APIClient):
     
     async def chat_completion_stream(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, **kwargs) -> AsyncGenerator[str, None]:
         """Generuje strumieniową odpowiedź czatu"""
-        stream = await self.chat_completion(messages, model, stream=True, **kwargs)
-        
-        async for chunk in stream:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
+        async for chunk in super().chat_completion_stream(messages, model, **kwargs):
+            yield chunk
+    
+    async def _open_stream(self, messages: List[Dict[str, str]], model: str, **kwargs) -> AsyncIterator[str]:
+        """Nawiązuje strumień odpowiedzi OpenAI"""
+        stream = await self.client.chat.completions.create(
+            model=self.model_mapping.get(model, model),
+            messages=messages,
+            stream=True,
+            **kwargs
+        )
+        return self._iter_text(stream)
+    
+    @staticmethod
+    async def _iter_text(stream) -> AsyncGenerator[str, None]:
+        """Wyciąga fragmenty tekstu ze zdarzeń strumienia OpenAI"""
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+    
+    async def create_embedding(self, text: str, model: str = "text-embedding-3-small") -> List[float]:
+        """Zwraca embedding tekstu"""
+        response = await self._request_with_retry(
+            self.client.embeddings.create,
+            model=model,
+            input=text
+        )
+        return response.data[0].embedding
     
     async def generate_image(self, prompt: str, model: str = DALL_E_MODEL, size: str = "1024x1024", n: int = 1, **kwargs) -> str:
         """Generuje obraz za pomocą DALL-E"""
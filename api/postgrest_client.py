@@ -0,0 +1,109 @@
+# api/postgrest_client.py
+import logging
+from typing import Dict, List, Any, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class PostgrestClient:
+    """Asynchroniczny klient PostgREST (Supabase REST API) oparty na httpx.AsyncClient"""
+
+    def __init__(self, url: str, key: str, timeout: float = 10.0,
+                 max_connections: int = 50, max_keepalive_connections: int = 20,
+                 keepalive_expiry: float = 30.0):
+        # Jedna pula połączeń keep-alive współdzielona przez wszystkie repozytoria
+        self.http = httpx.AsyncClient(
+            base_url=f"{url.rstrip('/')}/rest/v1",
+            headers={
+                "apikey": key,
+                "Authorization": f"Bearer {key}",
+                "Content-Type": "application/json"
+            },
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            )
+        )
+        logger.info("Klient PostgREST zainicjalizowany")
+
+    @staticmethod
+    def _format_value(value: Any) -> str:
+        """Formatuje wartość filtra zgodnie ze składnią PostgREST"""
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if value is None:
+            return "null"
+        return str(value)
+
+    def _build_params(self, columns: Optional[str], filters: Optional[Dict],
+                      order_by: Optional[str], limit: Optional[int]) -> Dict[str, str]:
+        """Buduje parametry zapytania PostgREST"""
+        params = {}
+
+        if columns:
+            params["select"] = columns
+
+        if filters:
+            for key, value in filters.items():
+                # Wartość (operator, wartość) pozwala użyć innego operatora niż eq, np. ("lt", 100)
+                if isinstance(value, tuple):
+                    operator, value = value
+                else:
+                    operator = "is" if value is None else "eq"
+                params[key] = f"{operator}.{self._format_value(value)}"
+
+        if order_by:
+            desc = order_by.startswith("-")
+            field = order_by[1:] if desc else order_by
+            params["order"] = f"{field}.{'desc' if desc else 'asc'}"
+
+        if limit:
+            params["limit"] = str(limit)
+
+        return params
+
+    async def execute(self, table: str, query_type: str = "select",
+                      columns: str = "*", filters: Optional[Dict] = None,
+                      data: Optional[Any] = None, order_by: Optional[str] = None,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Wykonuje zapytanie do tabeli i zwraca listę wierszy"""
+        headers = {}
+
+        if query_type == "select":
+            params = self._build_params(columns, filters, order_by, limit)
+            response = await self.http.get(f"/{table}", params=params)
+        elif query_type == "insert":
+            headers["Prefer"] = "return=representation"
+            params = self._build_params(columns, None, None, None)
+            response = await self.http.post(f"/{table}", params=params, json=data, headers=headers)
+        elif query_type == "update":
+            headers["Prefer"] = "return=representation"
+            params = self._build_params(columns, filters, None, None)
+            response = await self.http.patch(f"/{table}", params=params, json=data, headers=headers)
+        elif query_type == "delete":
+            headers["Prefer"] = "return=representation"
+            params = self._build_params(None, filters, None, None)
+            response = await self.http.delete(f"/{table}", params=params, headers=headers)
+        else:
+            raise ValueError(f"Nieobsługiwany typ zapytania: {query_type}")
+
+        response.raise_for_status()
+
+        if not response.content:
+            return []
+        return response.json()
+
+    async def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Wywołuje funkcję Postgres wystawioną jako RPC"""
+        response = await self.http.post(f"/rpc/{function}", json=params or {})
+        response.raise_for_status()
+
+        if not response.content:
+            return None
+        return response.json()
+
+    async def aclose(self) -> None:
+        """Zamyka pulę połączeń"""
+        await self.http.aclose()
@@ -3,6 +3,7 @@ import logging
 from typing import Dict, List, Any, Optional
 from supabase import create_client
 from api.base_client import APIClient
+from api.postgrest_client import PostgrestClient
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,10 @@ class SupabaseClient(APIClient):
         except Exception as e:
             logger.error(f"Błąd inicjalizacji klienta Supabase: {e}")
             self.client = self._create_dummy_client()
+        
+        # Asynchroniczny silnik zapytań używany przez repozytoria
+        # (self.client pozostaje dla bezpośredniego dostępu w starszym kodzie)
+        self.rest = PostgrestClient(url, key) if url and key else None
     
     def _create_dummy_client(self) -> Any:
         """Tworzy zastępczy klient dla płynnej degradacji"""
@@ -39,44 +44,58 @@ class SupabaseClient(APIClient):
     async def query(self, table: str, query_type: str = "select", 
                    columns: str = "*", filters: Optional[Dict] = None,
                    data: Optional[Dict] = None, order_by: Optional[str] = None,
-                   limit: Optional[int] = None) -> List:
-        """Wykonuje zapytanie do Supabase"""
-        query = self.client.table(table)
-        
-        # Budowanie zapytania
-        if query_type == "select":
-            query = query.select(columns)
-        elif query_type == "insert" and data:
-            query = query.insert(data)
-        elif query_type == "update" and data:
-            query = query.update(data)
-        elif query_type == "delete":
-            query = query.delete()
-        
-        # Stosowanie filtrów
-        if filters:
-            for key, value in filters.items():
-                query = query.eq(key, value)
+                   limit: Optional[int] = None, raise_errors: bool = False) -> List:
+        """
+        Wykonuje zapytanie do Supabase przez asynchroniczny klient PostgREST
         
-        # Stosowanie sortowania
-        if order_by:
-            desc = order_by.startswith("-")
-            field = order_by[1:] if desc else order_by
-            query = query.order(field, desc=desc)
+        Domyślnie błąd zapytania jest logowany i zwracana jest pusta lista. Z raise_errors=True
+        błąd jest zgłaszany dalej - gdy pusty wynik musi oznaczać brak wiersza, a nie awarię.
+        """
+        if self.rest is None:
+            logger.warning("Brak klienta PostgREST - brak połączenia z bazą danych")
+            if raise_errors:
+                raise ConnectionError("Brak klienta PostgREST")
+            return []
         
-        # Stosowanie limitu
-        if limit:
-            query = query.limit(limit)
+        # Ponawiane są tylko odczyty - zapis mógł zostać zatwierdzony mimo błędu (5xx, timeout),
+        # a jego ponowienie zduplikowałoby wiersze (wiadomości, transakcje)
+        request = self._request_with_retry if query_type == "select" else self._request_once
         
         try:
-            # Poprawione: używamy _execute_query_sync zamiast _execute_query
-            response = await self._request_with_retry(self._execute_query_sync, query)
-            return response.data
+            return await request(
+                self.rest.execute,
+                table,
+                query_type=query_type,
+                columns=columns,
+                filters=filters,
+                data=data,
+                order_by=order_by,
+                limit=limit
+            )
         except Exception as e:
             logger.error(f"Błąd zapytania Supabase: {e}")
+            if raise_errors:
+                raise
+            return []
+    
+    @staticmethod
+    async def _request_once(request_func, *args, **kwargs) -> Any:
+        """Wykonuje żądanie bez ponawiania"""
+        return await request_func(*args, **kwargs)
+    
+    async def rpc(self, function: str, params: Optional[Dict[str, Any]] = None) -> List:
+        """Wywołuje funkcję RPC w Supabase i zwraca listę wierszy wyniku"""
+        if self.rest is None:
+            logger.warning("Brak klienta PostgREST - brak połączenia z bazą danych")
+            return []
+        
+        # Bez ponawiania - operacje RPC (np. odejmowanie kredytów) nie są idempotentne
+        result = await self.rest.rpc(function, params)
+        if result is None:
             return []
+        return result if isinstance(result, list) else [result]
     
-    # Nowa metoda, która wykonuje zapytanie synchronicznie (bez await)
-    def _execute_query_sync(self, query):
-        """Wykonuje zapytanie synchronicznie - bez użycia await"""
-        return query.execute()
\ No newline at end of file
+    async def close(self) -> None:
+        """Zamyka pulę połączeń HTTP"""
+        if self.rest is not None:
+            await self.rest.aclose()
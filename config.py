@@ -12,6 +12,20 @@ BOT_VERSION = "1.0.0"
 
 # Konfiguracja Telegram
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
+# Adres Bot API - można wskazać lokalny fake_telegram_server.py do testów obciążeniowych
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', 'https://api.telegram.org/bot')
+
+# Tryb odbierania aktualizacji: "polling" lub "webhook"
+BOT_RUN_MODE = os.getenv('BOT_RUN_MODE', 'polling')
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'false').lower() == 'true'
+
+# Konfiguracja trybu webhook
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # Publiczny adres, pod którym Telegram wysyła aktualizacje
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
 
 # Konfiguracja OpenAI
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
@@ -206,6 +220,104 @@ CHAT_MODES = {
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
+# Współbieżne przetwarzanie aktualizacji (aktualizacje jednego użytkownika są przetwarzane po kolei)
+MAX_CONCURRENT_UPDATES = 64
+
+# Maksymalna liczba równoległych zapytań do poszczególnych modeli
+MODEL_CONCURRENCY_LIMITS = {
+    "gpt-4": 8,
+    "o1": 4,
+    "claude-3-opus": 4,
+    "gpt-4o": 16,
+    "claude-3-5-sonnet": 16,
+    "default": 32
+}
+
+# Maksymalna liczba równoległych zapytań do dostawcy (wszystkie jego modele łącznie)
+PROVIDER_CONCURRENCY_LIMITS = {
+    "openai": 64,
+    "anthropic": 32,
+    "default": 32
+}
+
+# Budżet tokenów na minutę per model (None = bez limitu)
+MODEL_TPM_LIMITS = {
+    "gpt-4": 40000,
+    "o1": 150000,
+    "gpt-4o": 450000,
+    "claude-3-opus": 80000,
+    "claude-3-5-sonnet": 160000,
+    "default": None
+}
+
+# Modele zapasowe używane po awarii modelu (w podanej kolejności)
+MODEL_FALLBACK_CHAINS = {
+    "gpt-4o": ["claude-3-5-sonnet", "gpt-3.5-turbo"],
+    "gpt-4": ["gpt-4o", "claude-3-5-sonnet"],
+    "o1": ["gpt-4o", "claude-3-5-sonnet"],
+    "o3-mini": ["gpt-3.5-turbo", "claude-3-5-haiku"],
+    "gpt-3.5-turbo": ["claude-3-5-haiku", "claude-3-haiku"],
+    "claude-3-opus": ["claude-3-5-sonnet", "gpt-4o"],
+    "claude-3-5-sonnet": ["gpt-4o", "gpt-3.5-turbo"],
+    "claude-3-5-haiku": ["gpt-3.5-turbo", "claude-3-haiku"],
+    "claude-3-haiku": ["gpt-3.5-turbo"]
+}
+
+# Modele zapasowe dla domyślnego modelu trybu czatu (zastępują MODEL_FALLBACK_CHAINS)
+MODE_FALLBACK_CHAINS = {
+    "code_developer": ["claude-3-5-sonnet", "gpt-3.5-turbo"],
+    "legal_advisor": ["gpt-4o", "claude-3-5-sonnet"],
+    "financial_expert": ["gpt-4o", "claude-3-5-sonnet"],
+    "academic_researcher": ["claude-3-5-sonnet", "gpt-4o"]
+}
+
+# Po ilu sekundach bez pierwszego tokenu wysłać równoległe zapytanie do modelu zapasowego
+# innego dostawcy (None = bez zapytań zabezpieczających)
+MODEL_HEDGE_DELAYS = {
+    "gpt-4o": 8.0,
+    "claude-3-5-sonnet": 8.0,
+    "default": None
+}
+
+# Ocena dostępności modeli
+MODEL_HEALTH_MIN_SCORE = 0.5  # Próg skuteczności (średnia krocząca), poniżej którego model jest wyłączany
+MODEL_CIRCUIT_FAILURES = 3  # Liczba kolejnych błędów wyłączająca model
+MODEL_CIRCUIT_COOLDOWN = 60.0  # Czas wyłączenia modelu (s)
+
+# Kolejka zapytań do modelu: maksymalna liczba oczekujących i czas oczekiwania (s)
+MODEL_QUEUE_MAX_SIZE = 100
+MODEL_QUEUE_TIMEOUT = 30.0
+
+# Maksymalny czas oczekiwania wskazany w retry-after, przy którym ponawiamy zapytanie (s)
+API_MAX_RETRY_AFTER = 20.0
+
+# Nadzór nad strumieniami odpowiedzi modeli
+STREAM_FIRST_TOKEN_TIMEOUTS = {  # Maksymalny czas oczekiwania na pierwszy token (s)
+    "o1": 120.0,  # Model rozumujący zaczyna odpowiadać później
+    "default": 30.0
+}
+STREAM_STALL_TIMEOUT = 20.0  # Maksymalna przerwa między kolejnymi tokenami (s)
+STREAM_MAX_RECONNECTS = 1  # Liczba ponownych połączeń po zawieszeniu lub zerwaniu strumienia
+
+# Wspólna pula połączeń HTTP do API modeli
+HTTP_TIMEOUT = 60.0  # sekundy
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 60.0  # sekundy
+
+# Strumieniowanie odpowiedzi w Telegramie
+TELEGRAM_MESSAGE_LIMIT = 4096  # Maksymalna długość wiadomości (znaki)
+STREAM_EDIT_MIN_INTERVAL = 1.0  # Minimalny odstęp między edycjami wiadomości (s)
+STREAM_EDIT_MAX_INTERVAL = 5.0  # Maksymalny odstęp po przekroczeniu limitów Telegrama (s)
+STREAM_FINAL_EDIT_ATTEMPTS = 3  # Liczba prób dostarczenia ostatecznej treści odpowiedzi
+
+# Limity wysyłki wiadomości przez Bot API
+TELEGRAM_GLOBAL_RATE_LIMIT = 30  # wiadomości na sekundę łącznie
+TELEGRAM_CHAT_RATE_LIMIT = 1.0  # wiadomości na sekundę w czacie prywatnym
+TELEGRAM_CHAT_BURST = 3  # chwilowy zapas wiadomości w jednym czacie
+TELEGRAM_GROUP_RATE_LIMIT = 20 / 60  # wiadomości na sekundę w grupie
+TELEGRAM_MAX_RETRIES = 3  # ponowienia wywołania po odpowiedzi 429
+
 # Konfiguracja subskrypcji - zmiana na model ilości wiadomości
 MESSAGE_PLANS = {
     100: {"name": "Pakiet Podstawowy", "price": 25.00},
@@ -217,6 +329,95 @@ MESSAGE_PLANS = {
 # Maksymalna długość kontekstu (historia konwersacji)
 MAX_CONTEXT_MESSAGES = 20
 
+# Budżet tokenów historii w prompcie (ograniczany dodatkowo oknem kontekstu modelu)
+CONTEXT_TOKEN_BUDGET = 8000
+# Liczba tokenów zarezerwowana na odpowiedź modelu
+RESPONSE_TOKEN_RESERVE = 4096
+
+# Streszczanie długich konwersacji
+SUMMARY_MODEL = "gpt-3.5-turbo"  # Tani model używany do streszczeń
+SUMMARY_TRIGGER_TOKENS = 3000  # Próg tokenów nieobjętej streszczeniem historii
+SUMMARY_KEEP_RECENT_MESSAGES = 6  # Liczba najnowszych wiadomości pozostawianych w oryginale
+SUMMARY_PAGE_SIZE = 100  # Liczba wiadomości pobieranych jednym zapytaniem przy zbieraniu historii do streszczenia
+
+# Okna kontekstu modeli (w tokenach)
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+    "o1": 200000,
+    "o3-mini": 128000,
+    "claude-3-5-sonnet": 200000,
+    "claude-3-5-haiku": 200000,
+    "claude-3-haiku": 200000,
+    "claude-3-opus": 200000,
+    "default": 8192
+}
+
+# Analizy kredytów (dzienne podsumowania transakcji liczone w bazie)
+CREDIT_STATS_DAYS = 90  # Okres statystyk w menu kredytów (dni)
+CREDIT_HISTORY_LIMIT = 10  # Liczba ostatnich transakcji w historii
+CREDIT_TRANSACTIONS_MAX_ROWS = 1000  # Górny limit wierszy przy pobieraniu transakcji z okresu
+# Uzupełnianie rodzaju operacji w starszych transakcjach (przy starcie bota)
+CREDIT_BACKFILL_BATCH_SIZE = 1000  # Liczba transakcji w jednej partii
+CREDIT_BACKFILL_PAUSE = 0.5  # sekundy - przerwa między partiami
+
+# Cache stanu kredytów w pamięci procesu
+CREDITS_CACHE_TTL = 60  # sekundy
+CREDITS_CACHE_MAX_SIZE = 10000
+
+# Cache odpowiedzi modeli dla powtarzających się zapytań
+RESPONSE_CACHE_DB_PATH = os.getenv('RESPONSE_CACHE_DB_PATH', 'data/response_cache.sqlite3')
+RESPONSE_CACHE_MEMORY_SIZE = 2000  # Liczba odpowiedzi w pamięci procesu
+RESPONSE_CACHE_DISK_MAX_ENTRIES = 100000  # Liczba odpowiedzi w bazie na dysku
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # sekundy
+RESPONSE_CACHE_CREDIT_FACTOR = 0.5  # Część kosztu pobierana za odpowiedź z cache (1 - pełny koszt, 0 - bezpłatnie)
+# Tryby czatu, w których pierwsze pytanie rozmowy może zostać obsłużone z cache
+RESPONSE_CACHE_MODES = {"no_mode", "assistant", "brief_assistant", "travel_advisor", "nutritionist"}
+
+# Cache odpowiedzi dla niemal identycznych tekstów (tłumaczenia)
+SEMANTIC_CACHE_EMBEDDING_MODEL = "text-embedding-3-small"
+SEMANTIC_CACHE_THRESHOLD = 0.97  # Minimalne podobieństwo kosinusowe embeddingów
+SEMANTIC_CACHE_MIN_TEXT_SIMILARITY = 0.9  # Minimalne podobieństwo znakowe tekstów
+SEMANTIC_CACHE_MAX_ENTRIES = 5000  # Liczba wpisów w jednej partycji (języku docelowym)
+SEMANTIC_CACHE_MIN_CHARS = 40  # Krótsze teksty obsługuje tylko cache dokładny
+SEMANTIC_CACHE_MAX_CHARS = 4000  # Dłuższe teksty nie są porównywane
+
+# Cache profili użytkowników (język, tryb, model, subskrypcja)
+USER_PROFILE_CACHE_MAX_SIZE = 20000
+USER_PROFILE_TTL = 24 * 3600  # sekundy - maksymalny wiek profilu w cache
+USER_PROFILE_REFRESH_AFTER = 15 * 60  # sekundy - starszy profil jest odświeżany w tle
+USER_PROFILE_MISSING_TTL = 60  # sekundy - pamiętanie braku użytkownika w bazie
+USER_PROFILE_BATCH_DELAY = 0.05  # sekundy - okno zbierania profili do jednego zapytania
+USER_PROFILE_BATCH_SIZE = 100  # Liczba profili w jednym zapytaniu
+
+# Zapis wiadomości i liczników w tle (write-behind)
+WRITE_BEHIND_FLUSH_INTERVAL = 0.5  # sekundy - maksymalne opóźnienie zapisu
+WRITE_BEHIND_BATCH_SIZE = 100  # Liczba wiadomości w jednym zapytaniu
+WRITE_BEHIND_JOURNAL_PATH = os.getenv('WRITE_BEHIND_JOURNAL_PATH', 'data/write_behind_journal.jsonl')
+WRITE_BEHIND_REPLAY_INTERVAL = 30  # sekundy - ponowienie zapisu z dziennika przy niedostępnej bazie
+
+# Renderowanie wykresów w puli procesów
+CHART_RENDER_WORKERS = 2  # Liczba procesów roboczych
+CHART_RENDER_TIMEOUT = 15.0  # sekundy
+CHART_RENDER_DPI = 100
+CHART_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Łączny rozmiar wyrenderowanych wykresów w cache (bajty)
+
+# Grafiki statyczne - zmiana adresu (np. parametru ?v-) oznacza nową wersję grafiki
+LANGUAGE_BANNER_URL = "https://i.imgur.com/OiPImmC.png?v-111"  # Baner wyboru języka
+MAIN_BANNER_URL = "https://i.imgur.com/YPubLDE.png?v-1123"  # Baner menu głównego
+# Rejestr file_id grafik statycznych wysłanych do Telegrama
+MEDIA_REGISTRY_DB_PATH = os.getenv('MEDIA_REGISTRY_DB_PATH', 'data/media_files.sqlite3')
+
+# Trwałe przechowywanie chat_data (stan użytkowników) między restartami
+PERSISTENCE_DB_PATH = os.getenv('PERSISTENCE_DB_PATH', 'data/chat_data.sqlite3')
+PERSISTENCE_UPDATE_INTERVAL = 30  # Co ile sekund Application przekazuje zmienione chat_data
+PERSISTENCE_FLUSH_DELAY = 1.0  # Opóźnienie zbiorczego zapisu zmian do bazy (sekundy)
+
+# Cache ostatnich wiadomości aktywnych konwersacji w pamięci procesu
+CONTEXT_CACHE_MAX_CONVERSATIONS = 5000
+CONTEXT_CACHE_TTL = 3600  # sekundy
+
 # Program referencyjny
 REFERRAL_CREDITS = 50  # Kredyty za zaproszenie nowego użytkownika
 REFERRAL_BONUS = 25    # Bonus dla zaproszonego użytkownika
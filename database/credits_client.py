@@ -1,48 +1,82 @@
 # database/credits_client.py
-from services.api_service import APIService
-from services.repository_service import RepositoryService
+from services.api_service import get_api_service
+from services.repository_service import get_repository_service
+from utils.cache import TTLCache
+from config import CREDITS_CACHE_TTL, CREDITS_CACHE_MAX_SIZE
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Utworzenie globalnych instancji
-api_service = APIService()
-repository_service = RepositoryService(api_service.supabase)
+# Współdzielone instancje serwisów
+api_service = get_api_service()
+repository_service = get_repository_service()
+
+# Cache stanu kredytów - aktualizowany wynikami operacji dodawania/odejmowania
+credits_cache = TTLCache(maxsize=CREDITS_CACHE_MAX_SIZE, ttl=CREDITS_CACHE_TTL)
+
+def invalidate_user_credits(user_id):
+    """Usuwa stan kredytów użytkownika z cache (np. po płatności zrealizowanej poza botem)"""
+    credits_cache.invalidate(user_id)
+
+def _update_credits_cache(user_id, result):
+    """Aktualizuje cache na podstawie wyniku operacji na kredytach"""
+    if result:
+        credits_cache.set(user_id, result['credits_after'])
+    else:
+        credits_cache.invalidate(user_id)
 
 # Funkcje dla kompatybilności wstecznej
-def get_user_credits(user_id):
-    """Funkcja dla kompatybilności wstecznej - bez async/await"""
+async def get_user_credits(user_id):
+    """Funkcja dla kompatybilności wstecznej - stan kredytów z cache, a przy braku wpisu z bazy"""
+    cached = credits_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
     try:
-        # Bezpośrednie zapytanie do Supabase
-        response = api_service.supabase.client.table('user_credits').select('credits_amount').eq('user_id', user_id).execute()
+        # Zapytanie przez asynchroniczny klient PostgREST - nie blokuje pętli zdarzeń.
+        # Błąd nie może wyglądać jak brak wiersza, więc jest zgłaszany dalej
+        result = await api_service.supabase.query(
+            'user_credits', query_type="select", columns='credits_amount', filters={'user_id': user_id},
+            raise_errors=True
+        )
         
-        if response.data:
-            return response.data[0].get('credits_amount', 100)  # Domyślnie 100 kredytów
+        if result:
+            credits = result[0].get('credits_amount', 100)  # Domyślnie 100 kredytów
+            credits_cache.set(user_id, credits)
+            return credits
         
         # Inicjalizacja nowego użytkownika
-        api_service.supabase.client.table('user_credits').insert({
+        await api_service.supabase.query('user_credits', query_type="insert", data={
             'user_id': user_id,
             'credits_amount': 100,  # Każdy nowy użytkownik dostaje 100 kredytów
             'total_credits_purchased': 0,
             'total_spent': 0
-        }).execute()
+        }, raise_errors=True)
         
+        credits_cache.set(user_id, 100)
         return 100  # Początkowa liczba kredytów
     except Exception as e:
+        # Bez zapisu w cache - stan nie jest znany, a operacje płatne nie mogą przejść za darmo
         logger.error(f"Błąd przy pobieraniu kredytów: {e}")
-        return 100  # W razie błędu również zwróć 100
+        return 0
 
 async def add_user_credits(user_id, amount, description=None):
     """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.credit_repository.add_user_credits(user_id, amount, description)
+    result = await repository_service.credit_repository.add_user_credits(user_id, amount, description)
+    _update_credits_cache(user_id, result)
+    return result
 
-async def deduct_user_credits(user_id, amount, description=None):
+async def deduct_user_credits(user_id, amount, description=None, operation_type=None, model=None):
     """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.credit_repository.deduct_user_credits(user_id, amount, description)
+    result = await repository_service.credit_repository.deduct_user_credits(
+        user_id, amount, description, operation_type=operation_type, model=model
+    )
+    _update_credits_cache(user_id, result)
+    return result
 
 async def check_user_credits(user_id, amount_needed):
-    """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.credit_repository.check_user_credits(user_id, amount_needed)
+    """Funkcja dla kompatybilności wstecznej - korzysta z cache"""
+    return await get_user_credits(user_id) >= amount_needed
 
 async def get_credit_packages():
     """Funkcja dla kompatybilności wstecznej"""
@@ -54,7 +88,9 @@ async def get_package_by_id(package_id):
 
 async def purchase_credits(user_id, package_id):
     """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.credit_repository.purchase_credits(user_id, package_id)
+    result = await repository_service.credit_repository.purchase_credits(user_id, package_id)
+    credits_cache.invalidate(user_id)
+    return result
 
 async def get_user_credit_stats(user_id):
     """Funkcja dla kompatybilności wstecznej"""
@@ -68,6 +104,14 @@ async def get_credit_usage_by_type(user_id, days=30):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.get_usage_by_type(user_id, days)
 
+async def get_credit_daily_usage(user_id, days=30):
+    """Funkcja dla kompatybilności wstecznej"""
+    return await repository_service.credit_repository.get_daily_usage(user_id, days)
+
+async def get_credit_ledger_version(user_id):
+    """Funkcja dla kompatybilności wstecznej"""
+    return await repository_service.credit_repository.get_ledger_version(user_id)
+
 async def add_stars_payment_option(stars_count, credits_amount):
     """Funkcja dla kompatybilności wstecznej"""
     # Ta funkcja może nie mieć bezpośredniego odpowiednika w repository
@@ -1,8 +1,8 @@
 """
 Definicje modeli danych dla bazy danych
 """
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any
 
 @dataclass
@@ -35,6 +35,39 @@ class User:
         
         return cls(**data)
 
+@dataclass
+class UserProfile:
+    """Najczęściej używane ustawienia użytkownika (cache profilu)"""
+    user_id: int
+    language: Optional[str] = None
+    language_code: Optional[str] = None
+    current_mode: Optional[str] = None
+    current_model: Optional[str] = None
+    subscription_end_date: Optional[datetime] = None
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'UserProfile':
+        """Tworzy obiekt UserProfile z wiersza tabeli users"""
+        subscription_end_date = data.get('subscription_end_date')
+        if isinstance(subscription_end_date, str):
+            subscription_end_date = datetime.fromisoformat(subscription_end_date.replace('Z', '+00:00'))
+        if subscription_end_date is not None and subscription_end_date.tzinfo is None:
+            subscription_end_date = subscription_end_date.replace(tzinfo=timezone.utc)
+        
+        return cls(
+            user_id=data['id'],
+            language=data.get('language'),
+            language_code=data.get('language_code'),
+            current_mode=data.get('current_mode'),
+            current_model=data.get('current_model'),
+            subscription_end_date=subscription_end_date
+        )
+    
+    @property
+    def preferred_language(self) -> Optional[str]:
+        """Język wybrany w bocie, a w razie jego braku - język klienta Telegram"""
+        return self.language or self.language_code
+
 @dataclass
 class License:
     """Model licencji"""
@@ -67,6 +100,8 @@ class Conversation:
     user_id: int = 0
     created_at: Optional[datetime] = None
     last_message_at: Optional[datetime] = None
+    summary: Optional[str] = None
+    summary_until_message_id: Optional[int] = None
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Conversation':
@@ -74,7 +109,7 @@ class Conversation:
         # Usuń niewspierane pola (jak theme_id) przed utworzeniem obiektu
         filtered_data = {}
         for key, value in data.items():
-            if key in ['id', 'user_id', 'created_at', 'last_message_at']:
+            if key in ['id', 'user_id', 'created_at', 'last_message_at', 'summary', 'summary_until_message_id']:
                 filtered_data[key] = value
         
         # Konwersja pól datetime z ISO string
@@ -97,10 +132,17 @@ class Message:
     is_from_user: bool = True
     model_used: Optional[str] = None
     created_at: Optional[datetime] = None
+    # Liczba tokenów treści dla poszczególnych tokenizerów (np. {"o200k_base": 42})
+    token_counts: Dict[str, int] = field(default_factory=dict)
+    # Identyfikator nadany przy zapisie w tle - chroni przed duplikatami przy ponowieniu
+    client_id: Optional[str] = None
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'Message':
         """Tworzy obiekt Message z danych słownikowych"""
+        if 'token_counts' in data and data['token_counts'] is None:
+            data['token_counts'] = {}
+        
         # Konwersja pól datetime z ISO string
         if 'created_at' in data and data['created_at']:
             if isinstance(data['created_at'], str):
@@ -1,13 +1,20 @@
 # database/supabase_client.py
-from services.api_service import APIService
-from services.repository_service import RepositoryService
+from services.api_service import get_api_service
+from services.repository_service import get_repository_service
+from services.summary_service import SummaryService
 from database.models import Conversation, Message
 import logging
 from database.credits_client import get_user_credits
+from services.user_profile_service import get_user_profile_service
+from datetime import datetime, timezone
+from utils.token_counter import get_encoding_name, get_context_token_budget, count_message_tokens
+from config import MAX_CONTEXT_MESSAGES
 
-# Utworzenie globalnych instancji
-api_service = APIService()
-repository_service = RepositoryService(api_service.supabase)
+# Współdzielone instancje serwisów
+api_service = get_api_service()
+repository_service = get_repository_service()
+summary_service = SummaryService(api_service, repository_service)
+user_profile_service = get_user_profile_service()
 
 # Zmienne dla kompatybilności wstecznej
 supabase = api_service.supabase.client  # Dla bezpośredniego dostępu, jeśli potrzebne
@@ -30,33 +37,74 @@ async def save_message(conversation_id, user_id, content, is_from_user=True, mod
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.message_repository.save_message(conversation_id, user_id, content, is_from_user, model_used)
 
-async def get_conversation_history(conversation_id, limit=20):
+async def get_conversation_history(conversation_id, limit=20, before_id=None):
     """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.message_repository.get_conversation_history(conversation_id, limit)
+    return await repository_service.message_repository.get_conversation_history(conversation_id, limit, before_id)
+
+async def get_context_history(conversation_id, model, summary_until_message_id=None, token_budget=None):
+    """
+    Pobiera najnowszą historię konwersacji wypełniającą budżet tokenów modelu
+
+    Historia jest pobierana stronami po MAX_CONTEXT_MESSAGES wiadomości (kursor before_id),
+    aż do wyczerpania budżetu, wiadomości objętej streszczeniem lub początku konwersacji.
+    Zwraca tylko wiadomości nieujęte w streszczeniu (od najstarszej do najnowszej).
+    """
+    encoding_name = get_encoding_name(model)
+    budget = get_context_token_budget(model, token_budget)
+
+    history = []
+    before_id = None
+    while True:
+        page = await repository_service.message_repository.get_conversation_history(
+            conversation_id, MAX_CONTEXT_MESSAGES, before_id
+        )
+        history = page + history
+        budget -= sum(count_message_tokens(msg, encoding_name) for msg in page)
+
+        # Wiadomości bez id czekają na zapis w tle - kursorem jest najstarsza zapisana
+        oldest_id = next((msg.id for msg in page if msg.id is not None), None)
+        if (len(page) < MAX_CONTEXT_MESSAGES or budget <= 0 or oldest_id is None
+                or (summary_until_message_id and oldest_id <= summary_until_message_id)):
+            break
+        before_id = oldest_id
+
+    return SummaryService.unsummarized(history, summary_until_message_id)
+
+async def summarize_conversation_if_needed(conversation_id):
+    """Streszcza starsze wiadomości konwersacji, jeśli przekroczono próg tokenów"""
+    return await summary_service.summarize_if_needed(conversation_id)
 
 async def increment_messages_used(user_id):
-    """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.user_repository.increment_messages_used(user_id)
+    """Zwiększa licznik wykorzystanych wiadomości (zapis zbiorczy w tle)"""
+    repository_service.message_writer.increment_messages_used(user_id)
+    return True
 
 async def update_user_language(user_id, language):
-    """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.user_repository.update_language(user_id, language)
+    """Zapisuje język użytkownika i usuwa jego profil z cache"""
+    result = await repository_service.user_repository.update_language(user_id, language)
+    user_profile_service.invalidate(user_id)
+    return result
 
 async def check_active_subscription(user_id):
-    """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.user_repository.check_active_subscription(user_id)
+    """Sprawdza, czy subskrypcja użytkownika jest aktywna (na podstawie profilu z cache)"""
+    end_date = await get_subscription_end_date(user_id)
+    return end_date is not None and end_date > datetime.now(timezone.utc)
 
 async def get_subscription_end_date(user_id):
-    """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.user_repository.get_subscription_end_date(user_id)
+    """Zwraca datę końca subskrypcji z profilu użytkownika"""
+    profile = await user_profile_service.get(user_id)
+    return profile.subscription_end_date if profile else None
 
 async def get_message_status(user_id):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.user_repository.get_message_status(user_id)
 
 async def activate_user_license(user_id, license_key):
-    """Funkcja dla kompatybilności wstecznej"""
-    return await repository_service.license_repository.activate_license(user_id, license_key)
+    """Aktywuje licencję i usuwa profil użytkownika (z datą końca subskrypcji) z cache"""
+    success, end_date = await repository_service.license_repository.activate_license(user_id, license_key)
+    if success:
+        user_profile_service.invalidate(user_id)
+    return success, end_date
 
 async def get_credit_transactions(user_id, days=30):
     """Funkcja dla kompatybilności wstecznej"""
@@ -66,6 +114,14 @@ async def get_credit_usage_by_type(user_id, days=30):
     """Funkcja dla kompatybilności wstecznej"""
     return await repository_service.credit_repository.get_usage_by_type(user_id, days)
 
+async def get_credit_daily_usage(user_id, days=30):
+    """Funkcja dla kompatybilności wstecznej"""
+    return await repository_service.credit_repository.get_daily_usage(user_id, days)
+
+async def get_credit_ledger_version(user_id):
+    """Funkcja dla kompatybilności wstecznej"""
+    return await repository_service.credit_repository.get_ledger_version(user_id)
+
 # Wycofane funkcje związane z tematami - zastąpione prostymi implementacjami
 async def create_conversation_theme(user_id, theme_name):
     """Wycofana funkcja - zwraca None"""
@@ -0,0 +1,215 @@
+"""
+Lokalny zamiennik Telegram Bot API do testów obciążeniowych trybu webhook.
+
+Serwer odpowiada na wywołania Bot API wysyłane przez bota (getMe, sendMessage,
+editMessageText, ...) i odtwarza nagrane aktualizacje (plik JSONL, jedna aktualizacja
+na linię) na adres webhooka bota z zadaną częstotliwością.
+
+Przykład:
+    # terminal 1 - fałszywe Bot API
+    python fake_telegram_server.py --updates updates.jsonl --rate 50 \\
+        --webhook-url http://127.0.0.1:8443/telegram --secret-token sekret
+
+    # terminal 2 - bot w trybie webhook wskazujący na fałszywe Bot API
+    TELEGRAM_API_BASE_URL=http://127.0.0.1:8081/bot BOT_RUN_MODE=webhook \\
+    WEBHOOK_URL=http://127.0.0.1:8443 WEBHOOK_SECRET_TOKEN=sekret python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import time
+from collections import Counter, defaultdict, deque
+from aiohttp import web, ClientSession, ClientTimeout
+
+FAKE_BOT = {
+    "id": 1000000001,
+    "is_bot": True,
+    "first_name": "Fake Bot",
+    "username": "fake_bot",
+    "can_join_groups": True,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False
+}
+
+# Metody Bot API zwracające obiekt Message
+MESSAGE_METHODS = {
+    "sendMessage", "editMessageText", "editMessageCaption", "editMessageReplyMarkup",
+    "sendPhoto", "sendDocument", "sendAnimation", "sendVideo", "sendInvoice"
+}
+
+class FakeTelegramServer:
+    """Fałszywe Bot API zbierające statystyki wywołań i opóźnień odpowiedzi bota"""
+
+    def __init__(self):
+        self.message_ids = itertools.count(1)
+        self.method_calls = Counter()
+        # chat_id -> czasy wysłania aktualizacji oczekujących na pierwszą reakcję bota
+        self.pending = defaultdict(deque)
+        self.response_latencies = []
+        self.webhook_url = None
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.method_calls[method] += 1
+
+        params = await self._read_params(request)
+        chat_id = params.get("chat_id")
+        if chat_id is not None:
+            self._record_response(chat_id)
+
+        return web.json_response({"ok": True, "result": self._result_for(method, params)})
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> dict:
+        """Odczytuje parametry wywołania (JSON, formularz lub query string)"""
+        if request.content_type == "application/json":
+            return await request.json()
+
+        params = dict(request.query)
+        if request.can_read_body:
+            form = await request.post()
+            params.update({key: value for key, value in form.items() if isinstance(value, str)})
+
+        for key, value in params.items():
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                pass
+        return params
+
+    def _record_response(self, chat_id) -> None:
+        """Zapisuje czas od dostarczenia aktualizacji do pierwszej reakcji bota w danym czacie"""
+        queue = self.pending.get(int(chat_id))
+        if queue:
+            self.response_latencies.append(time.monotonic() - queue.popleft())
+
+    def _result_for(self, method: str, params: dict):
+        """Buduje minimalny poprawny wynik wywołania Bot API"""
+        if method == "getMe":
+            return FAKE_BOT
+        if method == "getWebhookInfo":
+            return {"url": self.webhook_url or "", "has_custom_certificate": False, "pending_update_count": 0}
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            return True
+        if method == "getUpdates":
+            return []
+        if method in MESSAGE_METHODS:
+            chat_id = params.get("chat_id", 0)
+            return {
+                "message_id": params.get("message_id") or next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"},
+                "from": FAKE_BOT,
+                "text": params.get("text", "")
+            }
+        return True
+
+    @staticmethod
+    def _chat_id_of(update: dict):
+        """Zwraca ID czatu, którego dotyczy aktualizacja"""
+        for key in ("message", "edited_message"):
+            if key in update:
+                return update[key]["chat"]["id"]
+        if "callback_query" in update:
+            message = update["callback_query"].get("message")
+            if message:
+                return message["chat"]["id"]
+            return update["callback_query"]["from"]["id"]
+        return None
+
+    async def replay(self, updates: list, webhook_url: str, rate: float, secret_token: str = None) -> list:
+        """Wysyła aktualizacje na webhook bota z zadaną częstotliwością; zwraca czasy potwierdzeń"""
+        headers = {"Content-Type": "application/json"}
+        if secret_token:
+            headers["X-Telegram-Bot-Api-Secret-Token"] = secret_token
+
+        ack_latencies = []
+
+        async with ClientSession(timeout=ClientTimeout(total=60)) as session:
+            async def deliver(update: dict) -> None:
+                chat_id = self._chat_id_of(update)
+                sent_at = time.monotonic()
+                if chat_id is not None:
+                    self.pending[chat_id].append(sent_at)
+                async with session.post(webhook_url, data=json.dumps(update), headers=headers) as response:
+                    await response.read()
+                    if response.status != 200:
+                        print(f"Webhook odpowiedział statusem {response.status}")
+                ack_latencies.append(time.monotonic() - sent_at)
+
+            start = time.monotonic()
+            tasks = []
+            for index, update in enumerate(updates):
+                # Równomierne rozłożenie wysyłek w czasie
+                delay = start + index / rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(deliver(update)))
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return ack_latencies
+
+def load_updates(path: str) -> list:
+    """Wczytuje nagrane aktualizacje i nadaje im kolejne update_id"""
+    with open(path, "r", encoding="utf-8") as file:
+        updates = [json.loads(line) for line in file if line.strip()]
+    for update_id, update in enumerate(updates, start=1):
+        update["update_id"] = update_id
+    return updates
+
+def format_latencies(values: list) -> str:
+    """Formatuje percentyle opóźnień w milisekundach"""
+    if not values:
+        return "brak danych"
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"p50 {statistics.median(values) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, max {values[-1] * 1000:.1f} ms"
+
+async def main(args) -> None:
+    server = FakeTelegramServer()
+    app = web.Application()
+    app.router.add_route("*", "/bot{token}/{method}", server.handle_method)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    print(f"Fałszywe Bot API nasłuchuje na http://{args.host}:{args.port}/bot")
+
+    try:
+        if not args.updates:
+            # Sam serwer, bez odtwarzania - działa do przerwania
+            await asyncio.Event().wait()
+
+        updates = load_updates(args.updates)
+        print(f"Oczekiwanie {args.startup_delay:.0f} s na start bota...")
+        await asyncio.sleep(args.startup_delay)
+
+        print(f"Odtwarzanie {len(updates)} aktualizacji z częstotliwością {args.rate}/s na {args.webhook_url}")
+        start = time.monotonic()
+        ack_latencies = await server.replay(updates, args.webhook_url, args.rate, args.secret_token)
+        duration = time.monotonic() - start
+
+        await asyncio.sleep(args.drain)
+
+        print(f"\nWysłano {len(updates)} aktualizacji w {duration:.2f} s ({len(updates) / duration:.1f}/s)")
+        print(f"Potwierdzenie webhooka: {format_latencies(ack_latencies)}")
+        print(f"Pierwsza reakcja bota: {format_latencies(server.response_latencies)}")
+        print("Wywołania Bot API: " + ", ".join(f"{m}={c}" for m, c in server.method_calls.most_common()))
+    finally:
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fałszywe Telegram Bot API z odtwarzaniem aktualizacji")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--updates", help="Plik JSONL z nagranymi aktualizacjami")
+    parser.add_argument("--webhook-url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret-token", default=None)
+    parser.add_argument("--rate", type=float, default=10.0, help="Liczba aktualizacji na sekundę")
+    parser.add_argument("--startup-delay", type=float, default=5.0, help="Czas na uruchomienie bota (s)")
+    parser.add_argument("--drain", type=float, default=10.0, help="Czas oczekiwania na odpowiedzi po odtworzeniu (s)")
+
+    asyncio.run(main(parser.parse_args()))
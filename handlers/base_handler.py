@@ -9,7 +9,7 @@ from telegram.constants import ParseMode, ChatAction
 from utils.translations import get_text
 from utils.user_utils import get_user_language
 from utils.visual_styles import create_header, create_section
-from database.credits_client import get_user_credits, check_user_credits, deduct_user_credits
+from database.credits_client import get_user_credits, deduct_user_credits
 from utils.credit_warnings import check_operation_cost, format_credit_usage_report
 
 logger = logging.getLogger(__name__)
@@ -50,10 +50,10 @@ class BaseHandler:
         """
         user_id = update.effective_user.id
         language = BaseHandler.get_user_language(context, user_id)
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         # Sprawdź czy użytkownik ma wystarczającą liczbę kredytów
-        if not check_user_credits(user_id, cost):
+        if credits < cost:
             # Utwórz klawiaturę z przyciskiem do zakupu kredytów
             keyboard = [
                 [InlineKeyboardButton(get_text("buy_credits_btn", language), callback_data="menu_credits_buy")],
@@ -82,7 +82,7 @@ class BaseHandler:
         return True, None
         
     @staticmethod
-    async def deduct_credits(user_id, cost, operation_name, context=None):
+    async def deduct_credits(user_id, cost, operation_name, context=None, operation_type=None, model=None):
         """
         Odejmuje kredyty i generuje raport
         
@@ -91,18 +91,20 @@ class BaseHandler:
             cost: Koszt operacji
             operation_name: Nazwa operacji
             context: Kontekst bota (opcjonalnie)
+            operation_type: Rodzaj operacji w rejestrze transakcji (opcjonalnie)
+            model: Użyty model (opcjonalnie)
             
         Returns:
             dict: Raport z operacji
         """
-        # Pobierz stan kredytów przed operacją
-        credits_before = get_user_credits(user_id)
-        
-        # Odejmij kredyty
-        deduct_user_credits(user_id, cost, operation_name)
-        
-        # Pobierz stan kredytów po operacji
-        credits_after = get_user_credits(user_id)
+        # Odejmij kredyty - wynik zawiera stan przed i po operacji
+        result = await deduct_user_credits(user_id, cost, operation_name, operation_type=operation_type, model=model)
+        
+        if result:
+            credits_before = result['credits_before']
+            credits_after = result['credits_after']
+        else:
+            credits_before = credits_after = await get_user_credits(user_id)
         
         # Utwórz raport
         language = "pl"
@@ -108,7 +108,7 @@ async def check_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     # Pobierz status kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     # Pobranie aktualnego trybu czatu
     from config import CHAT_MODES
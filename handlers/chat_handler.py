@@ -3,7 +3,6 @@
 Moduł obsługujący wiadomości tekstowe od użytkownika
 i komunikację z modelami AI
 """
-import datetime
 import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
@@ -13,6 +12,9 @@ from database.supabase_client import (
     get_active_conversation, save_message, get_conversation_history, increment_messages_used
 )
 from utils.openai_client import chat_completion_stream, prepare_messages_from_history
+from services.model_scheduler import ModelOverloadedError
+from services.model_router import get_charged_credit_cost
+from utils.stream_renderer import StreamRenderer
 from utils.translations import get_text
 from utils.user_utils import is_chat_initialized
 from utils.tips import get_contextual_tip, should_show_tip
@@ -111,7 +113,7 @@ class ChatHandler(BaseHandler):
         
         # Zapisz wiadomość użytkownika do bazy danych
         try:
-            save_message(conversation_id, user_id, user_message, is_from_user=True)
+            await save_message(conversation_id, user_id, user_message, is_from_user=True)
             logger.info("Wiadomość użytkownika zapisana w bazie")
         except Exception as e:
             logger.error(f"Błąd przy zapisie wiadomości użytkownika: {e}")
@@ -121,7 +123,7 @@ class ChatHandler(BaseHandler):
         
         # Pobierz historię konwersacji
         try:
-            history = get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
+            history = await get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
             logger.info(f"Pobrano historię konwersacji, liczba wiadomości: {len(history)}")
         except Exception as e:
             logger.error(f"Błąd przy pobieraniu historii: {e}")
@@ -131,7 +133,7 @@ class ChatHandler(BaseHandler):
         system_prompt = CHAT_MODES[current_mode]["prompt"]
         
         # Przygotuj wiadomości dla API OpenAI
-        messages = prepare_messages_from_history(history, user_message, system_prompt)
+        messages = prepare_messages_from_history(history, user_message, system_prompt, model=model_to_use)
         logger.info(f"Przygotowano {len(messages)} wiadomości dla API")
         
         # Wyślij początkową pustą wiadomość, którą będziemy aktualizować
@@ -170,50 +172,36 @@ class ChatHandler(BaseHandler):
         # Pobierz kredyty przed operacją
         credits_before = await ChatHandler._get_user_credits(user_id)
         
-        # Zainicjuj pełną odpowiedź
-        full_response = ""
-        buffer = ""
-        last_update = datetime.datetime.now().timestamp()
+        renderer = StreamRenderer(response_message)
         
         # Spróbuj wygenerować odpowiedź
         try:
             logger.info("Rozpoczynam generowanie odpowiedzi strumieniowej...")
             # Generuj odpowiedź strumieniowo
-            async for chunk in chat_completion_stream(messages, model=model):
-                full_response += chunk
-                buffer += chunk
-                
-                # Aktualizuj wiadomość co 1 sekundę lub gdy bufor jest wystarczająco duży
-                current_time = datetime.datetime.now().timestamp()
-                if current_time - last_update >= 1.0 or len(buffer) > 100:
-                    try:
-                        # Dodaj migający kursor na końcu wiadomości
-                        await response_message.edit_text(full_response + "▌", parse_mode=ParseMode.MARKDOWN)
-                        buffer = ""
-                        last_update = current_time
-                    except Exception as e:
-                        # Jeśli wystąpi błąd (np. wiadomość nie została zmieniona), kontynuuj
-                        logger.warning(f"Błąd przy aktualizacji wiadomości: {e}")
+            stream = chat_completion_stream(messages, model=model, mode=mode)
+            async for chunk in stream:
+                await renderer.append(chunk)
             
             logger.info("Zakończono generowanie odpowiedzi")
             
             # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
-            try:
-                await response_message.edit_text(full_response, parse_mode=ParseMode.MARKDOWN)
-            except Exception as e:
-                # Jeśli wystąpi błąd formatowania Markdown, wyślij bez formatowania
-                logger.warning(f"Błąd formatowania Markdown: {e}")
-                await response_message.edit_text(full_response)
+            full_response = await renderer.finish()
+            
+            # Przy awarii modelu odpowiedź mógł wygenerować model zapasowy - rozliczamy faktycznie użyty
+            credit_cost = get_charged_credit_cost(credit_cost, model, stream.model)
+            model = stream.model
             
             # Zapisz odpowiedź do bazy danych
-            save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model)
+            await save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model)
             
             # Odejmij kredyty
             deduct_report = await ChatHandler.deduct_credits(
                 user_id, 
                 credit_cost, 
                 get_text("message_model", language, model=model, default=f"Wiadomość ({model})"),
-                context
+                context,
+                operation_type="message",
+                model=model
             )
             credits_after = deduct_report["credits_after"]
             
@@ -229,8 +217,11 @@ class ChatHandler(BaseHandler):
                 )
             
             # Zwiększ licznik wykorzystanych wiadomości
-            increment_messages_used(user_id)
+            await increment_messages_used(user_id)
             
+        except ModelOverloadedError as e:
+            logger.warning(f"Odrzucono zapytanie: {e}")
+            await response_message.edit_text(get_text("model_overloaded", language))
         except Exception as e:
             logger.error(f"Wystąpił błąd podczas generowania odpowiedzi: {e}")
             await response_message.edit_text(get_text("response_error", language, error=str(e)))
@@ -284,7 +275,7 @@ class ChatHandler(BaseHandler):
             int: Liczba kredytów
         """
         from database.credits_client import get_user_credits
-        return get_user_credits(user_id)
+        return await get_user_credits(user_id)
 
 
 # Globalna funkcja exportowana dla zachowania wstecznej kompatybilności 
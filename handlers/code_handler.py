@@ -55,7 +55,7 @@ async def code_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if success:
         # Pobierz aktualny stan kredytów
-        total_credits = get_user_credits(user_id)
+        total_credits = await get_user_credits(user_id)
         
         await update.message.reply_text(
             get_text("activation_code_success", language, 
@@ -10,8 +10,10 @@ from utils.tips import get_random_tip, should_show_tip
 from database.credits_client import get_user_credits, check_user_credits, deduct_user_credits
 from database.supabase_client import save_message, get_active_conversation, get_conversation_history, increment_messages_used
 from utils.openai_client import generate_image_dall_e, analyze_document, analyze_image, chat_completion_stream, prepare_messages_from_history
+from utils.stream_renderer import StreamRenderer
+from services.model_scheduler import ModelOverloadedError
+from services.model_router import get_charged_credit_cost
 from config import CREDIT_COSTS, MAX_CONTEXT_MESSAGES, CHAT_MODES
-import datetime
 
 async def _process_operation(update, context, operation_type, operation_func, user_id, credit_cost, 
                              process_args, success_handler, error_handler=None):
@@ -20,8 +22,8 @@ async def _process_operation(update, context, operation_type, operation_func, us
     query = update.callback_query
     
     # Check user credits
-    credits = get_user_credits(user_id)
-    if not check_user_credits(user_id, credit_cost):
+    credits = await get_user_credits(user_id)
+    if not await check_user_credits(user_id, credit_cost):
         error_msg = create_header("Brak wystarczających kredytów", "error") + \
                     "W międzyczasie twój stan kredytów zmienił się i nie masz już wystarczającej liczby kredytów."
         await update_menu(query, error_msg, InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Powrót", callback_data="menu_back_main")]]),
@@ -36,9 +38,10 @@ async def _process_operation(update, context, operation_type, operation_func, us
         
         # Deduct credits
         operation_desc = get_text(f"{operation_type}_operation", language, default=operation_type)
-        deduct_user_credits(user_id, credit_cost, operation_desc)
+        # Rodzaj operacji w rejestrze transakcji: image, document lub photo
+        await deduct_user_credits(user_id, credit_cost, operation_desc, operation_type=operation_type.split('_')[0])
         
-        credits_after = get_user_credits(user_id)
+        credits_after = await get_user_credits(user_id)
         
         # Generate usage report
         usage_report = format_credit_usage_report(operation_type, credit_cost, credits_before, credits_after)
@@ -316,12 +319,12 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
             return
         
         try:
-            save_message(conversation_id, user_id, user_message, is_from_user=True)
+            await save_message(conversation_id, user_id, user_message, is_from_user=True)
         except Exception as e:
             pass
         
         try:
-            history = get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
+            history = await get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
         except Exception as e:
             history = []
         
@@ -335,13 +338,9 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
         
         system_prompt = CHAT_MODES[current_mode]["prompt"]
         
-        messages = prepare_messages_from_history(history, user_message, system_prompt)
+        messages = prepare_messages_from_history(history, user_message, system_prompt, model=model_to_use)
         
-        credits_before = get_user_credits(user_id)
-        
-        full_response = ""
-        buffer = ""
-        last_update = datetime.datetime.now().timestamp()
+        credits_before = await get_user_credits(user_id)
         
         try:
             response_message = await status_message.edit_text(
@@ -349,39 +348,23 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
                 parse_mode=ParseMode.MARKDOWN
             )
             
-            async for chunk in chat_completion_stream(messages, model=model_to_use):
-                full_response += chunk
-                buffer += chunk
-                
-                current_time = datetime.datetime.now().timestamp()
-                if current_time - last_update >= 1.0 or len(buffer) > 100:
-                    try:
-                        await response_message.edit_text(
-                            create_header("Odpowiedź AI", "chat") + full_response + "▌",
-                            parse_mode=ParseMode.MARKDOWN
-                        )
-                        buffer = ""
-                        last_update = current_time
-                    except Exception as e:
-                        pass
+            renderer = StreamRenderer(response_message, header=create_header("Odpowiedź AI", "chat"))
+            stream = chat_completion_stream(messages, model=model_to_use, mode=current_mode)
+            async for chunk in stream:
+                await renderer.append(chunk)
             
-            try:
-                await response_message.edit_text(
-                    create_header("Odpowiedź AI", "chat") + full_response,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            except Exception as e:
-                await response_message.edit_text(
-                    create_header("Odpowiedź AI", "chat") + full_response,
-                    parse_mode=None
-                )
+            full_response = await renderer.finish()
+            
+            credit_cost = get_charged_credit_cost(credit_cost, model_to_use, stream.model)
+            model_to_use = stream.model
             
-            save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
+            await save_message(conversation_id, user_id, full_response, is_from_user=False, model_used=model_to_use)
             
-            deduct_user_credits(user_id, credit_cost, 
-                               get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"))
+            await deduct_user_credits(user_id, credit_cost, 
+                                      get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"),
+                                      operation_type="message", model=model_to_use)
             
-            credits_after = get_user_credits(user_id)
+            credits_after = await get_user_credits(user_id)
             
             usage_report = format_credit_usage_report(
                 "Wiadomość AI", 
@@ -419,8 +402,10 @@ async def handle_message_confirmation(update: Update, context: ContextTypes.DEFA
                     parse_mode=ParseMode.MARKDOWN
                 )
             
-            increment_messages_used(user_id)
+            await increment_messages_used(user_id)
             
+        except ModelOverloadedError:
+            await status_message.edit_text(get_text("model_overloaded", language))
         except Exception as e:
             await status_message.edit_text(
                 create_header("Błąd odpowiedzi", "error") +
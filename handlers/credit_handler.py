@@ -15,19 +15,15 @@ from database.credits_client import (
     get_user_credit_stats
 )
 from utils.credit_analytics import (
-    generate_credit_usage_chart, generate_usage_breakdown_chart, 
-    get_credit_usage_breakdown, predict_credit_depletion
+    send_credit_chart, get_credit_usage_breakdown, predict_credit_depletion
 )
-import matplotlib
-matplotlib.use('Agg')
-
 from database.credits_client import add_stars_payment_option, get_stars_conversion_rate
 
 async def credits_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /credits command with enhanced visual presentation"""
     user_id = update.effective_user.id
     language = get_user_language(context, user_id)
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     message = f"*{get_text('credit_status_title', language, default='Stan kredytów')}*\n\n"
     message += f"{get_text('available_credits', language, default='Dostępne kredyty')}: *{credits}*\n\n"
     
@@ -127,7 +123,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
     await query.answer()
     
     if query.data == "credits_check" or query.data == "menu_credits_check":
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         credit_stats = get_user_credit_stats(user_id)
         
         message = f"""
@@ -237,7 +233,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         
         days = 30
         
-        depletion_info = predict_credit_depletion(user_id, days)
+        depletion_info = await predict_credit_depletion(user_id, days, language)
         
         if not depletion_info:
             if hasattr(query.message, 'caption'):
@@ -260,7 +256,7 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
         else:
             message += f"{get_text('not_enough_data', language, default='Za mało danych, aby przewidzieć wyczerpanie kredytów.')}.\n\n"
         
-        usage_breakdown = get_credit_usage_breakdown(user_id, days)
+        usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
         
         if usage_breakdown:
             message += f"*{get_text('usage_breakdown', language, default='Rozkład zużycia kredytów')}:*\n"
@@ -279,21 +275,15 @@ async def handle_credit_callback(update: Update, context: ContextTypes.DEFAULT_T
                 parse_mode=ParseMode.MARKDOWN
             )
         
-        usage_chart = generate_credit_usage_chart(user_id, days)
-        if usage_chart:
-            await context.bot.send_photo(
-                chat_id=query.message.chat_id,
-                photo=usage_chart,
-                caption=f"📈 {get_text('usage_history_chart', language, default=f'Historia wykorzystania kredytów z ostatnich {days} dni')}"
-            )
+        await send_credit_chart(
+            context.bot, query.message.chat_id, "usage", user_id, days, language,
+            caption=f"📈 {get_text('usage_history_chart', language, default=f'Historia wykorzystania kredytów z ostatnich {days} dni')}"
+        )
         
-        breakdown_chart = generate_usage_breakdown_chart(user_id, days)
-        if breakdown_chart:
-            await context.bot.send_photo(
-                chat_id=query.message.chat_id,
-                photo=breakdown_chart,
-                caption=f"📊 {get_text('usage_breakdown_chart', language, default=f'Rozkład wykorzystania kredytów z ostatnich {days} dni')}"
-            )
+        await send_credit_chart(
+            context.bot, query.message.chat_id, "breakdown", user_id, days, language,
+            caption=f"📊 {get_text('usage_breakdown_chart', language, default=f'Rozkład wykorzystania kredytów z ostatnich {days} dni')}"
+        )
         
         keyboard = [[InlineKeyboardButton(get_text("back", language), callback_data="menu_credits_check")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -320,7 +310,7 @@ async def credit_stats_command(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     
     try:
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         message = f"*Analiza kredytów*\n\n"
         message += f"Aktualny stan kredytów: *{credits}*\n\n"
@@ -384,23 +374,15 @@ async def credit_stats_command(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         
         try:
-            from utils.credit_analytics import generate_credit_usage_chart, generate_usage_breakdown_chart
+            await send_credit_chart(
+                context.bot, update.effective_chat.id, "usage", user_id, language=language,
+                caption="Historia wykorzystania kredytów"
+            )
             
-            # Dodane await przed wywołaniem funkcji asynchronicznej
-            chart = await generate_credit_usage_chart(user_id)
-            if chart:
-                await update.message.reply_photo(
-                    photo=chart,
-                    caption="Historia wykorzystania kredytów"
-                )
-                
-            # Dodane await przed wywołaniem funkcji asynchronicznej
-            breakdown_chart = await generate_usage_breakdown_chart(user_id)
-            if breakdown_chart:
-                await update.message.reply_photo(
-                    photo=breakdown_chart,
-                    caption="Rozkład wykorzystania kredytów według kategorii"
-                )
+            await send_credit_chart(
+                context.bot, update.effective_chat.id, "breakdown", user_id, language=language,
+                caption="Rozkład wykorzystania kredytów według kategorii"
+            )
         except Exception as e:
             print(f"Błąd przy generowaniu wykresów: {e}")
             import traceback
@@ -437,7 +419,7 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
         get_text("analyzing_credit_usage", language, default="⏳ Analizuję dane wykorzystania kredytów...")
     )
     
-    depletion_info = predict_credit_depletion(user_id, days)
+    depletion_info = await predict_credit_depletion(user_id, days, language)
     
     if not depletion_info:
         await status_message.edit_text(
@@ -456,7 +438,7 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
     else:
         message += f"{get_text('not_enough_data', language, default='Za mało danych, aby przewidzieć wyczerpanie kredytów.')}.\n\n"
     
-    usage_breakdown = get_credit_usage_breakdown(user_id, days)
+    usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
     
     if usage_breakdown and sum(usage_breakdown.values()) > 0:
         for category, amount in usage_breakdown.items():
@@ -470,20 +452,12 @@ async def credit_analytics_command(update: Update, context: ContextTypes.DEFAULT
         parse_mode=ParseMode.MARKDOWN
     )
     
-    usage_chart = generate_credit_usage_chart(user_id, days)
-    
-    if usage_chart:
-        await context.bot.send_photo(
-            chat_id=update.effective_chat.id,
-            photo=usage_chart,
-            caption=f"📈 {get_text('usage_history_chart', language, default=f'Historia wykorzystania kredytów z ostatnich {days} dni')}"
-        )
-    
-    breakdown_chart = generate_usage_breakdown_chart(user_id, days)
+    await send_credit_chart(
+        context.bot, update.effective_chat.id, "usage", user_id, days, language,
+        caption=f"📈 {get_text('usage_history_chart', language, default=f'Historia wykorzystania kredytów z ostatnich {days} dni')}"
+    )
     
-    if breakdown_chart:
-        await context.bot.send_photo(
-            chat_id=update.effective_chat.id,
-            photo=breakdown_chart,
-            caption=f"📊 {get_text('usage_breakdown_chart', language, default=f'Rozkład wykorzystania kredytów z ostatnich {days} dni')}"
-        )
\ No newline at end of file
+    await send_credit_chart(
+        context.bot, update.effective_chat.id, "breakdown", user_id, days, language,
+        caption=f"📊 {get_text('usage_breakdown_chart', language, default=f'Rozkład wykorzystania kredytów z ostatnich {days} dni')}"
+    )
\ No newline at end of file
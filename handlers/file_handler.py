@@ -10,7 +10,7 @@ from utils.ui_elements import info_card, section_divider, feature_badge, progres
 from utils.visual_styles import style_message, create_header, create_section, create_status_indicator
 from utils.tips import get_random_tip, should_show_tip
 from utils.credit_warnings import check_operation_cost, format_credit_usage_report
-from database.credits_client import check_user_credits, deduct_user_credits, get_user_credits
+from database.credits_client import deduct_user_credits, get_user_credits
 from config import CREDIT_COSTS
 
 async def _check_file_prerequisites(update, context, file_type, file_size_limit=25*1024*1024):
@@ -40,9 +40,9 @@ async def _check_file_prerequisites(update, context, file_type, file_size_limit=
     
     # Check credits
     credit_cost = CREDIT_COSTS[file_type]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
-    if not check_user_credits(user_id, credit_cost):
+    if credits < credit_cost:
         warning_message = create_header("Brak wystarczających kredytów", "warning") + \
                          f"Nie masz wystarczającej liczby kredytów.\n\n" + \
                          f"▪️ Koszt operacji: *{credit_cost}* kredytów\n" + \
@@ -71,8 +71,6 @@ async def _handle_file_analysis(update, context, file_id, file_name, file_type,
     
     await update.message.chat.send_action(action=ChatAction.TYPING)
     
-    credits_before = get_user_credits(user_id)
-    
     try:
         file = await context.bot.get_file(file_id)
         file_bytes = await file.download_as_bytearray()
@@ -82,9 +80,16 @@ async def _handle_file_analysis(update, context, file_id, file_name, file_type,
         else:  # photo
             result = await analyze_image(file_bytes, f"photo_{file_id}.jpg", mode, target_language)
         
-        deduct_user_credits(user_id, credit_cost, f"{operation_name}: {file_name if file_type == 'document' else ''}")
+        deduct_result = await deduct_user_credits(
+            user_id, credit_cost, f"{operation_name}: {file_name if file_type == 'document' else ''}",
+            operation_type=file_type
+        )
         
-        credits_after = get_user_credits(user_id)
+        if deduct_result:
+            credits_before = deduct_result['credits_before']
+            credits_after = deduct_result['credits_after']
+        else:
+            credits_before = credits_after = await get_user_credits(user_id)
         
         # Prepare result message with appropriate header
         if mode == "translate":
@@ -139,7 +144,7 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     document = update.message.document
     file_name = document.file_name
     credit_cost = CREDIT_COSTS["document"]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     caption = update.message.caption or ""
     caption_lower = caption.lower()
@@ -218,7 +223,7 @@ async def handle_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     
     credit_cost = CREDIT_COSTS["photo"]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     photo = update.message.photo[-1]
     
@@ -17,9 +17,9 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     language = get_user_language(context, user_id)
     quality = "standard"
     credit_cost = CREDIT_COSTS["image"][quality]
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         warning_message = create_header("Brak wystarczających kredytów", "warning") + \
             f"Nie masz wystarczającej liczby kredytów.\n\n" + \
             f"▪️ Koszt operacji: *{credit_cost}* kredytów\n" + \
@@ -81,8 +81,9 @@ async def generate_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     image_url = await generate_image_dall_e(prompt)
     
     credits_before = credits
-    deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"))
-    credits_after = get_user_credits(user_id)
+    await deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"),
+                              operation_type="image", model=DALL_E_MODEL)
+    credits_after = await get_user_credits(user_id)
     
     if image_url:
         await message.delete()
@@ -130,9 +131,9 @@ async def handle_image_confirmation(update: Update, context: ContextTypes.DEFAUL
         )
         
         credit_cost = CREDIT_COSTS["image"]["standard"]
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
-        if not check_user_credits(user_id, credit_cost):
+        if not await check_user_credits(user_id, credit_cost):
             await update_menu(
                 query,
                 create_header("Brak wystarczających kredytów", "error") +
@@ -144,8 +145,9 @@ async def handle_image_confirmation(update: Update, context: ContextTypes.DEFAUL
         
         credits_before = credits
         image_url = await generate_image_dall_e(prompt)
-        deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"))
-        credits_after = get_user_credits(user_id)
+        await deduct_user_credits(user_id, credit_cost, get_text("image_generation", language, default="Generowanie obrazu"),
+                                  operation_type="image", model=DALL_E_MODEL)
+        credits_after = await get_user_credits(user_id)
         
         if image_url:
             caption = create_header("Wygenerowany obraz", "image") + f"*Prompt:* {prompt}\n"
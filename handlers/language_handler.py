@@ -5,7 +5,8 @@ from utils.translations import get_text
 from utils.user_utils import get_user_language
 from utils.menu_manager import update_menu_message, store_menu_state
 from database.supabase_client import update_user_language
-from config import AVAILABLE_LANGUAGES
+from config import AVAILABLE_LANGUAGES, LANGUAGE_BANNER_URL
+from services.media_registry import get_media_registry
 
 # Przenieś tu funkcje związane z wyborem języka:
 async def handle_language_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,7 +25,7 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         
         # Zapisz język w bazie danych
         try:
-            update_user_language(user_id, language)
+            await update_user_language(user_id, language)
         except Exception as e:
             print(f"Błąd zapisywania języka: {e}")
         
@@ -154,15 +155,12 @@ async def show_language_selection(update: Update, context: ContextTypes.DEFAULT_
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Link do zdjęcia bannera
-        banner_url = "https://i.imgur.com/OiPImmC.png?v-111"
-        
         # Użyj neutralnego języka dla pierwszej wiadomości
         language_message = f"Wybierz język / Choose language / Выберите язык:"
         
-        # Wyślij zdjęcie z tekstem wyboru języka
-        await update.message.reply_photo(
-            photo=banner_url,
+        # Wyślij zdjęcie z tekstem wyboru języka (file_id z rejestru zamiast pobierania URL)
+        await get_media_registry().send_photo(
+            update.message.reply_photo, "language_banner", LANGUAGE_BANNER_URL,
             caption=language_message,
             reply_markup=reply_markup
         )
@@ -191,7 +189,7 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         
         # Zapisz język w bazie danych
         try:
-            update_user_language(user_id, language)
+            await update_user_language(user_id, language)
         except Exception as e:
             print(f"Błąd zapisywania języka: {e}")
         
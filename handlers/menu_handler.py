@@ -1,14 +1,16 @@
 # handlers/menu_handler.py
 import logging
+from functools import partial
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
-from config import CHAT_MODES, AVAILABLE_LANGUAGES, AVAILABLE_MODELS, BOT_NAME, CREDIT_COSTS
+from config import CHAT_MODES, AVAILABLE_LANGUAGES, AVAILABLE_MODELS, BOT_NAME, CREDIT_COSTS, MAIN_BANNER_URL
 from utils.translations import get_text
 from utils.user_utils import get_user_language, mark_chat_initialized
-from database.supabase_client import update_user_language, create_new_conversation
+from database.supabase_client import update_user_language, create_new_conversation, get_conversation_history
 from utils.menu import update_menu, store_menu_state, get_navigation_path
 from database.credits_client import get_user_credits
+from services.media_registry import get_media_registry
 
 logger = logging.getLogger(__name__)
 
@@ -93,7 +95,7 @@ async def handle_credits_section(update, context, navigation_path=""):
     language = get_user_language(context, user_id)
     
     # Usuwamy await
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     message_text = f"*{navigation_path or get_navigation_path('credits', language)}*\n\n"
     message_text += f"*Stan kredytów*\n\nDostępne kredyty: *{credits}*\n\n*Koszty operacji:*\n"
@@ -147,9 +149,6 @@ async def handle_settings_section(update, context, navigation_path=""):
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    # Link do zdjęcia bannera
-    banner_url = "https://i.imgur.com/YPubLDE.png?v-1123"
-    
     nav_path = get_navigation_path('settings', language)
     message_text = f"*{nav_path}*\n\n{get_text('settings_options', language)}"
     
@@ -176,9 +175,9 @@ async def handle_settings_section(update, context, navigation_path=""):
         await query.message.delete()
         
         # Wyślij nową wiadomość ze zdjęciem
-        message = await context.bot.send_photo(
-            chat_id=query.message.chat_id,
-            photo=banner_url,
+        message = await get_media_registry().send_photo(
+            partial(context.bot.send_photo, chat_id=query.message.chat_id),
+            "main_banner", MAIN_BANNER_URL,
             caption=message_text,
             reply_markup=reply_markup,
             parse_mode=ParseMode.MARKDOWN
@@ -237,9 +236,6 @@ async def handle_back_to_main(update, context):
     user_id = query.from_user.id
     language = get_user_language(context, user_id)
     
-    # Link do zdjęcia bannera
-    banner_url = "https://i.imgur.com/YPubLDE.png?v-1123"
-    
     welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
     
     keyboard = [
@@ -270,9 +266,9 @@ async def handle_back_to_main(update, context):
             )
         else:
             # Dla zwykłych wiadomości - wysyłamy nowe zdjęcie, ale nie usuwamy starej wiadomości
-            message = await context.bot.send_photo(
-                chat_id=query.message.chat_id,
-                photo=banner_url,
+            message = await get_media_registry().send_photo(
+                partial(context.bot.send_photo, chat_id=query.message.chat_id),
+                "main_banner", MAIN_BANNER_URL,
                 caption=welcome_text,
                 reply_markup=reply_markup,
                 parse_mode=ParseMode.MARKDOWN
@@ -458,7 +454,7 @@ async def handle_help_callbacks(update: Update, context: ContextTypes.DEFAULT_TY
         
     elif query.data == "help_credits":
         # Informacje o kredytach
-        credits = get_user_credits(user_id)
+        credits = await get_user_credits(user_id)
         
         credits_text = get_text("help_credits_info", language, credits=credits, default=f"""
 *Informacje o systemie kredytów:*
@@ -534,11 +530,10 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
                 conversation = conversations[0]
                 conversation_id = conversation['id']
                 
-                # Pobierz wiadomości dla tej konwersacji
-                messages_response = supabase.table('messages').select('*').eq('conversation_id', conversation_id).order('created_at').execute()
-                messages = messages_response.data
+                # Pobierz tylko ostatnie 10 wiadomości tej konwersacji
+                last_messages = await get_conversation_history(conversation_id, limit=10)
                 
-                if not messages:
+                if not last_messages:
                     message_text = get_text("history_empty", language, default="Historia jest pusta.")
                     await update_menu(query, message_text, InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Powrót", callback_data="menu_section_history")]]))
                     return True
@@ -546,12 +541,9 @@ async def handle_history_callbacks(update: Update, context: ContextTypes.DEFAULT
                 # Teraz wyświetl historię
                 message_text = f"*{get_text('history_title', language, default='Historia konwersacji')}*\n\n"
                 
-                # Pokazujemy tylko ostatnie 10 wiadomości
-                last_messages = messages[-10:] if len(messages) > 10 else messages
-                
                 for i, msg in enumerate(last_messages):
-                    sender = get_text("history_user", language) if msg.get('is_from_user') else get_text("history_bot", language)
-                    content = msg.get('content', '')
+                    sender = get_text("history_user", language) if msg.is_from_user else get_text("history_bot", language)
+                    content = msg.content or ''
                     if content and len(content) > 100:
                         content = content[:97] + "..."
                     content = content.replace("*", "").replace("_", "").replace("`", "").replace("[", "").replace("]", "")
@@ -1,10 +1,12 @@
+from functools import partial
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
 from utils.translations import get_text
 from utils.user_utils import get_user_language
 from utils.menu_manager import update_menu_message, store_menu_state
-from config import BOT_NAME
+from config import BOT_NAME, MAIN_BANNER_URL
+from services.media_registry import get_media_registry
 
 async def handle_back_to_main(update, context):
     """Obsługuje powrót do głównego menu"""
@@ -21,9 +23,6 @@ async def handle_back_to_main(update, context):
     # Pobierz tekst powitalny i usuń potencjalnie problematyczne znaczniki
     welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
     
-    # Link do zdjęcia bannera
-    banner_url = "https://i.imgur.com/YPubLDE.png?v-1123"
-    
     # Utwórz klawiaturę menu
     keyboard = [
         [
@@ -44,9 +43,9 @@ async def handle_back_to_main(update, context):
     
     try:
         # Najpierw próba bez formatowania Markdown
-        message = await context.bot.send_photo(
-            chat_id=query.message.chat_id,
-            photo=banner_url,
+        message = await get_media_registry().send_photo(
+            partial(context.bot.send_photo, chat_id=query.message.chat_id),
+            "main_banner", MAIN_BANNER_URL,
             caption=welcome_text,
             reply_markup=reply_markup
         )
@@ -92,7 +92,7 @@ async def handle_credits_section(update, context, navigation_path=""):
     if navigation_path:
         message_text = f"*{navigation_path}*\n\n"
     
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     # Use enhanced credit display with status bar and visual indicators
     message_text += enhance_credits_display(credits, BOT_NAME)
@@ -1,18 +1,23 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode, ChatAction
-from config import CHAT_MODES, DEFAULT_MODEL, MAX_CONTEXT_MESSAGES, CREDIT_COSTS
+from config import CHAT_MODES, DEFAULT_MODEL, CREDIT_COSTS, RESPONSE_CACHE_MODES
 from utils.translations import get_text
 from utils.user_utils import get_user_language, is_chat_initialized, mark_chat_initialized
 from database.supabase_client import (
-    get_active_conversation, save_message, get_conversation_history, increment_messages_used, create_new_conversation
+    get_active_conversation, save_message, get_context_history, increment_messages_used, create_new_conversation,
+    summarize_conversation_if_needed
 )
-from database.credits_client import get_user_credits, check_user_credits, deduct_user_credits
+from database.models import Conversation
+from database.credits_client import get_user_credits, deduct_user_credits
 from utils.openai_client import chat_completion_stream, prepare_messages_from_history
+from services.model_scheduler import ModelOverloadedError
+from services.model_router import get_charged_credit_cost
+from services.response_cache import get_cached_credit_cost
+from utils.stream_renderer import StreamRenderer
 from utils.visual_styles import create_header, create_status_indicator
 from utils.credit_warnings import check_operation_cost, format_credit_usage_report
 from utils.tips import get_contextual_tip, get_random_tip, should_show_tip
-import datetime
 import logging
 
 logger = logging.getLogger(__name__)
@@ -57,10 +62,10 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             credit_cost = CHAT_MODES[current_mode]["credit_cost"]
     
     # Get current credits
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-    if not check_user_credits(user_id, credit_cost):
+    if credits < credit_cost:
         # Enhanced credit warning with visual indicators
         warning_message = create_header("Niewystarczające kredyty", "warning")
         warning_message += (
@@ -129,6 +134,9 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Pobierz lub utwórz aktywną konwersację
     try:
         conversation = await get_active_conversation(user_id)
+        # Repozytorium zwraca słownik dla istniejącej konwersacji
+        if isinstance(conversation, dict):
+            conversation = Conversation.from_dict(conversation)
         # Używamy notacji z kropką zamiast nawiasów
         conversation_id = conversation.id if hasattr(conversation, 'id') else None
         
@@ -158,22 +166,9 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
     
-    # Zapisz wiadomość użytkownika do bazy danych
-    try:
-        await save_message(conversation_id, user_id, user_message, is_from_user=True)
-    except Exception as e:
-        logger.warning(f"Nie udało się zapisać wiadomości użytkownika: {e}")
-    
     # Wyślij informację, że bot pisze
     await update.message.chat.send_action(action=ChatAction.TYPING)
     
-    # Pobierz historię konwersacji
-    try:
-        history = await get_conversation_history(conversation_id, limit=MAX_CONTEXT_MESSAGES)
-    except Exception as e:
-        logger.warning(f"Nie udało się pobrać historii konwersacji: {e}")
-        history = []
-    
     # Określ model do użycia - domyślny lub z trybu czatu
     model_to_use = CHAT_MODES[current_mode].get("model", DEFAULT_MODEL)
     
@@ -185,43 +180,53 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Aktualizuj koszt kredytów na podstawie modelu
             credit_cost = CREDIT_COSTS["message"].get(model_to_use, CREDIT_COSTS["message"]["default"])
     
+    # Wiadomości ujęte w streszczeniu zastępujemy samym streszczeniem
+    summary = getattr(conversation, 'summary', None)
+    
+    # Pobierz historię wypełniającą budżet tokenów modelu (przed zapisem bieżącej wiadomości, która jest dodawana osobno)
+    try:
+        history = await get_context_history(
+            conversation_id, model_to_use, getattr(conversation, 'summary_until_message_id', None)
+        )
+        # Odpowiedź na pierwsze pytanie rozmowy nie zależy od historii - w wybranych trybach może pochodzić z cache
+        use_cache = not history and not summary and current_mode in RESPONSE_CACHE_MODES
+    except Exception as e:
+        logger.warning(f"Nie udało się pobrać historii konwersacji: {e}")
+        history = []
+        use_cache = False
+    
+    # Zapisz wiadomość użytkownika do bazy danych
+    try:
+        await save_message(conversation_id, user_id, user_message, is_from_user=True)
+    except Exception as e:
+        logger.warning(f"Nie udało się zapisać wiadomości użytkownika: {e}")
+    
     # Przygotuj system prompt z wybranego trybu
     system_prompt = CHAT_MODES[current_mode]["prompt"]
     
     # Przygotuj wiadomości dla API OpenAI
-    messages = prepare_messages_from_history(history, user_message, system_prompt)
+    messages = prepare_messages_from_history(history, user_message, system_prompt, model=model_to_use, summary=summary)
     
     # Wyślij początkową pustą wiadomość, którą będziemy aktualizować
     response_message = await update.message.reply_text(get_text("generating_response", language, default="Generowanie odpowiedzi..."))
     
-    # Zainicjuj pełną odpowiedź
-    full_response = ""
-    buffer = ""
-    last_update = datetime.datetime.now().timestamp()
+    renderer = StreamRenderer(response_message)
     
     # Spróbuj wygenerować odpowiedź
     try:
         # Generuj odpowiedź strumieniowo
-        async for chunk in chat_completion_stream(messages, model=model_to_use):
-            full_response += chunk
-            buffer += chunk
-            
-            # Aktualizuj wiadomość co 1 sekundę lub gdy bufor jest wystarczająco duży
-            current_time = datetime.datetime.now().timestamp()
-            if current_time - last_update >= 1.0 or len(buffer) > 100:
-                try:
-                    # Dodaj migający kursor na końcu wiadomości
-                    await response_message.edit_text(full_response + "▌", parse_mode=ParseMode.MARKDOWN)
-                    buffer = ""
-                    last_update = current_time
-                except Exception as e:
-                    logger.debug(f"Nieistotny błąd przy aktualizacji: {e}")
+        stream = chat_completion_stream(messages, model=model_to_use, mode=current_mode, use_cache=use_cache)
+        async for chunk in stream:
+            await renderer.append(chunk)
         
         # Aktualizuj wiadomość z pełną odpowiedzią bez kursora
-        try:
-            await response_message.edit_text(full_response, parse_mode=ParseMode.MARKDOWN)
-        except Exception as e:
-            await response_message.edit_text(full_response)
+        full_response = await renderer.finish()
+        
+        # Przy awarii modelu odpowiedź mógł wygenerować model zapasowy - rozliczamy faktycznie użyty
+        credit_cost = get_charged_credit_cost(credit_cost, model_to_use, stream.model)
+        model_to_use = stream.model
+        if getattr(stream, 'cached', False):
+            credit_cost = get_cached_credit_cost(credit_cost)
         
         # Zapisz odpowiedź do bazy danych
         try:
@@ -229,11 +234,24 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except Exception as e:
             logger.warning(f"Nie udało się zapisać odpowiedzi do bazy: {e}")
         
-        # Odejmij kredyty
+        # Streszczanie starszej części rozmowy w tle, po dostarczeniu odpowiedzi
+        context.application.create_task(summarize_conversation_if_needed(conversation_id))
+        
+        # Odejmij kredyty - wynik operacji zawiera aktualny stan kredytów
         try:
-            await deduct_user_credits(user_id, credit_cost, get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"))
+            if credit_cost > 0:
+                deduct_result = await deduct_user_credits(
+                    user_id, credit_cost, get_text("message_model", language, model=model_to_use, default=f"Wiadomość ({model_to_use})"),
+                    operation_type="message", model=model_to_use
+                )
+                if deduct_result:
+                    credits = deduct_result['credits_after']
         except Exception as e:
             logger.warning(f"Nie udało się odjąć kredytów: {e}")
+    except ModelOverloadedError as e:
+        logger.warning(f"Odrzucono zapytanie: {e}")
+        await response_message.edit_text(get_text("model_overloaded", language))
+        return
     except Exception as e:
         logger.error(f"Błąd generowania odpowiedzi: {e}")
         await response_message.edit_text(get_text("response_error", language, error=str(e), default=f"Wystąpił błąd podczas generowania odpowiedzi: {str(e)}"))
@@ -241,7 +259,6 @@ async def message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Sprawdź aktualny stan kredytów
     try:
-        credits = get_user_credits(user_id)
         if credits < 5:
             # Dodaj przycisk doładowania kredytów
             keyboard = [[InlineKeyboardButton(get_text("buy_credits_btn_with_icon", language, default="🛒 Kup kredyty"), callback_data="menu_credits_buy")]]
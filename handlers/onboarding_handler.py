@@ -1,3 +1,4 @@
+from functools import partial
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
@@ -5,6 +6,7 @@ from config import BOT_NAME
 from utils.translations import get_text
 from utils.user_utils import get_user_language
 from handlers.menu_handler import store_menu_state
+from services.media_registry import get_media_registry
 
 def get_onboarding_image_url(step_name):
     """
@@ -72,8 +74,8 @@ async def onboarding_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Wysyłamy zdjęcie z podpisem dla pierwszego kroku
-    await update.message.reply_photo(
-        photo=get_onboarding_image_url(step_name),
+    await get_media_registry().send_photo(
+        update.message.reply_photo, f"onboarding_{step_name}", get_onboarding_image_url(step_name),
         caption=text,
         reply_markup=reply_markup,
         parse_mode=ParseMode.MARKDOWN
@@ -206,9 +208,9 @@ async def handle_onboarding_callback(update: Update, context: ContextTypes.DEFAU
     try:
         # Usuń poprzednią wiadomość i wyślij nową z odpowiednim obrazem
         await query.message.delete()
-        await context.bot.send_photo(
-            chat_id=query.message.chat_id,
-            photo=image_url,
+        await get_media_registry().send_photo(
+            partial(context.bot.send_photo, chat_id=query.message.chat_id),
+            f"onboarding_{step_name}", image_url,
             caption=text,
             reply_markup=reply_markup,
             parse_mode=ParseMode.MARKDOWN
@@ -153,7 +153,7 @@ async def handle_payment_callback(update: Update, context: ContextTypes.DEFAULT_
             reply_markup = InlineKeyboardMarkup(keyboard)
             
             # Pobierz aktualny stan kredytów
-            credits = get_user_credits(user_id)
+            credits = await get_user_credits(user_id)
             
             message = f"*Stan kredytów*\n\n"
             message += f"Dostępne kredyty: *{credits}*\n\n"
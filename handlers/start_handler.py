@@ -1,11 +1,13 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
-from config import BOT_NAME, AVAILABLE_LANGUAGES
+from config import BOT_NAME, AVAILABLE_LANGUAGES, LANGUAGE_BANNER_URL, MAIN_BANNER_URL
 from utils.translations import get_text
 from database.supabase_client import get_or_create_user, get_message_status
-from database.credits_client import get_user_credits
+from database.credits_client import get_user_credits, invalidate_user_credits
 from utils.user_utils import get_user_language
+from services.user_profile_service import get_user_profile_service
+from services.media_registry import get_media_registry
 from utils.menu import update_menu
 
 # Zabezpieczony import z awaryjnym fallbackiem
@@ -37,6 +39,10 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         user_id = user.id
         
+        # Powrót z płatności - webhook Stripe zmienił saldo poza botem, więc odśwież cache kredytów
+        if context.args and context.args[0].startswith("payment_success"):
+            invalidate_user_credits(user_id)
+        
         # Sprawdź, czy użytkownik istnieje w bazie
         user_data = get_or_create_user(
             user_id=user_id,
@@ -54,14 +60,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                                   user_id in context.chat_data['user_data'] and 
                                   'language' in context.chat_data['user_data'][user_id])
         
-        # Sprawdź też w bazie danych, czy użytkownik ma już ustawiony język
-        has_language_in_db = False
-        try:
-            response = supabase.table('users').select('language').eq('id', user_id).execute()
-            if response.data and response.data[0].get('language'):
-                has_language_in_db = True
-        except Exception:
-            pass  # Ignoruj błędy przy sprawdzaniu bazy
+        # Sprawdź też w profilu z bazy danych (cache), czy użytkownik ma już ustawiony język
+        profile = await get_user_profile_service().get(user_id)
+        has_language_in_db = bool(profile and profile.language)
 
         # Jeśli użytkownik ma już ustawiony język, pokaż menu od razu
         if has_language_in_context or has_language_in_db:
@@ -99,15 +100,12 @@ async def show_language_selection(update: Update, context: ContextTypes.DEFAULT_
         
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        # Link do zdjęcia bannera
-        banner_url = "https://i.imgur.com/OiPImmC.png?v-111"
-        
         # Użyj neutralnego języka dla pierwszej wiadomości
         language_message = f"Wybierz język / Choose language / Выберите язык:"
         
-        # Wyślij zdjęcie z tekstem wyboru języka
-        await update.message.reply_photo(
-            photo=banner_url,
+        # Wyślij zdjęcie z tekstem wyboru języka (file_id z rejestru zamiast pobierania URL)
+        await get_media_registry().send_photo(
+            update.message.reply_photo, "language_banner", LANGUAGE_BANNER_URL,
             caption=language_message,
             reply_markup=reply_markup
         )
@@ -137,7 +135,7 @@ async def handle_language_selection(update: Update, context: ContextTypes.DEFAUL
         # Zapisz język w bazie danych
         try:
             from database.supabase_client import update_user_language
-            update_user_language(user_id, language)
+            await update_user_language(user_id, language)
         except Exception as e:
             print(f"Błąd zapisywania języka: {e}")
         
@@ -233,10 +231,7 @@ async def show_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYP
         context.chat_data['user_data'][user_id]['language'] = language
         
         # Pobierz stan kredytów
-        credits = get_user_credits(user_id)
-        
-        # Link do zdjęcia bannera
-        banner_url = "https://i.imgur.com/YPubLDE.png?v-1123"
+        credits = await get_user_credits(user_id)
         
         # Pobierz przetłumaczony tekst powitalny
         welcome_text = get_text("welcome_message", language, bot_name=BOT_NAME)
@@ -260,8 +255,8 @@ async def show_welcome_message(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         # Wyślij zdjęcie z podpisem i menu
-        message = await update.message.reply_photo(
-            photo=banner_url,
+        message = await get_media_registry().send_photo(
+            update.message.reply_photo, "main_banner", MAIN_BANNER_URL,
             caption=welcome_text,
             reply_markup=reply_markup
         )
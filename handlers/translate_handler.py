@@ -66,7 +66,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 8  # Koszt tłumaczenia zdjęcia
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -86,7 +86,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     result = await analyze_image(file_bytes, f"photo_{photo.file_unique_id}.jpg", mode="translate", target_language=target_lang)
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Tłumaczenie tekstu ze zdjęcia na język {target_lang}")
+    await deduct_user_credits(user_id, credit_cost, f"Tłumaczenie tekstu ze zdjęcia na język {target_lang}", operation_type="photo")
     
     # Wyślij tłumaczenie
     await message.edit_text(
@@ -95,7 +95,7 @@ async def translate_photo(update: Update, context: ContextTypes.DEFAULT_TYPE, ph
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -109,7 +109,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 8  # Koszt tłumaczenia dokumentu
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -136,7 +136,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     result = await analyze_document(file_bytes, file_name, mode="translate", target_language=target_lang)
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Tłumaczenie dokumentu na język {target_lang}: {file_name}")
+    await deduct_user_credits(user_id, credit_cost, f"Tłumaczenie dokumentu na język {target_lang}: {file_name}", operation_type="document")
     
     # Wyślij tłumaczenie
     await message.edit_text(
@@ -145,7 +145,7 @@ async def translate_document(update: Update, context: ContextTypes.DEFAULT_TYPE,
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
@@ -161,7 +161,7 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     
     # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
     credit_cost = 3  # Koszt tłumaczenia tekstu
-    if not check_user_credits(user_id, credit_cost):
+    if not await check_user_credits(user_id, credit_cost):
         await update.message.reply_text(get_text("subscription_expired", language))
         return
     
@@ -174,7 +174,8 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     await update.message.chat.send_action(action=ChatAction.TYPING)
     
     # Wykonaj tłumaczenie korzystając z API OpenAI
-    from utils.openai_client import chat_completion
+    from utils.openai_client import cached_chat_completion
+    from services.response_cache import get_cached_credit_cost
     
     # Uniwersalny prompt niezależny od języka
     system_prompt = f"You are a professional translator. Translate the following text to {target_lang}. Preserve formatting. Only return the translation."
@@ -185,11 +186,17 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
         {"role": "user", "content": text}
     ]
     
-    # Wykonaj tłumaczenie
-    translation = await chat_completion(messages, model="gpt-3.5-turbo")
+    # Wykonaj tłumaczenie (powtórzone tłumaczenie tego samego tekstu pochodzi z cache)
+    translation, cached = await cached_chat_completion(
+        messages, model="gpt-3.5-turbo",
+        semantic_partition=f"translate:{target_lang}", semantic_text=text
+    )
+    if cached:
+        credit_cost = get_cached_credit_cost(credit_cost)
     
     # Odejmij kredyty
-    deduct_user_credits(user_id, credit_cost, f"Translation to {target_lang}")
+    if credit_cost > 0:
+        await deduct_user_credits(user_id, credit_cost, f"Translation to {target_lang}", operation_type="other", model="gpt-3.5-turbo")
     
     # Wyślij tłumaczenie
     source_lang_name = get_language_name(language)
@@ -201,7 +208,7 @@ async def translate_text(update: Update, context: ContextTypes.DEFAULT_TYPE, tex
     )
     
     # Sprawdź aktualny stan kredytów
-    credits = get_user_credits(user_id)
+    credits = await get_user_credits(user_id)
     if credits < 5:
         await update.message.reply_text(
             f"{get_text('low_credits_warning', language)} {get_text('low_credits_message', language, credits=credits)}",
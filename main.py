@@ -14,7 +14,11 @@ import logging
 logging.basicConfig(level=logging.INFO)
 
 # Sprawdź klucze API po załadowaniu dotenv
-from config import TELEGRAM_TOKEN, OPENAI_API_KEY, ANTHROPIC_API_KEY
+from config import (
+    TELEGRAM_TOKEN, OPENAI_API_KEY, ANTHROPIC_API_KEY, MAX_CONCURRENT_UPDATES, TELEGRAM_API_BASE_URL,
+    BOT_RUN_MODE, DROP_PENDING_UPDATES, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL,
+    WEBHOOK_SECRET_TOKEN, WEBHOOK_MAX_CONNECTIONS, PERSISTENCE_DB_PATH
+)
 
 # Logowanie informacji o dostępności kluczy API
 if not OPENAI_API_KEY:
@@ -22,11 +26,11 @@ if not OPENAI_API_KEY:
 if not ANTHROPIC_API_KEY:
     logging.warning("Brak klucza API Anthropic - funkcje Claude będą niedostępne")
 
-# Inicjalizacja serwisu API zawczasu
-from services.api_service import APIService
-api_service = APIService()
+# Inicjalizacja współdzielonego serwisu API zawczasu
+from services.api_service import get_api_service
+api_service = get_api_service()
 
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -66,48 +70,120 @@ from handlers.file_handler import handle_document, handle_photo
 # Import centralnego routera callbacków
 from handlers.callback_router import route_callback
 
-# Inicjalizacja aplikacji
-application = Application.builder().token(TELEGRAM_TOKEN).build()
-
-# Rejestracja handlerów komend
-application.add_handler(CommandHandler("start", start_command))
-application.add_handler(CommandHandler("help", help_command))
-application.add_handler(CommandHandler("status", check_status))
-application.add_handler(CommandHandler("newchat", new_chat))
-application.add_handler(CommandHandler("restart", restart_command))
-application.add_handler(CommandHandler("mode", show_modes))
-application.add_handler(CommandHandler("image", generate_image))
-application.add_handler(CommandHandler("export", export_conversation))
-application.add_handler(CommandHandler("language", language_command))
-application.add_handler(CommandHandler("onboarding", onboarding_command))
-application.add_handler(CommandHandler("translate", translate_command))
-application.add_handler(CommandHandler("credits", credits_command))
-application.add_handler(CommandHandler("buy", buy_command))
-application.add_handler(CommandHandler("creditstats", credit_stats_command))
-application.add_handler(CommandHandler("payment", payment_command))
-application.add_handler(CommandHandler("subscription", subscription_command))
-application.add_handler(CommandHandler("transactions", transactions_command))
-application.add_handler(CommandHandler("code", code_command))
-
-# Handlery dla administratorów
-application.add_handler(CommandHandler("addpackage", add_package))
-application.add_handler(CommandHandler("listpackages", list_packages))
-application.add_handler(CommandHandler("togglepackage", toggle_package))
-application.add_handler(CommandHandler("adddefaultpackages", add_default_packages))
-application.add_handler(CommandHandler("gencode", admin_generate_code))
-application.add_handler(CommandHandler("userinfo", get_user_info))
-
-# Centralny handler wszystkich callbacków
-application.add_handler(CallbackQueryHandler(route_callback))
-
-# Handler wiadomości tekstowych
-application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
-
-# Handler dokumentów i zdjęć
-application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
-application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+# Współbieżne przetwarzanie aktualizacji z zachowaniem kolejności per użytkownik
+from utils.update_processor import PerUserUpdateProcessor
+from utils.rate_limiter import PriorityRateLimiter
+# Zachowanie chat_data (język, tryb, model) po restarcie
+from utils.persistence import SQLitePersistence
+# Profile użytkowników wczytywane zbiorczo, bez zapytań przy każdym get_user_language
+from services.user_profile_service import get_user_profile_service
+from services.repository_service import get_repository_service
+# Wykresy kredytów renderowane w osobnych procesach
+from services.chart_renderer import get_chart_renderer
+from services.credit_backfill import backfill_credit_operation_types
+# Identyfikatory plików grafik statycznych (banery, onboarding)
+from services.media_registry import get_media_registry
+from utils.user_utils import prefetch_user_profile
+
+async def post_init(application: Application) -> None:
+    """Uruchamia zapis wiadomości w tle i pulę wykresów oraz wczytuje profile użytkowników"""
+    await get_repository_service().message_writer.start()
+    await get_chart_renderer().start()
+    await prefetch_user_profiles(application)
+    application.create_task(backfill_credit_operation_types(get_repository_service().credit_repository))
+
+async def prefetch_user_profiles(application: Application) -> None:
+    """Wczytuje w tle profile użytkowników z zachowanego chat_data, którzy nie mają języka w kontekście"""
+    user_ids = [
+        user_id
+        for chat_data in application.chat_data.values()
+        for user_id, user_data in chat_data.get('user_data', {}).items()
+        if 'language' not in user_data
+    ]
+    if user_ids:
+        application.create_task(get_user_profile_service().prefetch(user_ids))
+
+async def close_api_service(application: Application) -> None:
+    """Zapisuje oczekujące wiadomości i zamyka pule połączeń HTTP przy zatrzymaniu bota"""
+    await get_repository_service().message_writer.close()
+    get_chart_renderer().close()
+    get_media_registry().close()
+    await api_service.close()
+
+def build_application() -> Application:
+    """Buduje aplikację bota i rejestruje handlery"""
+    application = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .base_url(TELEGRAM_API_BASE_URL)
+        .concurrent_updates(PerUserUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .rate_limiter(PriorityRateLimiter())
+        .persistence(SQLitePersistence(PERSISTENCE_DB_PATH))
+        .post_init(post_init)
+        .post_shutdown(close_api_service)
+        .build()
+    )
+
+    # Wczytanie profilu użytkownika przed pozostałymi handlerami
+    application.add_handler(TypeHandler(Update, prefetch_user_profile), group=-1)
+
+    # Rejestracja handlerów komend
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("status", check_status))
+    application.add_handler(CommandHandler("newchat", new_chat))
+    application.add_handler(CommandHandler("restart", restart_command))
+    application.add_handler(CommandHandler("mode", show_modes))
+    application.add_handler(CommandHandler("image", generate_image))
+    application.add_handler(CommandHandler("export", export_conversation))
+    application.add_handler(CommandHandler("language", language_command))
+    application.add_handler(CommandHandler("onboarding", onboarding_command))
+    application.add_handler(CommandHandler("translate", translate_command))
+    application.add_handler(CommandHandler("credits", credits_command))
+    application.add_handler(CommandHandler("buy", buy_command))
+    application.add_handler(CommandHandler("creditstats", credit_stats_command))
+    application.add_handler(CommandHandler("payment", payment_command))
+    application.add_handler(CommandHandler("subscription", subscription_command))
+    application.add_handler(CommandHandler("transactions", transactions_command))
+    application.add_handler(CommandHandler("code", code_command))
+
+    # Handlery dla administratorów
+    application.add_handler(CommandHandler("addpackage", add_package))
+    application.add_handler(CommandHandler("listpackages", list_packages))
+    application.add_handler(CommandHandler("togglepackage", toggle_package))
+    application.add_handler(CommandHandler("adddefaultpackages", add_default_packages))
+    application.add_handler(CommandHandler("gencode", admin_generate_code))
+    application.add_handler(CommandHandler("userinfo", get_user_info))
+
+    # Centralny handler wszystkich callbacków
+    application.add_handler(CallbackQueryHandler(route_callback))
+
+    # Handler wiadomości tekstowych
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, message_handler))
+
+    # Handler dokumentów i zdjęć
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
+    application.add_handler(MessageHandler(filters.PHOTO, handle_photo))
+    
+    return application
 
 # Uruchomienie bota
 if __name__ == "__main__":
+    application = build_application()
     print("Bot uruchomiony z obsługą modeli OpenAI i Claude. Naciśnij Ctrl+C, aby zatrzymać.")
-    application.run_polling()
\ No newline at end of file
+    
+    if BOT_RUN_MODE == "webhook":
+        if not WEBHOOK_URL:
+            raise SystemExit("Tryb webhook wymaga ustawienia WEBHOOK_URL")
+        
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=DROP_PENDING_UPDATES
+        )
+    else:
+        application.run_polling(drop_pending_updates=DROP_PENDING_UPDATES)
\ No newline at end of file
@@ -101,6 +101,24 @@ class ConversationRepository(BaseRepository[Conversation]):
             logger.error(f"Błąd usuwania konwersacji {id}: {e}")
             return False
     
+    async def update_summary(self, conversation_id: int, summary: str, until_message_id: int) -> bool:
+        """Zapisuje streszczenie konwersacji obejmujące wiadomości do until_message_id włącznie"""
+        try:
+            result = await self.client.query(
+                self.table,
+                query_type="update",
+                filters={"id": conversation_id},
+                data={
+                    "summary": summary,
+                    "summary_until_message_id": until_message_id
+                }
+            )
+            
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Błąd zapisu streszczenia konwersacji {conversation_id}: {e}")
+            return False
+    
     async def get_active_conversation(self, user_id: int):
         """Pobiera aktywną konwersację dla użytkownika w formie słownika"""
         try:
@@ -1,9 +1,11 @@
 # repositories/credit_repository.py
+import asyncio
 import logging
 from typing import List, Dict, Optional, Tuple, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import pytz
 from api.supabase_client import SupabaseClient
+from config import CREDIT_STATS_DAYS, CREDIT_HISTORY_LIMIT, CREDIT_TRANSACTIONS_MAX_ROWS
 
 logger = logging.getLogger(__name__)
 
@@ -56,117 +58,55 @@ class CreditRepository:
             logger.error(f"Błąd inicjalizacji kredytów użytkownika {user_id}: {e}")
             return False
     
-    async def add_user_credits(self, user_id: int, amount: int, description: Optional[str] = None) -> bool:
-        """Dodaje kredyty użytkownikowi"""
+    async def add_user_credits(self, user_id: int, amount: int, description: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """Dodaje kredyty użytkownikowi (atomowo, przez RPC) i zwraca stan przed i po operacji"""
         try:
-            now = datetime.now(pytz.UTC).isoformat()
-            
-            # Pobierz aktualną liczbę kredytów
-            result = await self.client.query(
-                self.credits_table,
-                query_type="select", 
-                columns="credits_amount",
-                filters={"user_id": user_id}
+            result = await self.client.rpc(
+                "add_user_credits",
+                {"p_user_id": user_id, "p_amount": amount, "p_description": description}
             )
             
-            if result:
-                current_credits = result[0].get('credits_amount', 0)
-                
-                # Aktualizuj istniejący rekord
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': current_credits + amount,
-                        'total_credits_purchased': self.client.client.raw(f'total_credits_purchased + {amount}'),
-                        'last_purchase_date': now
-                    }
-                )
-            else:
-                # Utwórz nowy rekord
-                current_credits = 0
-                await self.init_user_credits(user_id)
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': amount,
-                        'total_credits_purchased': amount,
-                        'last_purchase_date': now
-                    }
-                )
-            
-            # Zapisz transakcję
-            if amount != 0:
-                await self.client.query(
-                    self.transactions_table,
-                    query_type="insert",
-                    data={
-                        'user_id': user_id,
-                        'transaction_type': 'add',
-                        'amount': amount,
-                        'credits_before': current_credits,
-                        'credits_after': current_credits + amount,
-                        'description': description,
-                        'created_at': now
-                    }
-                )
+            if not result or not result[0].get('success'):
+                return None
             
-            return True
+            return {
+                'credits_before': result[0].get('credits_before', 0),
+                'credits_after': result[0].get('credits_after', 0)
+            }
         except Exception as e:
             logger.error(f"Błąd dodawania kredytów użytkownikowi {user_id}: {e}")
-            return False
+            return None
     
-    async def deduct_user_credits(self, user_id: int, amount: int, description: Optional[str] = None) -> bool:
-        """Odejmuje kredyty użytkownikowi"""
+    async def deduct_user_credits(self, user_id: int, amount: int, description: Optional[str] = None,
+                                  operation_type: Optional[str] = None, model: Optional[str] = None) -> Optional[Dict[str, int]]:
+        """
+        Odejmuje kredyty użytkownikowi (atomowo, przez RPC) i zwraca stan przed i po operacji
+        
+        Args:
+            operation_type: Rodzaj operacji (klucz CREDIT_COSTS: message, image, document, photo);
+                bez niego baza ustala rodzaj na podstawie opisu
+            model: Model, którego użyła operacja
+        """
         try:
-            # Pobierz aktualną liczbę kredytów
-            result = await self.client.query(
-                self.credits_table,
-                query_type="select", 
-                columns="credits_amount",
-                filters={"user_id": user_id}
-            )
-            
-            if not result:
-                return False
-            
-            current_credits = result[0].get('credits_amount', 0)
-            
-            # Sprawdź, czy użytkownik ma wystarczającą liczbę kredytów
-            if current_credits < amount:
-                return False
-            
-            # Odejmij kredyty
-            await self.client.query(
-                self.credits_table,
-                query_type="update",
-                filters={"user_id": user_id},
-                data={'credits_amount': current_credits - amount}
-            )
-            
-            # Zapisz transakcję
-            now = datetime.now(pytz.UTC).isoformat()
-            await self.client.query(
-                self.transactions_table,
-                query_type="insert",
-                data={
-                    'user_id': user_id,
-                    'transaction_type': 'deduct',
-                    'amount': amount,
-                    'credits_before': current_credits,
-                    'credits_after': current_credits - amount,
-                    'description': description,
-                    'created_at': now
+            # Sprawdzenie salda, odjęcie i zapis transakcji w jednej transakcji bazy danych
+            result = await self.client.rpc(
+                "deduct_user_credits",
+                {
+                    "p_user_id": user_id, "p_amount": amount, "p_description": description,
+                    "p_operation_type": operation_type, "p_model": model
                 }
             )
             
-            return True
+            if not result or not result[0].get('success'):
+                return None
+            
+            return {
+                'credits_before': result[0].get('credits_before', 0),
+                'credits_after': result[0].get('credits_after', 0)
+            }
         except Exception as e:
             logger.error(f"Błąd odejmowania kredytów użytkownikowi {user_id}: {e}")
-            return False
+            return None
     
     async def check_user_credits(self, user_id: int, amount_needed: int) -> bool:
         """Sprawdza, czy użytkownik ma wystarczającą liczbę kredytów"""
@@ -205,145 +145,132 @@ class CreditRepository:
             return None
     
     async def purchase_credits(self, user_id: int, package_id: int) -> Tuple[bool, Optional[Dict[str, Any]]]:
-        """Dokonuje zakupu kredytów"""
+        """Dokonuje zakupu kredytów (atomowo, przez RPC)"""
         try:
-            # Pobierz informacje o pakiecie
-            package = await self.get_package_by_id(package_id)
-            if not package:
-                return False, None
-            
-            # Dodaj kredyty użytkownikowi
-            now = datetime.now(pytz.UTC).isoformat()
-            description = f"Zakup pakietu {package['name']}"
-            
-            # Pobierz aktualny stan kredytów
-            result = await self.client.query(
-                self.credits_table,
-                query_type="select", 
-                columns="credits_amount",
-                filters={"user_id": user_id}
+            result = await self.client.rpc(
+                "purchase_credits",
+                {"p_user_id": user_id, "p_package_id": package_id}
             )
             
-            if result:
-                current_credits = result[0].get('credits_amount', 0)
-                
-                # Aktualizuj rekord użytkownika
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': current_credits + package['credits'],
-                        'total_credits_purchased': self.client.client.raw(f'total_credits_purchased + {package["credits"]}'),
-                        'last_purchase_date': now,
-                        'total_spent': self.client.client.raw(f'total_spent + {package["price"]}')
-                    }
-                )
-            else:
-                # Jeśli rekord nie istnieje, utwórz go
-                current_credits = 0
-                await self.init_user_credits(user_id)
-                await self.client.query(
-                    self.credits_table,
-                    query_type="update",
-                    filters={"user_id": user_id},
-                    data={
-                        'credits_amount': package['credits'],
-                        'total_credits_purchased': package['credits'],
-                        'last_purchase_date': now,
-                        'total_spent': package['price']
-                    }
-                )
-            
-            # Zapisz transakcję
-            await self.client.query(
-                self.transactions_table,
-                query_type="insert",
-                data={
-                    'user_id': user_id,
-                    'transaction_type': 'purchase',
-                    'amount': package['credits'],
-                    'credits_before': current_credits,
-                    'credits_after': current_credits + package['credits'],
-                    'description': description,
-                    'created_at': now
-                }
-            )
+            if not result or not result[0].get('success'):
+                return False, None
             
-            return True, package
+            return True, result[0].get('package')
         except Exception as e:
             logger.error(f"Błąd zakupu kredytów: {e}")
             return False, None
             
     async def get_transactions(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
-        """Pobiera historię transakcji kredytowych użytkownika z ostatnich dni"""
+        """Pobiera historię transakcji kredytowych użytkownika z ostatnich dni (filtrowaną po stronie bazy)"""
         try:
             # Oblicz datę początkową
             start_date = (datetime.now(pytz.UTC) - timedelta(days=days)).isoformat()
             
             # Pobierz transakcje z określonego okresu
+            return await self.client.query(
+                self.transactions_table,
+                query_type="select",
+                filters={"user_id": user_id, "created_at": ("gte", start_date)},
+                order_by="created_at",
+                limit=CREDIT_TRANSACTIONS_MAX_ROWS
+            )
+        except Exception as e:
+            logger.error(f"Błąd pobierania transakcji użytkownika {user_id}: {e}")
+            return []
+    
+    async def get_recent_transactions(self, user_id: int, limit: int = CREDIT_HISTORY_LIMIT) -> List[Dict[str, Any]]:
+        """Pobiera ostatnie transakcje użytkownika (od najnowszej)"""
+        try:
+            return await self.client.query(
+                self.transactions_table,
+                query_type="select",
+                columns="transaction_type, amount, created_at, description",
+                filters={"user_id": user_id},
+                order_by="-created_at",
+                limit=limit
+            )
+        except Exception as e:
+            logger.error(f"Błąd pobierania ostatnich transakcji użytkownika {user_id}: {e}")
+            return []
+    
+    async def get_ledger_version(self, user_id: int) -> Optional[int]:
+        """
+        Zwraca najwyższy identyfikator transakcji użytkownika
+
+        Returns:
+            Optional[int]: Identyfikator (0, jeśli nie ma transakcji) lub None, jeśli nie udało się go pobrać
+        """
+        try:
+            # Kolejność po id, nie po created_at - identyczne lub przesunięte znaczniki czasu
+            # mogłyby zwrócić starszą transakcję
             result = await self.client.query(
                 self.transactions_table,
                 query_type="select",
+                columns="id",
                 filters={"user_id": user_id},
-                order_by="created_at"
+                order_by="-id",
+                limit=1,
+                raise_errors=True
             )
-            
-            # Filtruj transakcje po dacie
-            filtered_transactions = [t for t in result if t.get('created_at', '') >= start_date]
-            
-            return filtered_transactions
+            return (result[0].get('id') or 0) if result else 0
         except Exception as e:
-            logger.error(f"Błąd pobierania transakcji użytkownika {user_id}: {e}")
+            logger.error(f"Błąd pobierania ostatniej transakcji użytkownika {user_id}: {e}")
+            return None
+    
+    async def get_daily_usage(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Pobiera dzienne podsumowania transakcji (RPC get_credit_daily_usage)
+        
+        Returns:
+            list: Wiersze z polami day, spent, added, closing_balance (od najstarszego dnia)
+        """
+        try:
+            return await self.client.rpc("get_credit_daily_usage", {"p_user_id": user_id, "p_days": days})
+        except Exception as e:
+            logger.error(f"Błąd pobierania dziennego zużycia kredytów użytkownika {user_id}: {e}")
             return []
-            
-    async def get_usage_by_type(self, user_id: int, days: int = 30) -> Dict[str, int]:
-        """Pobiera rozkład zużycia kredytów według rodzaju operacji"""
+    
+    async def get_usage_by_category(self, user_id: int, days: int = 30) -> List[Dict[str, Any]]:
+        """
+        Pobiera zużycie kredytów według kategorii operacji (RPC get_credit_usage_by_category)
+        
+        Returns:
+            list: Wiersze z polami category, spent, transactions, max_spent, max_description
+        """
         try:
-            # Pobierz transakcje
-            transactions = await self.get_transactions(user_id, days)
-            
-            # Wyfiltruj tylko transakcje typu 'deduct'
-            deduct_transactions = [t for t in transactions if t.get('transaction_type') == 'deduct']
-            
-            # Przygotuj kategorie
-            usage_by_type = {}
-            
-            # Analizuj opisy transakcji, aby określić kategorie
-            for transaction in deduct_transactions:
-                description = transaction.get('description', '').lower()
-                amount = transaction.get('amount', 0)
-                
-                # Określ kategorię na podstawie opisu
-                if any(term in description for term in ['wiadomość', 'message', 'chat', 'gpt']):
-                    category = "Wiadomości"
-                elif any(term in description for term in ['obraz', 'dall-e', 'image', 'dall']):
-                    category = "Obrazy"
-                elif any(term in description for term in ['dokument', 'document', 'pdf', 'plik']):
-                    category = "Dokumenty"
-                elif any(term in description for term in ['zdjęci', 'zdjęc', 'photo', 'foto']):
-                    category = "Zdjęcia"
-                else:
-                    category = "Inne"
-                
-                # Dodaj do odpowiedniej kategorii
-                if category not in usage_by_type:
-                    usage_by_type[category] = 0
-                usage_by_type[category] += amount
-            
-            return usage_by_type
+            return await self.client.rpc("get_credit_usage_by_category", {"p_user_id": user_id, "p_days": days})
         except Exception as e:
-            logger.error(f"Błąd pobierania rozkładu zużycia kredytów: {e}")
-            return {"Błąd analizy": 1}
+            logger.error(f"Błąd pobierania rozkładu zużycia kredytów użytkownika {user_id}: {e}")
+            return []
+            
+    async def get_usage_by_type(self, user_id: int, days: int = 30) -> Dict[str, int]:
+        """Pobiera rozkład zużycia kredytów według rodzaju operacji (message, image, document, photo, other)"""
+        rows = await self.get_usage_by_category(user_id, days)
+        return {row['category']: row.get('spent', 0) for row in rows}
+
+    async def classify_transactions(self, batch_size: int) -> int:
+        """
+        Uzupełnia rodzaj operacji i model w partii starszych transakcji (RPC classify_credit_transactions)
+        
+        Returns:
+            int: Liczba uzupełnionych transakcji (0 - wszystkie są już sklasyfikowane)
+        """
+        result = await self.client.rpc("classify_credit_transactions", {"p_batch_size": batch_size})
+        return int(result[0]) if result else 0
 
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Pobiera statystyki użytkownika dotyczące kredytów"""
         try:
-            # Pobierz dane kredytów użytkownika
-            credits_result = await self.client.query(
-                self.credits_table,
-                query_type="select",
-                filters={"user_id": user_id}
+            # Stan kredytów, podsumowania z ostatnich dni i kilka ostatnich transakcji - równolegle
+            credits_result, daily_usage, usage_by_category, recent_transactions = await asyncio.gather(
+                self.client.query(
+                    self.credits_table,
+                    query_type="select",
+                    filters={"user_id": user_id}
+                ),
+                self.get_daily_usage(user_id, CREDIT_STATS_DAYS),
+                self.get_usage_by_category(user_id, CREDIT_STATS_DAYS),
+                self.get_recent_transactions(user_id)
             )
             
             if not credits_result:
@@ -351,27 +278,22 @@ class CreditRepository:
             
             user_credits = credits_result[0]
             
-            # Pobierz historię transakcji
-            transactions = await self.get_transactions(user_id, days=90)
-            
-            # Oblicz średnie dzienne zużycie
-            deduct_transactions = [t for t in transactions if t.get('transaction_type') == 'deduct']
-            total_usage = sum(t.get('amount', 0) for t in deduct_transactions)
-            days_analyzed = min(90, len(deduct_transactions))
-            avg_daily_usage = total_usage / max(1, days_analyzed) if deduct_transactions else 0
+            # Średnie dzienne zużycie od pierwszego dnia z transakcjami w analizowanym okresie
+            avg_daily_usage = 0
+            if daily_usage:
+                first_day = date.fromisoformat(str(daily_usage[0]['day']))
+                days_analyzed = (datetime.now(pytz.UTC).date() - first_day).days + 1
+                avg_daily_usage = sum(row.get('spent', 0) for row in daily_usage) / max(1, days_analyzed)
             
-            # Znajdź najdroższą operację
+            # Najdroższa operacja
             most_expensive_operation = None
-            max_amount = 0
-            for t in deduct_transactions:
-                amount = t.get('amount', 0)
-                if amount > max_amount:
-                    max_amount = amount
-                    most_expensive_operation = t.get('description', 'Nieznana operacja')
+            if usage_by_category:
+                most_expensive = max(usage_by_category, key=lambda row: row.get('max_spent') or 0)
+                most_expensive_operation = most_expensive.get('max_description') or 'Nieznana operacja'
             
-            # Przygotuj historię transakcji do zwrotu
+            # Historia ostatnich transakcji (od najnowszej)
             usage_history = []
-            for t in transactions:
+            for t in recent_transactions:
                 usage_history.append({
                     'type': t.get('transaction_type', ''),
                     'amount': t.get('amount', 0),
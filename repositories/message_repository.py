@@ -1,20 +1,50 @@
 # repositories/message_repository.py
 import logging
+from collections import deque
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import pytz
 from database.models import Message
 from repositories.base_repository import BaseRepository
 from api.supabase_client import SupabaseClient
+from utils.cache import TTLCache
+from utils.token_counter import get_encoding_name, count_tokens
+from config import MAX_CONTEXT_MESSAGES, CONTEXT_CACHE_MAX_CONVERSATIONS, CONTEXT_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
+class ConversationWindow:
+    """Okno ostatnich wiadomości konwersacji przechowywane w pamięci"""
+    
+    def __init__(self, messages: List[Message], complete: bool, size: int = MAX_CONTEXT_MESSAGES):
+        self.messages = deque(messages[-size:], maxlen=size)
+        # True, jeśli okno zawiera wszystkie wiadomości konwersacji
+        self.complete = complete and len(messages) <= size
+    
+    def can_serve(self, limit: int) -> bool:
+        """Sprawdza, czy okno wystarcza do zwrócenia `limit` ostatnich wiadomości"""
+        return self.complete or len(self.messages) >= limit
+    
+    def tail(self, limit: int) -> List[Message]:
+        """Zwraca `limit` ostatnich wiadomości"""
+        return list(self.messages)[-limit:]
+    
+    def append(self, message: Message) -> None:
+        """Dodaje wiadomość na koniec okna"""
+        if len(self.messages) == self.messages.maxlen:
+            self.complete = False
+        self.messages.append(message)
+
 class MessageRepository(BaseRepository[Message]):
     """Repozytorium dla operacji na wiadomościach"""
     
-    def __init__(self, client: SupabaseClient):
+    def __init__(self, client: SupabaseClient, writer=None):
         self.client = client
         self.table = "messages"
+        # Zapis wiadomości w tle (MessageWriter); bez niego każda wiadomość to osobny INSERT
+        self.writer = writer
+        # Okna kontekstu aktywnych konwersacji (conversation_id -> ConversationWindow)
+        self.windows = TTLCache(maxsize=CONTEXT_CACHE_MAX_CONVERSATIONS, ttl=CONTEXT_CACHE_TTL)
     
     async def get_by_id(self, id: int) -> Optional[Message]:
         """Pobiera wiadomość po ID"""
@@ -55,6 +85,9 @@ class MessageRepository(BaseRepository[Message]):
             if message.model_used:
                 message_data["model_used"] = message.model_used
             
+            if message.token_counts:
+                message_data["token_counts"] = message.token_counts
+            
             result = await self.client.query(
                 self.table, 
                 query_type="insert",
@@ -87,6 +120,7 @@ class MessageRepository(BaseRepository[Message]):
             )
             
             if result:
+                self.windows.invalidate(result[0].get('conversation_id'))
                 return Message.from_dict(result[0])
             raise Exception(f"Błąd aktualizacji wiadomości {message.id} - brak odpowiedzi")
         except Exception as e:
@@ -102,23 +136,58 @@ class MessageRepository(BaseRepository[Message]):
                 filters={"id": id}
             )
             
+            for row in result:
+                self.windows.invalidate(row.get('conversation_id'))
+            
             return bool(result)
         except Exception as e:
             logger.error(f"Błąd usuwania wiadomości {id}: {e}")
             return False
     
-    async def get_conversation_history(self, conversation_id: int, limit: int = 20) -> List[Message]:
-        """Pobiera historię wiadomości dla konwersacji"""
+    async def get_conversation_history(self, conversation_id: int, limit: int = 20,
+                                       before_id: Optional[int] = None) -> List[Message]:
+        """
+        Pobiera ostatnie `limit` wiadomości konwersacji (od najstarszej do najnowszej)
+        
+        Args:
+            conversation_id: ID konwersacji
+            limit: Maksymalna liczba wiadomości
+            before_id: Kursor - zwraca tylko wiadomości starsze niż wiadomość o tym ID
+        """
+        # Okno w pamięci obsługuje typowy przypadek bez zapytania do bazy
+        window = self.windows.get(conversation_id) if before_id is None else None
+        if window and window.can_serve(limit):
+            return window.tail(limit)
+        
         try:
+            filters = {"conversation_id": conversation_id}
+            if before_id is not None:
+                filters["id"] = ("lt", before_id)
+            
+            # Pobieramy od końca, aby rozmiar zapytania nie zależał od długości konwersacji
             result = await self.client.query(
                 self.table, 
                 query_type="select",
-                filters={"conversation_id": conversation_id},
-                order_by="created_at", 
+                filters=filters,
+                order_by="-id", 
                 limit=limit
             )
             
-            return [Message.from_dict(data) for data in result]
+            messages = [Message.from_dict(data) for data in reversed(result)]
+            
+            # Wiadomości czekające na zapis w tle są nowsze niż te w bazie
+            if before_id is None and self.writer:
+                saved_ids = {message.client_id for message in messages if message.client_id}
+                unsaved = [message for message in self.writer.get_unsaved_messages(conversation_id)
+                           if message.client_id not in saved_ids]
+                if unsaved:
+                    messages = (messages + unsaved)[-limit:]
+            
+            # Pustego wyniku nie zapamiętujemy - nie da się go odróżnić od błędu zapytania
+            if before_id is None and messages:
+                self.windows.set(conversation_id, ConversationWindow(messages, complete=len(messages) < limit))
+            
+            return messages
         except Exception as e:
             logger.error(f"Błąd pobierania historii konwersacji {conversation_id}: {e}")
             return []
@@ -132,10 +201,27 @@ class MessageRepository(BaseRepository[Message]):
                 user_id=user_id,
                 content=content,
                 is_from_user=is_from_user,
-                model_used=model_used
+                model_used=model_used,
+                created_at=datetime.now(pytz.UTC)
             )
             
-            return await self.create(message)
+            # Liczba tokenów odpowiedzi jest zapisywana razem z wiadomością
+            if model_used:
+                encoding_name = get_encoding_name(model_used)
+                message.token_counts[encoding_name] = count_tokens(content, encoding_name)
+            
+            if self.writer:
+                # Zapis w tle - id wiadomości zostanie uzupełnione po zapisie partii
+                self.writer.add_message(message)
+                saved = message
+            else:
+                saved = await self.create(message)
+            
+            window = self.windows.get(conversation_id)
+            if window:
+                window.append(saved)
+            
+            return saved
         except Exception as e:
             logger.error(f"Błąd zapisywania wiadomości: {e}")
             return None
\ No newline at end of file
@@ -1,7 +1,7 @@
 # repositories/user_repository.py
 import logging
 from typing import List, Optional
-from database.models import User
+from database.models import User, UserProfile
 from repositories.base_repository import BaseRepository
 from api.supabase_client import SupabaseClient
 
@@ -33,7 +33,7 @@ class UserRepository(BaseRepository[User]):
     async def get_all(self) -> List[User]:
         """Pobiera wszystkich użytkowników"""
         try:
-            result = await self.client.select(self.table)
+            result = await self.client.query(self.table)
             return [User.from_dict(data) for data in result]
         except Exception as e:
             logger.error(f"Błąd pobierania wszystkich użytkowników: {e}")
@@ -51,8 +51,15 @@ class UserRepository(BaseRepository[User]):
                 "is_active": user.is_active
             }
             
-            result = await self.client.insert(self.table, user_data)
-            return User.from_dict(result)
+            result = await self.client.query(
+                self.table,
+                query_type="insert",
+                data=user_data
+            )
+            
+            if result:
+                return User.from_dict(result[0])
+            raise Exception("Błąd tworzenia użytkownika - brak odpowiedzi")
         except Exception as e:
             logger.error(f"Błąd tworzenia użytkownika: {e}")
             raise
@@ -79,4 +86,29 @@ class UserRepository(BaseRepository[User]):
             return True
         except Exception as e:
             logger.error(f"Błąd podczas zwiększania licznika wiadomości: {e}")
+            return False
+    
+    async def get_profiles(self, user_ids: List[int]) -> List[UserProfile]:
+        """Pobiera profile wielu użytkowników jednym zapytaniem"""
+        if not user_ids:
+            return []
+        
+        result = await self.client.query(
+            self.table,
+            filters={"id": ("in", f"({','.join(str(user_id) for user_id in user_ids)})")}
+        )
+        return [UserProfile.from_dict(data) for data in result]
+    
+    async def update_language(self, user_id: int, language: str) -> bool:
+        """Zapisuje język wybrany przez użytkownika"""
+        try:
+            result = await self.client.query(
+                self.table,
+                query_type="update",
+                filters={"id": user_id},
+                data={"language": language}
+            )
+            return bool(result)
+        except Exception as e:
+            logger.error(f"Błąd zapisywania języka użytkownika {user_id}: {e}")
             return False
\ No newline at end of file
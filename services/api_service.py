@@ -1,10 +1,19 @@
 # services/api_service.py
 import logging
-from typing import Dict, List, AsyncGenerator
+from typing import Dict, List, AsyncGenerator, Optional, Tuple
 from api.openai_client import OpenAIClient
 from api.anthropic_client import AnthropicClient
 from api.supabase_client import SupabaseClient
-from config import OPENAI_API_KEY, ANTHROPIC_API_KEY, DEFAULT_MODEL, SUPABASE_URL, SUPABASE_KEY
+from api.http_client import create_http_client
+from services.model_scheduler import ModelScheduler
+from services.model_router import ModelRouter, RoutedStream
+from services.response_cache import ResponseCache, CachedResponseStream, make_cache_key
+from services.semantic_cache import SemanticCache
+from utils.token_counter import get_encoding_name, count_tokens, count_message_tokens
+from config import (
+    OPENAI_API_KEY, ANTHROPIC_API_KEY, DEFAULT_MODEL, SUPABASE_URL, SUPABASE_KEY,
+    SEMANTIC_CACHE_EMBEDDING_MODEL, SEMANTIC_CACHE_MIN_CHARS, SEMANTIC_CACHE_MAX_CHARS
+)
 
 logger = logging.getLogger(__name__)
 
@@ -12,8 +21,10 @@ class APIService:
     """Centralny serwis API zapewniający dostęp do wszystkich zewnętrznych API"""
     
     def __init__(self):
-        self.openai = OpenAIClient(api_key=OPENAI_API_KEY)
-        self.anthropic = AnthropicClient(api_key=ANTHROPIC_API_KEY)
+        # Jedna pula połączeń (keep-alive, HTTP/2) współdzielona przez klientów OpenAI i Anthropic
+        self.http_client = create_http_client()
+        self.openai = OpenAIClient(api_key=OPENAI_API_KEY, http_client=self.http_client)
+        self.anthropic = AnthropicClient(api_key=ANTHROPIC_API_KEY, http_client=self.http_client)
         self.supabase = SupabaseClient(url=SUPABASE_URL, key=SUPABASE_KEY)
         
         # Określenie, które modele należą do którego klienta
@@ -24,24 +35,120 @@ class APIService:
             "claude-3-opus"
         ]
         
+        # Limity współbieżności i tokenów na minutę per model i dostawca - drogie modele nie blokują tanich
+        self.scheduler = ModelScheduler()
+        # Wybór modelu zapasowego przy awarii dostawcy
+        self.router = ModelRouter(self)
+        # Odpowiedzi na powtarzające się zapytania (tłumaczenia, pierwsze pytania w trybach)
+        self.response_cache = ResponseCache()
+        self.semantic_cache = SemanticCache()
+        
         logger.info("Serwis API zainicjalizowany")
     
-    async def chat_completion_text(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> str:
+    def get_provider(self, model: str) -> str:
+        """Zwraca nazwę dostawcy modelu"""
+        return "anthropic" if model in self.claude_models else "openai"
+    
+    def get_client(self, model: str):
+        """Zwraca klienta API dostawcy modelu"""
+        return self.anthropic if self.get_provider(model) == "anthropic" else self.openai
+    
+    @staticmethod
+    def _estimate_prompt_tokens(messages: List[Dict[str, str]], model: str) -> int:
+        """Szacuje liczbę tokenów promptu na potrzeby budżetu tokenów na minutę"""
+        encoding_name = get_encoding_name(model)
+        return sum(count_message_tokens(message, encoding_name) for message in messages)
+    
+    async def chat_completion_text(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, **kwargs) -> str:
         """Generuje odpowiedź czatu i zwraca tekst"""
-        if model in self.claude_models:
-            return await self.anthropic.chat_completion_text(messages, model)
-        else:
-            return await self.openai.chat_completion_text(messages, model)
+        provider = self.get_provider(model)
+        async with self.scheduler.slot(model, provider, self._estimate_prompt_tokens(messages, model)) as lease:
+            if provider == "anthropic":
+                text = await self.anthropic.chat_completion_text(messages, model, **kwargs)
+            else:
+                text = await self.openai.chat_completion_text(messages, model, **kwargs)
+            lease.consume_tokens(count_tokens(text, get_encoding_name(model)))
+            return text
     
     async def chat_completion_stream(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL) -> AsyncGenerator[str, None]:
         """Generuje strumieniową odpowiedź czatu"""
-        if model in self.claude_models:
-            async for chunk in self.anthropic.chat_completion_stream(messages, model):
-                yield chunk
-        else:
-            async for chunk in self.openai.chat_completion_stream(messages, model):
-                yield chunk
+        provider = self.get_provider(model)
+        async with self.scheduler.slot(model, provider, self._estimate_prompt_tokens(messages, model)) as lease:
+            output = []
+            try:
+                if provider == "anthropic":
+                    async for chunk in self.anthropic.chat_completion_stream(messages, model):
+                        output.append(chunk)
+                        yield chunk
+                else:
+                    async for chunk in self.openai.chat_completion_stream(messages, model):
+                        output.append(chunk)
+                        yield chunk
+            finally:
+                lease.consume_tokens(count_tokens("".join(output), get_encoding_name(model)))
+    
+    async def cached_chat_completion_text(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL,
+                                          semantic_partition: Optional[str] = None, semantic_text: Optional[str] = None,
+                                          **kwargs) -> Tuple[str, bool]:
+        """
+        Generuje odpowiedź czatu, korzystając z cache; zwraca (tekst, czy odpowiedź pochodzi z cache)
+        
+        Jeśli podano semantic_partition i semantic_text, po chybieniu cache dokładnego szukana jest
+        odpowiedź dla niemal identycznego tekstu w tej partycji (np. tłumaczenia na dany język).
+        """
+        key = make_cache_key(model, messages, **kwargs)
+        entry = await self.response_cache.get(key)
+        if entry is not None:
+            return entry["text"], True
+        
+        vector = None
+        if semantic_partition and semantic_text and SEMANTIC_CACHE_MIN_CHARS <= len(semantic_text) <= SEMANTIC_CACHE_MAX_CHARS:
+            partition = f"{model}:{semantic_partition}"
+            try:
+                vector = self.semantic_cache.normalize(
+                    await self.openai.create_embedding(semantic_text, SEMANTIC_CACHE_EMBEDDING_MODEL)
+                )
+                text = self.semantic_cache.get(partition, semantic_text, vector)
+                if text is not None:
+                    return text, True
+            except Exception as e:
+                logger.warning(f"Cache semantyczny niedostępny: {e}")
+                vector = None
+        
+        text = await self.chat_completion_text(messages, model, **kwargs)
+        if text and text.strip():
+            await self.response_cache.set(key, {"text": text, "model": model})
+            if vector is not None:
+                self.semantic_cache.add(partition, semantic_text, vector, text)
+        return text, False
+    
+    def cached_chat_completion_stream(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, mode: Optional[str] = None) -> CachedResponseStream:
+        """Strumieniowa odpowiedź czatu z cache (trafienie: .cached) i przełączaniem na model zapasowy"""
+        return CachedResponseStream(
+            self.response_cache,
+            make_cache_key(model, messages),
+            lambda: self.routed_chat_completion_stream(messages, model, mode),
+            model
+        )
+    
+    def routed_chat_completion_stream(self, messages: List[Dict[str, str]], model: str = DEFAULT_MODEL, mode: Optional[str] = None) -> RoutedStream:
+        """Generuje strumieniową odpowiedź czatu z przełączaniem na model zapasowy (model użyty: .model)"""
+        return self.router.stream(messages, model, mode)
     
     async def generate_image(self, prompt: str) -> str:
         """Generuje obraz za pomocą DALL-E"""
-        return await self.openai.generate_image(prompt)
\ No newline at end of file
+        return await self.openai.generate_image(prompt)
+    
+    async def close(self) -> None:
+        """Zamyka pule połączeń HTTP"""
+        await self.http_client.aclose()
+        await self.supabase.close()
+
+_api_service = None
+
+def get_api_service() -> APIService:
+    """Zwraca współdzieloną (jedną na proces) instancję APIService"""
+    global _api_service
+    if _api_service is None:
+        _api_service = APIService()
+    return _api_service
\ No newline at end of file
@@ -0,0 +1,88 @@
+# services/chart_cache.py
+"""
+Cache wyrenderowanych wykresów z limitem rozmiaru w bajtach (LRU) i identyfikatorami plików Telegrama
+"""
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Hashable, Optional
+from config import CHART_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Przybliżony narzut pamięci na wpis (klucz, obiekt wpisu) w bajtach
+ENTRY_OVERHEAD = 256
+
+@dataclass
+class CachedChart:
+    """Wykres w cache: obraz PNG do czasu pierwszego wysłania, potem tylko file_id"""
+    png: Optional[bytes] = None
+    file_id: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return ENTRY_OVERHEAD + len(self.png or b"") + len(self.file_id or "")
+
+class ChartCache:
+    """
+    Cache LRU wykresów ograniczony łączną wielkością wpisów
+
+    Klucz zawiera wersję danych (np. ostatnią transakcję użytkownika), więc nowe dane
+    trafiają pod nowy klucz, a nieaktualne wpisy wypadają z cache jako najdawniej używane.
+    Po pierwszym wysłaniu obraz zastępowany jest identyfikatorem pliku w Telegramie,
+    więc kolejne wyświetlenia nie przesyłają już obrazu.
+    """
+
+    def __init__(self, max_bytes: int = CHART_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, CachedChart]" = OrderedDict()
+        self._size = 0
+
+    def get(self, key: Hashable) -> Optional[CachedChart]:
+        """Zwraca wykres z cache (i oznacza go jako ostatnio używany)"""
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, png: bytes) -> None:
+        """Zapisuje wyrenderowany obraz"""
+        self._store(key, CachedChart(png=png))
+
+    def set_file_id(self, key: Hashable, file_id: str) -> None:
+        """Zastępuje obraz identyfikatorem pliku zwróconym przez Telegram po wysłaniu"""
+        self._store(key, CachedChart(file_id=file_id))
+
+    def invalidate(self, key: Hashable) -> None:
+        """Usuwa wpis z cache (np. gdy Telegram odrzucił file_id)"""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _store(self, key: Hashable, entry: CachedChart) -> None:
+        if entry.size > self.max_bytes:
+            logger.debug(f"Wykres {key} przekracza limit cache ({entry.size} B)")
+            return
+
+        self.invalidate(key)
+        self._data[key] = entry
+        self._size += entry.size
+
+        while self._size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self._size -= evicted.size
+
+_chart_cache = None
+
+def get_chart_cache() -> ChartCache:
+    """Zwraca współdzieloną (jedną na proces) instancję ChartCache"""
+    global _chart_cache
+    if _chart_cache is None:
+        _chart_cache = ChartCache()
+    return _chart_cache
@@ -0,0 +1,228 @@
+# services/chart_renderer.py
+"""
+Renderowanie wykresów poza pętlą zdarzeń, w puli procesów z rozgrzanym matplotlib
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.dates import DateFormatter
+from matplotlib.figure import Figure
+from config import CHART_RENDER_WORKERS, CHART_RENDER_TIMEOUT, CHART_RENDER_DPI
+
+logger = logging.getLogger(__name__)
+
+# Kolory wycinków wykresu kołowego
+PIE_COLORS = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb366', '#ff6666']
+
+class ChartRenderError(Exception):
+    """Nie udało się wyrenderować wykresu (przekroczony czas lub awaria procesu roboczego)"""
+
+def _to_png(figure: Figure) -> bytes:
+    FigureCanvasAgg(figure)
+    buf = io.BytesIO()
+    figure.savefig(buf, format='png', dpi=CHART_RENDER_DPI)
+    return buf.getvalue()
+
+def render_message_chart(text: str, color: str = 'gray', fontsize: int = 20, figsize=(10, 6)) -> bytes:
+    """Renderuje wykres zawierający tylko komunikat (brak danych, błąd)"""
+    figure = Figure(figsize=figsize)
+    axes = figure.add_subplot()
+    axes.text(0.5, 0.5, text, horizontalalignment='center', verticalalignment='center',
+              fontsize=fontsize, color=color, transform=axes.transAxes, wrap=True)
+    axes.set_axis_off()
+    return _to_png(figure)
+
+def render_usage_chart(data: Dict[str, Any]) -> bytes:
+    """
+    Renderuje historię salda i transakcji kredytów
+
+    Args:
+        data (dict): dates (lista datetime), balances, usage_amounts, purchase_amounts
+            oraz przetłumaczone etykiety: date_label, credits_label, balance_title, details_title
+
+    Returns:
+        bytes: Obraz PNG
+    """
+    dates = data["dates"]
+    figure = Figure(figsize=(10, 6))
+
+    # Wykres salda
+    balance_axes = figure.add_subplot(2, 1, 1)
+    balance_axes.plot(dates, data["balances"], 'b-', label='Saldo kredytów')
+    balance_axes.set_xlabel(data["date_label"])
+    balance_axes.set_ylabel(data["credits_label"])
+    balance_axes.set_title(data["balance_title"])
+    balance_axes.grid(True, linestyle='--', alpha=0.7)
+    balance_axes.xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
+    balance_axes.legend()
+
+    # Wykres użycia/zakupów
+    details_axes = figure.add_subplot(2, 1, 2)
+    dates_num = mdates.date2num(dates)
+
+    # Szerokość słupków w jednostkach daty matplotlib
+    width = min(1.0, (max(dates_num) - min(dates_num)) / len(dates_num) * 0.4) if len(dates_num) > 1 else 1.0
+
+    details_axes.bar(dates_num - width / 2, data["usage_amounts"], width=width, color='r', alpha=0.6, label='Wydane kredyty')
+    details_axes.bar(dates_num + width / 2, data["purchase_amounts"], width=width, color='g', alpha=0.6, label='Dodane kredyty')
+    details_axes.xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
+    details_axes.set_xlabel(data["date_label"])
+    details_axes.set_ylabel(data["credits_label"])
+    details_axes.set_title(data["details_title"])
+    details_axes.grid(True, linestyle='--', alpha=0.7)
+    details_axes.legend()
+
+    for axes in (balance_axes, details_axes):
+        axes.tick_params(axis='x', labelrotation=30)
+    figure.tight_layout()
+    return _to_png(figure)
+
+def render_breakdown_chart(data: Dict[str, Any]) -> bytes:
+    """
+    Renderuje wykres kołowy rozkładu zużycia kredytów
+
+    Args:
+        data (dict): labels, sizes oraz przetłumaczone teksty: title, empty_text
+
+    Returns:
+        bytes: Obraz PNG
+    """
+    sizes = data["sizes"]
+    if sum(sizes) <= 0:
+        return render_message_chart(data["empty_text"], fontsize=16, figsize=(8, 6))
+
+    figure = Figure(figsize=(8, 6))
+    axes = figure.add_subplot()
+    axes.pie(sizes, labels=data["labels"], colors=PIE_COLORS, autopct='%1.1f%%', startangle=90, shadow=True)
+    axes.axis('equal')
+    axes.set_title(data["title"])
+    return _to_png(figure)
+
+def _warm_up_worker(worker_pids=None) -> None:
+    """Zgłasza PID procesu roboczego oraz ładuje czcionki i backend Agg przed pierwszym zleceniem"""
+    if worker_pids is not None:
+        worker_pids.put(os.getpid())
+    render_message_chart("", figsize=(1, 1))
+
+def _get_mp_context():
+    # fork z procesu z działającą pętlą zdarzeń i wątkami kopiowałby ich stan (np. zajęte blokady),
+    # więc procesy robocze powstają z czystego procesu forkserver, który raz importuje matplotlib
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+class ChartRenderer:
+    """
+    Pula procesów renderujących wykresy
+
+    Renderowanie matplotlib trwa setki milisekund i blokowałoby pętlę zdarzeń bota.
+    Procesy robocze są uruchamiane przy starcie (start), zanim bot zacznie obsługiwać
+    aktualizacje, i od razu ładują czcionki.
+    """
+
+    def __init__(self, workers: int = CHART_RENDER_WORKERS, timeout: float = CHART_RENDER_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Kolejki PID-ów procesów roboczych poszczególnych pul (zgłaszanych przez _warm_up_worker)
+        self._worker_pids: Dict[ProcessPoolExecutor, Any] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            context = _get_mp_context()
+            worker_pids = context.SimpleQueue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=context,
+                initializer=_warm_up_worker,
+                initargs=(worker_pids,)
+            )
+            self._worker_pids[self._executor] = worker_pids
+        return self._executor
+
+    async def start(self) -> None:
+        """Uruchamia procesy robocze"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, os.getpid) for _ in range(self.workers)))
+        logger.info(f"Pula renderowania wykresów gotowa ({self.workers} procesów)")
+
+    async def render(self, function: Callable[..., bytes], *args) -> bytes:
+        """
+        Renderuje wykres w procesie roboczym
+
+        Args:
+            function: Funkcja renderująca z tego modułu (musi dać się zserializować)
+            *args: Dane wykresu
+
+        Returns:
+            bytes: Obraz PNG
+
+        Raises:
+            ChartRenderError: Przekroczony czas lub awaria procesu roboczego
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, function, *args),
+                timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            # Anulowanie nie przerywa rozpoczętego zadania - proces roboczy pozostałby zajęty
+            logger.warning(f"Przekroczono czas renderowania wykresu {function.__name__} ({self.timeout:.0f} s)")
+            self._recycle(executor)
+            raise ChartRenderError("Przekroczono czas renderowania wykresu")
+        except BrokenProcessPool as e:
+            # Proces roboczy zakończył się awaryjnie (lub pula została wymieniona) - kolejne zlecenia dostaną nową pulę
+            logger.error(f"Awaria puli renderowania wykresów: {e}")
+            self._recycle(executor)
+            raise ChartRenderError("Awaria procesu renderującego wykres")
+
+    def _recycle(self, executor: ProcessPoolExecutor) -> None:
+        """Kończy procesy robocze puli; kolejne zlecenia uruchomią nową pulę"""
+        if self._executor is executor:
+            self._executor = None
+        worker_pids = self._worker_pids.pop(executor, None)
+        if worker_pids is None:
+            # Pula została już wymieniona przez inne zlecenie
+            return
+
+        # ProcessPoolExecutor nie przerywa rozpoczętych zadań - procesy kończymy sami
+        while not worker_pids.empty():
+            try:
+                os.kill(worker_pids.get(), signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        worker_pids.close()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self) -> None:
+        """Zamyka procesy robocze"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            executor.shutdown(wait=False, cancel_futures=True)
+            worker_pids = self._worker_pids.pop(executor, None)
+            if worker_pids is not None:
+                worker_pids.close()
+
+_chart_renderer = None
+
+def get_chart_renderer() -> ChartRenderer:
+    """Zwraca współdzieloną (jedną na proces) instancję ChartRenderer"""
+    global _chart_renderer
+    if _chart_renderer is None:
+        _chart_renderer = ChartRenderer()
+    return _chart_renderer
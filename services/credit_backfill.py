@@ -0,0 +1,39 @@
+# services/credit_backfill.py
+"""
+Jednorazowe uzupełnienie rodzaju operacji i modelu w starszych transakcjach kredytowych
+"""
+import asyncio
+import logging
+from config import CREDIT_BACKFILL_BATCH_SIZE, CREDIT_BACKFILL_PAUSE
+
+logger = logging.getLogger(__name__)
+
+async def backfill_credit_operation_types(credit_repository,
+                                          batch_size: int = CREDIT_BACKFILL_BATCH_SIZE,
+                                          pause: float = CREDIT_BACKFILL_PAUSE) -> int:
+    """
+    Klasyfikuje partiami transakcje bez operation_type, aż żadna nie zostanie
+
+    Przerwy między partiami ograniczają obciążenie bazy. Po uzupełnieniu wszystkich
+    wpisów kolejne uruchomienia kończą się po jednym zapytaniu (indeks częściowy jest pusty).
+
+    Returns:
+        int: Liczba uzupełnionych transakcji
+    """
+    total = 0
+    while True:
+        try:
+            classified = await credit_repository.classify_transactions(batch_size)
+        except Exception as e:
+            # Kolejna próba przy następnym uruchomieniu bota
+            logger.error(f"Błąd uzupełniania rodzaju operacji transakcji kredytowych: {e}")
+            break
+
+        total += classified
+        if classified < batch_size:
+            break
+        await asyncio.sleep(pause)
+
+    if total:
+        logger.info(f"Uzupełniono rodzaj operacji w {total} transakcjach kredytowych")
+    return total
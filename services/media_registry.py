@@ -0,0 +1,158 @@
+# services/media_registry.py
+"""
+Trwały rejestr identyfikatorów plików Telegrama (file_id) dla grafik statycznych
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from telegram.error import BadRequest
+from config import MEDIA_REGISTRY_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# Fragmenty komunikatów BadRequest oznaczających nieważny identyfikator pliku
+FILE_ID_ERRORS = ("wrong file identifier", "file reference")
+
+def is_file_id_error(error: BadRequest) -> bool:
+    """Sprawdza, czy Telegram odrzucił identyfikator pliku (a nie np. podpis lub klawiaturę)"""
+    message = str(error).lower()
+    return any(fragment in message for fragment in FILE_ID_ERRORS)
+
+class MediaRegistry:
+    """
+    Rejestr file_id grafik statycznych (banery, obrazy onboardingu)
+
+    Pierwsze wysłanie grafiki odbywa się przez URL - Telegram pobiera plik i zwraca file_id,
+    który jest zapisywany w SQLite i używany przy kolejnych wysyłkach (także po restarcie).
+    Wpis zawiera adres źródłowy: zmiana adresu grafiki (np. parametru ?v-) unieważnia file_id.
+    """
+
+    def __init__(self, db_path: str = MEDIA_REGISTRY_DB_PATH):
+        self.db_path = db_path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # asset -> (adres źródłowy, file_id)
+        self._entries: Optional[Dict[str, Tuple[str, str]]] = None
+        # Pierwsze wysłanie grafiki - pozostałe wysyłki czekają na file_id zamiast pobierać URL
+        self._uploads: Dict[str, asyncio.Lock] = {}
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS media_files (asset TEXT PRIMARY KEY, source TEXT NOT NULL, "
+                "file_id TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _load(self) -> Dict[str, Tuple[str, str]]:
+        with self._lock:
+            rows = self._get_connection().execute("SELECT asset, source, file_id FROM media_files").fetchall()
+        return {asset: (source, file_id) for asset, source, file_id in rows}
+
+    def _write(self, asset: str, source: str, file_id: Optional[str]) -> None:
+        with self._lock:
+            connection = self._get_connection()
+            with connection:
+                if file_id is None:
+                    connection.execute("DELETE FROM media_files WHERE asset = ?", (asset,))
+                else:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO media_files (asset, source, file_id, updated_at) VALUES (?, ?, ?, ?)",
+                        (asset, source, file_id, time.time())
+                    )
+
+    async def get(self, asset: str, source: str) -> Optional[str]:
+        """Zwraca file_id grafiki, jeśli został zapisany dla tego samego adresu źródłowego"""
+        if self._entries is None:
+            try:
+                self._entries = await asyncio.to_thread(self._load)
+            except sqlite3.Error as e:
+                logger.error(f"Błąd odczytu rejestru grafik: {e}")
+                self._entries = {}
+
+        entry = self._entries.get(asset)
+        if entry is None or entry[0] != source:
+            return None
+        return entry[1]
+
+    async def set(self, asset: str, source: str, file_id: str) -> None:
+        """Zapisuje file_id zwrócony przez Telegram po wysłaniu grafiki"""
+        if self._entries is not None and self._entries.get(asset) == (source, file_id):
+            return
+        if self._entries is not None:
+            self._entries[asset] = (source, file_id)
+        await self._persist(asset, source, file_id)
+
+    async def invalidate(self, asset: str) -> None:
+        """Usuwa file_id grafiki (np. odrzucony przez Telegram)"""
+        entry = self._entries.pop(asset, None) if self._entries is not None else None
+        if entry is not None:
+            await self._persist(asset, entry[0], None)
+
+    async def _persist(self, asset: str, source: str, file_id: Optional[str]) -> None:
+        try:
+            await asyncio.to_thread(self._write, asset, source, file_id)
+        except sqlite3.Error as e:
+            # Wpis pozostaje w pamięci - po restarcie grafika zostanie wysłana ponownie przez URL
+            logger.error(f"Błąd zapisu rejestru grafik ({asset}): {e}")
+
+    async def send_photo(self, send: Callable[..., Awaitable], asset: str, source: str, **kwargs):
+        """
+        Wysyła grafikę statyczną, używając zapisanego file_id zamiast adresu URL
+
+        Args:
+            send: Metoda wysyłająca zdjęcie (np. message.reply_photo lub partial(bot.send_photo, chat_id=...))
+            asset: Nazwa grafiki w rejestrze
+            source: Adres URL grafiki
+            **kwargs: Pozostałe argumenty metody send (caption, reply_markup, parse_mode)
+
+        Returns:
+            Message: Wysłana wiadomość
+        """
+        file_id = await self.get(asset, source)
+        if file_id is None:
+            upload_lock = self._uploads.setdefault(asset, asyncio.Lock())
+            async with upload_lock:
+                file_id = await self.get(asset, source)
+                if file_id is None:
+                    return await self._send_source(send, asset, source, **kwargs)
+
+        try:
+            return await send(photo=file_id, **kwargs)
+        except BadRequest as e:
+            if not is_file_id_error(e):
+                raise
+            logger.warning(f"Telegram odrzucił zapisany file_id grafiki {asset}: {e}")
+            await self.invalidate(asset)
+            return await self._send_source(send, asset, source, **kwargs)
+
+    async def _send_source(self, send: Callable[..., Awaitable], asset: str, source: str, **kwargs):
+        message = await send(photo=source, **kwargs)
+        if message is not None and message.photo:
+            await self.set(asset, source, message.photo[-1].file_id)
+        return message
+
+    def close(self) -> None:
+        """Zamyka połączenie z bazą rejestru"""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+_media_registry = None
+
+def get_media_registry() -> MediaRegistry:
+    """Zwraca współdzieloną (jedną na proces) instancję MediaRegistry"""
+    global _media_registry
+    if _media_registry is None:
+        _media_registry = MediaRegistry()
+    return _media_registry
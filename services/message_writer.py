@@ -0,0 +1,273 @@
+# services/message_writer.py
+"""
+Zapis wiadomości i liczników messages_used w tle, zbiorczo (write-behind)
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+from database.models import Message
+from config import (
+    WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_JOURNAL_PATH,
+    WRITE_BEHIND_REPLAY_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# Klasa SQLSTATE naruszeń ograniczeń (klucz obcy, unikalność, not null, check)
+ROW_ERROR_SQLSTATE_CLASS = "23"
+
+def is_row_error(error: Exception) -> bool:
+    """
+    Sprawdza, czy baza odrzuciła dane partii (naruszenie ograniczenia przez wiersz)
+
+    Pozostałe błędy - niedostępna baza, brak funkcji RPC (PGRST202), błąd SQL w samej
+    funkcji - nie zależą od danych, więc partia trafia do dziennika zamiast przepaść.
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return False
+    try:
+        code = response.json().get("code")
+    except Exception:
+        return False
+    return isinstance(code, str) and code.startswith(ROW_ERROR_SQLSTATE_CLASS)
+
+class WriteBatch:
+    """Partia zapisów wysyłana jednym wywołaniem RPC apply_message_batch"""
+
+    def __init__(self, messages: List[Dict], message_counts: Dict[str, int], batch_id: Optional[str] = None):
+        self.batch_id = batch_id or str(uuid.uuid4())
+        self.messages = messages
+        self.message_counts = message_counts
+
+    def to_params(self) -> Dict:
+        return {
+            "p_batch_id": self.batch_id,
+            "p_messages": self.messages,
+            "p_message_counts": self.message_counts
+        }
+
+    def split(self) -> List['WriteBatch']:
+        """Dzieli partię na połowy o identyfikatorach wyznaczonych z identyfikatora partii"""
+        middle = len(self.messages) // 2
+        parent = uuid.UUID(self.batch_id)
+        return [
+            WriteBatch(self.messages[:middle], self.message_counts, str(uuid.uuid5(parent, "0"))),
+            WriteBatch(self.messages[middle:], {}, str(uuid.uuid5(parent, "1")))
+        ]
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"batch_id": self.batch_id, "messages": self.messages, "message_counts": self.message_counts},
+            ensure_ascii=False, separators=(",", ":")
+        )
+
+    @classmethod
+    def from_json(cls, line: str) -> 'WriteBatch':
+        data = json.loads(line)
+        return cls(data["messages"], data["message_counts"], data["batch_id"])
+
+class MessageWriter:
+    """
+    Kolejka zapisów wiadomości opróżniana w tle
+
+    Wiadomości i przyrosty liczników są zbierane w pamięci i co flush_interval sekund
+    (lub po zebraniu batch_size wiadomości) zapisywane jednym wywołaniem RPC. Gdy zapis się nie
+    powiedzie (np. baza jest niedostępna), partie trafiają do dziennika na dysku i są odtwarzane w kolejności
+    zapisu - do tego czasu nowe partie również dopisywane są do dziennika. Ponowne
+    wysłanie partii nie tworzy duplikatów (identyfikatory partii i client_id wiadomości).
+    """
+
+    def __init__(self, client, journal_path: str = WRITE_BEHIND_JOURNAL_PATH,
+                 flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+                 batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+                 replay_interval: float = WRITE_BEHIND_REPLAY_INTERVAL):
+        self.client = client
+        self.journal_path = journal_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.replay_interval = replay_interval
+        self._messages: List[Message] = []
+        self._message_counts: Dict[int, int] = defaultdict(int)
+        # Wiadomości, których zapis nie został jeszcze potwierdzony (client_id -> Message)
+        self._unsaved: Dict[str, Message] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self._next_replay = 0.0
+
+    def add_message(self, message: Message) -> None:
+        """Dodaje wiadomość do kolejki; id zostanie uzupełnione po zapisie"""
+        message.client_id = str(uuid.uuid4())
+        self._messages.append(message)
+        self._unsaved[message.client_id] = message
+        self._ensure_running()
+        if len(self._messages) >= self.batch_size:
+            self._wakeup.set()
+
+    def increment_messages_used(self, user_id: int) -> None:
+        """Dodaje przyrost licznika wykorzystanych wiadomości"""
+        self._message_counts[user_id] += 1
+        self._ensure_running()
+
+    def get_unsaved_messages(self, conversation_id: int) -> List[Message]:
+        """Zwraca niezapisane jeszcze wiadomości konwersacji (w kolejności dodania)"""
+        return [message for message in self._unsaved.values() if message.conversation_id == conversation_id]
+
+    async def start(self) -> None:
+        """Odtwarza partie pozostawione w dzienniku i uruchamia zapis w tle"""
+        self._ensure_running()
+        await self.flush()
+
+    async def close(self) -> None:
+        """Zatrzymuje zapis w tle i zapisuje (lub odkłada do dziennika) pozostałe dane"""
+        if self._task is not None:
+            # Anulowanie poza zapisem - partia pobrana z kolejki nie może przepaść
+            async with self._flush_lock:
+                self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._next_replay = 0.0
+        await self.flush()
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._flush_lock = self._flush_lock or asyncio.Lock()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Błąd zapisu w tle: {e}")
+
+    async def flush(self) -> None:
+        """Zapisuje zebrane dane, a przy niedostępnej bazie odkłada je do dziennika"""
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        async with self._flush_lock:
+            while self._messages or self._message_counts:
+                batch = self._take_batch()
+                if await asyncio.to_thread(self._has_journal):
+                    # Dziennik nie jest pusty - zachowujemy kolejność, dopisując partię na jego koniec
+                    await asyncio.to_thread(self._append_journal, batch)
+                    continue
+                try:
+                    await self._apply(batch)
+                except Exception as e:
+                    logger.warning(f"Nie udało się zapisać partii {batch.batch_id}, trafia do dziennika: {e}")
+                    await asyncio.to_thread(self._append_journal, batch)
+                    self._next_replay = time.monotonic() + self.replay_interval
+
+            if time.monotonic() >= self._next_replay and await asyncio.to_thread(self._has_journal):
+                await self._replay()
+
+    def _take_batch(self) -> WriteBatch:
+        messages, self._messages = self._messages[:self.batch_size], self._messages[self.batch_size:]
+        message_counts = {str(user_id): count for user_id, count in self._message_counts.items()}
+        self._message_counts.clear()
+        return WriteBatch([self._serialize(message) for message in messages], message_counts)
+
+    @staticmethod
+    def _serialize(message: Message) -> Dict:
+        return {
+            "client_id": message.client_id,
+            "conversation_id": message.conversation_id,
+            "user_id": message.user_id,
+            "content": message.content,
+            "is_from_user": message.is_from_user,
+            "model_used": message.model_used,
+            "token_counts": message.token_counts or None,
+            "created_at": message.created_at.isoformat() if message.created_at else None
+        }
+
+    async def _apply(self, batch: WriteBatch) -> None:
+        """
+        Wysyła partię; błędy inne niż odrzucenie wierszy są zgłaszane dalej
+
+        Partia z wierszem naruszającym ograniczenie (np. wiadomość nieistniejącej już
+        konwersacji) jest dzielona, aby zapisać pozostałe wiadomości i pominąć tylko błędne.
+        """
+        try:
+            rows = await self.client.rpc("apply_message_batch", batch.to_params())
+        except Exception as e:
+            if not is_row_error(e):
+                raise
+            if len(batch.messages) <= 1:
+                logger.error(f"Odrzucono zapis partii {batch.batch_id}: {e}")
+                for message in batch.messages:
+                    self._unsaved.pop(message["client_id"], None)
+                return
+            for part in batch.split():
+                await self._apply(part)
+            return
+
+        for row in rows:
+            message = self._unsaved.pop(str(row.get("client_id")), None)
+            if message is not None:
+                message.id = row.get("id")
+
+        # Wiadomości bez zwróconego id (np. bez klienta PostgREST) też nie czekają już na zapis
+        for message in batch.messages:
+            self._unsaved.pop(message["client_id"], None)
+
+    async def _replay(self) -> None:
+        """Odtwarza partie z dziennika w kolejności zapisu, do pierwszego niepowodzenia"""
+        lines = await asyncio.to_thread(self._read_journal)
+        applied = 0
+        for line in lines:
+            try:
+                await self._apply(WriteBatch.from_json(line))
+            except (ValueError, KeyError) as e:
+                logger.error(f"Pominięto uszkodzony wpis dziennika zapisów: {e}")
+            except Exception as e:
+                logger.warning(f"Odtwarzanie dziennika przerwane, kolejna próba za {self.replay_interval:.0f} s: {e}")
+                self._next_replay = time.monotonic() + self.replay_interval
+                break
+            applied += 1
+
+        await asyncio.to_thread(self._rewrite_journal, lines[applied:])
+        if applied:
+            logger.info(f"Odtworzono {applied} partii z dziennika zapisów")
+
+    def _has_journal(self) -> bool:
+        return os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0
+
+    def _append_journal(self, batch: WriteBatch) -> None:
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.journal_path, "a", encoding="utf-8") as journal:
+            journal.write(batch.to_json() + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def _read_journal(self) -> List[str]:
+        with open(self.journal_path, encoding="utf-8") as journal:
+            return [line for line in journal.read().splitlines() if line.strip()]
+
+    def _rewrite_journal(self, lines: List[str]) -> None:
+        if not lines:
+            os.remove(self.journal_path)
+            return
+        temporary_path = f"{self.journal_path}.tmp"
+        with open(temporary_path, "w", encoding="utf-8") as journal:
+            journal.write("".join(line + "\n" for line in lines))
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(temporary_path, self.journal_path)
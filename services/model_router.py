@@ -0,0 +1,237 @@
+# services/model_router.py
+"""
+Wybór modelu z listą modeli zapasowych, oceną dostępności i zapytaniami zabezpieczającymi (hedging)
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+from api.base_client import is_retryable_error, StreamStalledError
+from services.model_scheduler import ModelOverloadedError
+from config import (
+    CREDIT_COSTS, CHAT_MODES, MODEL_FALLBACK_CHAINS, MODE_FALLBACK_CHAINS, MODEL_HEDGE_DELAYS,
+    MODEL_HEALTH_MIN_SCORE, MODEL_CIRCUIT_FAILURES, MODEL_CIRCUIT_COOLDOWN
+)
+
+logger = logging.getLogger(__name__)
+
+# Waga najnowszego wyniku w średniej kroczącej skuteczności modelu
+HEALTH_EWMA_ALPHA = 0.2
+
+def get_charged_credit_cost(quoted_cost, requested_model, used_model):
+    """
+    Zwraca koszt wiadomości dla modelu, który faktycznie odpowiedział
+
+    Args:
+        quoted_cost (int): Koszt podany użytkownikowi przed wysłaniem zapytania
+        requested_model (str): Model wybrany przez użytkownika lub tryb
+        used_model (str): Model, który wygenerował odpowiedź
+
+    Returns:
+        int: Koszt modelu zapasowego, nie wyższy niż koszt podany użytkownikowi
+    """
+    if used_model == requested_model:
+        return quoted_cost
+    used_cost = CREDIT_COSTS["message"].get(used_model, CREDIT_COSTS["message"]["default"])
+    return min(quoted_cost, used_cost)
+
+class ModelHealth:
+    """Ocena dostępności modelu: średnia krocząca skuteczności i wyłącznik po serii błędów"""
+
+    def __init__(self):
+        self.score = 1.0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.first_token_latency: Optional[float] = None
+
+    def is_available(self) -> bool:
+        """Model jest pomijany, dopóki wyłącznik jest otwarty (seria błędów lub niska skuteczność)"""
+        return time.monotonic() >= self.open_until
+
+    def record_success(self, first_token_latency: Optional[float] = None) -> None:
+        self.score += HEALTH_EWMA_ALPHA * (1.0 - self.score)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        if first_token_latency is not None:
+            if self.first_token_latency is None:
+                self.first_token_latency = first_token_latency
+            else:
+                self.first_token_latency += HEALTH_EWMA_ALPHA * (first_token_latency - self.first_token_latency)
+
+    def record_failure(self) -> None:
+        self.score -= HEALTH_EWMA_ALPHA * self.score
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= MODEL_CIRCUIT_FAILURES or self.score < MODEL_HEALTH_MIN_SCORE:
+            # Po okresie wyłączenia model dostaje kolejną szansę (stan półotwarty)
+            self.open_until = time.monotonic() + MODEL_CIRCUIT_COOLDOWN
+
+class RoutedStream:
+    """
+    Strumień odpowiedzi z automatycznym przełączaniem na model zapasowy
+
+    Po zakończeniu iteracji atrybut model zawiera model, który faktycznie odpowiedział.
+    """
+
+    def __init__(self, router, messages: List[Dict[str, str]], model: str, mode: Optional[str] = None):
+        self.router = router
+        self.messages = messages
+        self.requested_model = model
+        self.mode = mode
+        self.model = model
+
+    def __aiter__(self):
+        return self._run()
+
+    async def _run(self):
+        chain = self.router.get_chain(self.requested_model, self.mode)
+        partial_text = ""
+        last_error = None
+
+        while chain:
+            model = chain.pop(0)
+
+            request_messages = self.messages
+            if partial_text:
+                # Przerwaną odpowiedź kontynuuje tylko dostawca obsługujący kontynuację
+                request_messages = self.router.api_service.get_client(model)._continuation_messages(self.messages, partial_text)
+                if request_messages is None:
+                    continue
+
+            hedge_model = None if partial_text else self.router.get_hedge_model(model, chain)
+
+            try:
+                used_model, stream, first_chunk = await self.router.open_stream(model, request_messages, hedge_model)
+            except Exception as e:
+                logger.warning(f"Model {model} niedostępny, próba modelu zapasowego: {e}")
+                last_error = e
+                continue
+
+            if used_model != model:
+                chain.remove(used_model)
+            if used_model != self.requested_model:
+                logger.info(f"Odpowiedź generuje model zapasowy {used_model} zamiast {self.requested_model}")
+            self.model = used_model
+
+            try:
+                if first_chunk:
+                    partial_text += first_chunk
+                    yield first_chunk
+                async for chunk in stream:
+                    partial_text += chunk
+                    yield chunk
+                return
+            except Exception as e:
+                logger.warning(f"Strumień modelu {used_model} przerwany, próba modelu zapasowego: {e}")
+                self.router.record_failure(used_model, e)
+                last_error = e
+            finally:
+                await stream.aclose()
+
+        if last_error is None:
+            last_error = StreamStalledError(f"Brak modelu mogącego dokończyć odpowiedź {self.requested_model}", partial_text)
+        raise last_error
+
+class ModelRouter:
+    """Polityka wyboru modelu: łańcuchy modeli zapasowych, ocena dostępności i hedging"""
+
+    def __init__(self, api_service):
+        self.api_service = api_service
+        self.health: Dict[str, ModelHealth] = {}
+
+    def get_health(self, model: str) -> ModelHealth:
+        if model not in self.health:
+            self.health[model] = ModelHealth()
+        return self.health[model]
+
+    def get_chain(self, model: str, mode: Optional[str] = None) -> List[str]:
+        """
+        Zwraca kolejność modeli do wypróbowania
+
+        Łańcuch trybu (MODE_FALLBACK_CHAINS) obowiązuje dla domyślnego modelu trybu,
+        w pozostałych przypadkach - łańcuch modelu (MODEL_FALLBACK_CHAINS). Niedostępne
+        modele trafiają na koniec listy.
+        """
+        if mode in MODE_FALLBACK_CHAINS and CHAT_MODES.get(mode, {}).get("model") == model:
+            fallbacks = MODE_FALLBACK_CHAINS[mode]
+        else:
+            fallbacks = MODEL_FALLBACK_CHAINS.get(model, [])
+
+        chain = [model] + [fallback for fallback in fallbacks if fallback != model]
+        available = [candidate for candidate in chain if self.get_health(candidate).is_available()]
+        return available + [candidate for candidate in chain if candidate not in available]
+
+    def get_hedge_model(self, model: str, remaining: List[str]) -> Optional[str]:
+        """Zwraca model zapasowy innego dostawcy do zapytania zabezpieczającego (jeśli włączone)"""
+        if MODEL_HEDGE_DELAYS.get(model, MODEL_HEDGE_DELAYS["default"]) is None:
+            return None
+
+        provider = self.api_service.get_provider(model)
+        for candidate in remaining:
+            if self.api_service.get_provider(candidate) != provider and self.get_health(candidate).is_available():
+                return candidate
+        return None
+
+    def record_failure(self, model: str, error: Exception) -> None:
+        """Obniża ocenę modelu po błędzie dostawcy (przeciążenie naszej kolejki się nie liczy)"""
+        if isinstance(error, ModelOverloadedError):
+            return
+        if isinstance(error, (StreamStalledError, asyncio.TimeoutError)) or is_retryable_error(error):
+            self.get_health(model).record_failure()
+
+    def stream(self, messages: List[Dict[str, str]], model: str, mode: Optional[str] = None) -> RoutedStream:
+        return RoutedStream(self, messages, model, mode)
+
+    async def open_stream(self, model: str, messages: List[Dict[str, str]], hedge_model: Optional[str] = None):
+        """
+        Otwiera strumień i czeka na pierwszy fragment odpowiedzi
+
+        Jeśli podano hedge_model, a pierwszy fragment nie nadszedł w MODEL_HEDGE_DELAYS,
+        równolegle uruchamiane jest zapytanie do hedge_model - wygrywa szybszy strumień.
+
+        Returns:
+            tuple: (użyty model, strumień, pierwszy fragment lub None przy pustej odpowiedzi)
+        """
+        started = time.monotonic()
+        pending = {}
+
+        def start(candidate):
+            stream = self.api_service.chat_completion_stream(messages, candidate)
+            pending[asyncio.ensure_future(stream.__anext__())] = (candidate, stream)
+
+        start(model)
+        try:
+            if hedge_model:
+                hedge_delay = MODEL_HEDGE_DELAYS.get(model, MODEL_HEDGE_DELAYS["default"])
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+                if not done:
+                    logger.info(f"Brak pierwszego tokenu {model} po {hedge_delay:.1f} s - zapytanie zabezpieczające do {hedge_model}")
+                    start(hedge_model)
+
+            last_error = None
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    candidate, stream = pending.pop(task)
+                    try:
+                        first_chunk = task.result()
+                    except StopAsyncIteration:
+                        first_chunk = None
+                    except Exception as e:
+                        self.record_failure(candidate, e)
+                        last_error = e
+                        await stream.aclose()
+                        continue
+
+                    self.get_health(candidate).record_success(time.monotonic() - started)
+                    return candidate, stream, first_chunk
+
+            raise last_error
+        finally:
+            # Przegrany strumień (lub wszystkie przy anulowaniu) zwalnia miejsce w kolejce modelu
+            for task, (candidate, stream) in pending.items():
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await stream.aclose()
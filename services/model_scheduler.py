@@ -0,0 +1,152 @@
+# services/model_scheduler.py
+"""
+Kolejkowanie zapytań do modeli AI z limitami współbieżności i tokenów na minutę
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from config import (
+    MODEL_CONCURRENCY_LIMITS, PROVIDER_CONCURRENCY_LIMITS, MODEL_TPM_LIMITS,
+    MODEL_QUEUE_MAX_SIZE, MODEL_QUEUE_TIMEOUT
+)
+
+logger = logging.getLogger(__name__)
+
+class ModelOverloadedError(Exception):
+    """Zapytanie odrzucone, bo kolejka do modelu jest pełna lub oczekiwanie trwało zbyt długo"""
+
+    def __init__(self, model: str, reason: str):
+        super().__init__(f"Model {model} jest przeciążony ({reason})")
+        self.model = model
+        self.reason = reason
+
+class _ModelLane:
+    """Stan kolejki jednego modelu: semafor współbieżności i budżet tokenów na minutę"""
+
+    def __init__(self, concurrency: int, tpm: Optional[int]):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.waiting = 0
+        self.tpm = tpm
+        self.tokens = float(tpm or 0)
+        self.updated = time.monotonic()
+
+    def token_delay(self, tokens: int) -> float:
+        """Zwraca czas (s) do uzbierania budżetu na zapytanie; 0, jeśli budżet jest dostępny"""
+        if not self.tpm:
+            return 0.0
+
+        now = time.monotonic()
+        self.tokens = min(self.tpm, self.tokens + (now - self.updated) * self.tpm / 60)
+        self.updated = now
+
+        # Zapytanie większe niż cały budżet czeka tylko na jego pełne odnowienie
+        needed = min(tokens, self.tpm)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) * 60 / self.tpm
+
+    def consume(self, tokens: int) -> None:
+        if self.tpm:
+            self.tokens -= tokens
+
+class ModelLease:
+    """Przydział miejsca w kolejce modelu na czas jednego zapytania"""
+
+    def __init__(self, lane: _ModelLane):
+        self._lane = lane
+
+    def consume_tokens(self, tokens: int) -> None:
+        """Dolicza do budżetu tokeny znane dopiero po odpowiedzi (np. wygenerowane)"""
+        self._lane.consume(tokens)
+
+class ModelScheduler:
+    """
+    Ogranicza równoległe zapytania per model i per dostawca oraz zużycie tokenów na minutę
+
+    Zapytania ponad limit czekają w kolejce do MODEL_QUEUE_TIMEOUT sekund. Gdy kolejka
+    modelu jest pełna albo czas minie, zgłaszany jest ModelOverloadedError.
+    """
+
+    def __init__(self):
+        self.lanes: Dict[str, _ModelLane] = {}
+        self.provider_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _get_lane(self, model: str) -> _ModelLane:
+        if model not in self.lanes:
+            concurrency = MODEL_CONCURRENCY_LIMITS.get(model, MODEL_CONCURRENCY_LIMITS["default"])
+            tpm = MODEL_TPM_LIMITS.get(model, MODEL_TPM_LIMITS["default"])
+            self.lanes[model] = _ModelLane(concurrency, tpm)
+        return self.lanes[model]
+
+    def _get_provider_semaphore(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self.provider_semaphores:
+            limit = PROVIDER_CONCURRENCY_LIMITS.get(provider, PROVIDER_CONCURRENCY_LIMITS["default"])
+            self.provider_semaphores[provider] = asyncio.Semaphore(limit)
+        return self.provider_semaphores[provider]
+
+    @asynccontextmanager
+    async def slot(self, model: str, provider: str, prompt_tokens: int = 0):
+        """
+        Czeka na miejsce dla zapytania do modelu
+
+        Args:
+            model (str): Identyfikator modelu
+            provider (str): Dostawca modelu (openai, anthropic)
+            prompt_tokens (int): Szacowana liczba tokenów promptu
+
+        Yields:
+            ModelLease: Przydział, do którego można doliczyć tokeny odpowiedzi
+        """
+        lane = self._get_lane(model)
+        provider_semaphore = self._get_provider_semaphore(provider)
+
+        if lane.waiting >= MODEL_QUEUE_MAX_SIZE:
+            logger.warning(f"Kolejka modelu {model} jest pełna - odrzucam zapytanie")
+            raise ModelOverloadedError(model, "pełna kolejka")
+
+        deadline = time.monotonic() + MODEL_QUEUE_TIMEOUT
+        lane.waiting += 1
+        try:
+            await self._acquire(lane.semaphore, deadline, model)
+            try:
+                await self._acquire(provider_semaphore, deadline, model)
+            except BaseException:
+                lane.semaphore.release()
+                raise
+
+            try:
+                await self._wait_for_tokens(lane, prompt_tokens, deadline, model)
+            except BaseException:
+                provider_semaphore.release()
+                lane.semaphore.release()
+                raise
+        finally:
+            lane.waiting -= 1
+
+        try:
+            yield ModelLease(lane)
+        finally:
+            provider_semaphore.release()
+            lane.semaphore.release()
+
+    @staticmethod
+    async def _acquire(semaphore: asyncio.Semaphore, deadline: float, model: str) -> None:
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            logger.warning(f"Przekroczono czas oczekiwania w kolejce modelu {model}")
+            raise ModelOverloadedError(model, "przekroczony czas oczekiwania")
+
+    @staticmethod
+    async def _wait_for_tokens(lane: _ModelLane, tokens: int, deadline: float, model: str) -> None:
+        while True:
+            delay = lane.token_delay(tokens)
+            if delay == 0:
+                lane.consume(tokens)
+                return
+            if time.monotonic() + delay > deadline:
+                logger.warning(f"Wyczerpany budżet tokenów na minutę dla modelu {model}")
+                raise ModelOverloadedError(model, "limit tokenów na minutę")
+            await asyncio.sleep(delay)
@@ -5,6 +5,7 @@ from repositories.user_repository import UserRepository
 from repositories.conversation_repository import ConversationRepository
 from repositories.message_repository import MessageRepository
 from repositories.credit_repository import CreditRepository
+from services.message_writer import MessageWriter
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +13,21 @@ class RepositoryService:
     """Centralny serwis zapewniający dostęp do wszystkich repozytoriów"""
     
     def __init__(self, supabase_client: SupabaseClient):
+        # Zapis wiadomości i liczników w tle, wspólny dla repozytoriów
+        self.message_writer = MessageWriter(supabase_client)
         self.user_repository = UserRepository(supabase_client)
         self.conversation_repository = ConversationRepository(supabase_client)
-        self.message_repository = MessageRepository(supabase_client)
+        self.message_repository = MessageRepository(supabase_client, self.message_writer)
         self.credit_repository = CreditRepository(supabase_client)
         
-        logger.info("Serwis Repozytorium zainicjalizowany")
\ No newline at end of file
+        logger.info("Serwis Repozytorium zainicjalizowany")
+
+_repository_service = None
+
+def get_repository_service() -> RepositoryService:
+    """Zwraca współdzieloną (jedną na proces) instancję RepositoryService"""
+    global _repository_service
+    if _repository_service is None:
+        from services.api_service import get_api_service
+        _repository_service = RepositoryService(get_api_service().supabase)
+    return _repository_service
\ No newline at end of file
@@ -0,0 +1,188 @@
+# services/response_cache.py
+"""
+Cache odpowiedzi modeli adresowany treścią zapytania (pamięć procesu + SQLite na dysku)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from utils.cache import TTLCache
+from config import (
+    RESPONSE_CACHE_MEMORY_SIZE, RESPONSE_CACHE_TTL, RESPONSE_CACHE_DB_PATH,
+    RESPONSE_CACHE_DISK_MAX_ENTRIES, RESPONSE_CACHE_CREDIT_FACTOR
+)
+
+logger = logging.getLogger(__name__)
+
+# Wielkość fragmentów, w jakich odtwarzana jest odpowiedź z cache
+REPLAY_CHUNK_SIZE = 200
+
+def normalize_content(content: str) -> str:
+    """Ujednolica białe znaki, aby drobne różnice formatowania nie zmieniały klucza"""
+    return " ".join(str(content).split())
+
+def make_cache_key(model: str, messages: List[Dict[str, str]], **params) -> str:
+    """
+    Wyznacza klucz cache dla zapytania
+
+    Args:
+        model (str): Identyfikator modelu
+        messages (list): Wiadomości zapytania (razem z promptem systemowym)
+        **params: Parametry zapytania wpływające na odpowiedź (np. max_tokens)
+
+    Returns:
+        str: Skrót SHA-256 znormalizowanego zapytania
+    """
+    payload = {
+        "model": model,
+        "messages": [[message["role"], normalize_content(message["content"])] for message in messages],
+        "params": params
+    }
+    serialized = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+def get_cached_credit_cost(credit_cost: int) -> int:
+    """Zwraca koszt odpowiedzi z cache zgodnie z RESPONSE_CACHE_CREDIT_FACTOR (1 - pełny, 0 - bezpłatnie)"""
+    return math.ceil(credit_cost * RESPONSE_CACHE_CREDIT_FACTOR)
+
+class ResponseCache:
+    """
+    Dwupoziomowy cache odpowiedzi: LRU w pamięci procesu i trwała baza SQLite
+
+    Wpisy na dysku wygasają po ttl sekundach; po przekroczeniu max_disk_entries
+    usuwane są najdawniej używane.
+    """
+
+    def __init__(self, db_path: str = RESPONSE_CACHE_DB_PATH,
+                 memory_size: int = RESPONSE_CACHE_MEMORY_SIZE,
+                 ttl: float = RESPONSE_CACHE_TTL,
+                 max_disk_entries: int = RESPONSE_CACHE_DISK_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.memory = TTLCache(memory_size, ttl)
+        self._lock = threading.Lock()
+        self._connection = None
+
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(db_path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Nie udało się otworzyć bazy cache odpowiedzi {db_path}: {e} - używam tylko pamięci")
+            self._connection = None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Zwraca zapisaną odpowiedź lub None"""
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+
+        if self._connection is None:
+            return None
+
+        value = await asyncio.to_thread(self._disk_get, key)
+        if value is not None:
+            self.memory.set(key, value)
+        return value
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Zapisuje odpowiedź w obu poziomach cache"""
+        self.memory.set(key, value)
+        if self._connection is not None:
+            await asyncio.to_thread(self._disk_set, key, value)
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] + self.ttl < now:
+                    self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._connection.commit()
+                    return None
+                self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._connection.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            logger.warning(f"Błąd odczytu cache odpowiedzi: {e}")
+            return None
+
+    def _disk_set(self, key: str, value: Dict[str, Any]) -> None:
+        now = time.time()
+        try:
+            with self._lock:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                self._evict(now)
+                self._connection.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Błąd zapisu cache odpowiedzi: {e}")
+
+    def _evict(self, now: float) -> None:
+        """Usuwa wygasłe wpisy i najdawniej używane ponad limit"""
+        self._connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        count = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_disk_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+
+class CachedResponseStream:
+    """
+    Strumień odpowiedzi korzystający z cache
+
+    Przy trafieniu odtwarza zapisaną odpowiedź fragmentami, w przeciwnym razie przekazuje
+    strumień modelu i po jego poprawnym zakończeniu zapisuje odpowiedź. Atrybuty model
+    i cached są ustawione po zakończeniu iteracji.
+    """
+
+    def __init__(self, cache: ResponseCache, key: str, open_stream, model: str):
+        self.cache = cache
+        self.key = key
+        self.open_stream = open_stream
+        self.model = model
+        self.cached = False
+
+    def __aiter__(self):
+        return self._run()
+
+    async def _run(self):
+        entry = await self.cache.get(self.key)
+        if entry is not None:
+            self.cached = True
+            self.model = entry.get("model", self.model)
+            text = entry["text"]
+            for start in range(0, len(text), REPLAY_CHUNK_SIZE):
+                yield text[start:start + REPLAY_CHUNK_SIZE]
+            return
+
+        stream = self.open_stream()
+        parts = []
+        async for chunk in stream:
+            parts.append(chunk)
+            yield chunk
+
+        self.model = stream.model
+        text = "".join(parts)
+        if text.strip():
+            await self.cache.set(self.key, {"text": text, "model": self.model})
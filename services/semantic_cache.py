@@ -0,0 +1,112 @@
+# services/semantic_cache.py
+"""
+Cache odpowiedzi dla niemal identycznych tekstów (podobieństwo embeddingów)
+"""
+import difflib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+import numpy as np
+from config import (
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MIN_TEXT_SIMILARITY, SEMANTIC_CACHE_MAX_ENTRIES
+)
+
+logger = logging.getLogger(__name__)
+
+class _Partition:
+    """Indeks wektorów jednej partycji (np. tłumaczeń na jeden język) w buforze cyklicznym"""
+
+    def __init__(self, dimensions: int, max_entries: int):
+        self.max_entries = max_entries
+        # Macierz rośnie dwukrotnie aż do max_entries wierszy
+        self.vectors = np.zeros((min(64, max_entries), dimensions), dtype=np.float32)
+        self.texts = []
+        self.values = []
+        self.size = 0
+        # Kolejne miejsce do zapisu - po zapełnieniu nadpisywane są najstarsze wpisy
+        self.position = 0
+
+    def add(self, vector: np.ndarray, text: str, value: str) -> None:
+        if self.position == len(self.vectors) and len(self.vectors) < self.max_entries:
+            grown = np.zeros((min(len(self.vectors) * 2, self.max_entries), self.vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.vectors)] = self.vectors
+            self.vectors = grown
+
+        self.vectors[self.position] = vector
+        if self.position < len(self.texts):
+            self.texts[self.position] = text
+            self.values[self.position] = value
+        else:
+            self.texts.append(text)
+            self.values.append(value)
+        self.size = len(self.texts)
+        self.position = (self.position + 1) % self.max_entries
+
+    def nearest(self, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        """Zwraca indeks i podobieństwo kosinusowe najbliższego wpisu (wektory są znormalizowane)"""
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+
+class SemanticCache:
+    """
+    Wyszukiwanie odpowiedzi dla tekstów niemal identycznych z już obsłużonymi
+
+    Wpis jest trafieniem, gdy podobieństwo kosinusowe embeddingów przekracza threshold,
+    a teksty różnią się nieznacznie także znakowo (min_text_similarity) - inaczej
+    zwrócona odpowiedź (np. tłumaczenie) nie odpowiadałaby treści zapytania.
+    Partycje oddzielają np. tłumaczenia na różne języki.
+    """
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 min_text_similarity: float = SEMANTIC_CACHE_MIN_TEXT_SIMILARITY,
+                 max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.min_text_similarity = min_text_similarity
+        self.max_entries = max_entries
+        self.partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, partition: str, text: str, vector: np.ndarray) -> Optional[str]:
+        """
+        Zwraca odpowiedź zapisaną dla niemal identycznego tekstu
+
+        Args:
+            partition (str): Nazwa partycji
+            text (str): Tekst zapytania
+            vector (np.ndarray): Znormalizowany embedding tekstu
+
+        Returns:
+            str: Zapisana odpowiedź lub None
+        """
+        with self._lock:
+            index_partition = self.partitions.get(partition)
+            if index_partition is None:
+                return None
+            index, similarity = index_partition.nearest(vector)
+            if index is None or similarity < self.threshold:
+                return None
+            cached_text = index_partition.texts[index]
+            value = index_partition.values[index]
+
+        text_similarity = difflib.SequenceMatcher(None, cached_text, text, autojunk=False).ratio()
+        if text_similarity < self.min_text_similarity:
+            return None
+
+        logger.info(f"Trafienie cache semantycznego w partycji {partition} (podobieństwo {similarity:.3f})")
+        return value
+
+    def add(self, partition: str, text: str, vector: np.ndarray, value: str) -> None:
+        """Dodaje odpowiedź do partycji"""
+        with self._lock:
+            if partition not in self.partitions:
+                self.partitions[partition] = _Partition(len(vector), self.max_entries)
+            self.partitions[partition].add(vector, text, value)
@@ -0,0 +1,115 @@
+# services/summary_service.py
+import logging
+from typing import List, Optional
+from database.models import Message
+from utils.token_counter import get_encoding_name, count_message_tokens
+from config import SUMMARY_MODEL, SUMMARY_TRIGGER_TOKENS, SUMMARY_KEEP_RECENT_MESSAGES, SUMMARY_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "Streszczasz rozmowę użytkownika z asystentem AI. Zachowaj fakty, decyzje, preferencje "
+    "użytkownika i otwarte wątki. Pisz zwięźle, w języku rozmowy, bez komentarzy od siebie."
+)
+
+class SummaryService:
+    """Serwis przyrostowego streszczania długich konwersacji"""
+
+    def __init__(self, api_service, repository_service):
+        self.api_service = api_service
+        self.conversation_repository = repository_service.conversation_repository
+        self.message_repository = repository_service.message_repository
+        # Konwersacje, dla których streszczanie jest w toku
+        self._in_progress = set()
+
+        logger.info("Serwis streszczeń zainicjalizowany")
+
+    @staticmethod
+    def unsummarized(history: List[Message], summary_until_message_id: Optional[int]) -> List[Message]:
+        """Zwraca wiadomości z historii, które nie zostały jeszcze ujęte w streszczeniu"""
+        if not summary_until_message_id:
+            return history
+        # Wiadomość bez id czeka na zapis w tle - jest nowsza niż streszczenie
+        return [msg for msg in history if msg.id is None or msg.id > summary_until_message_id]
+
+    async def summarize_if_needed(self, conversation_id: int) -> bool:
+        """
+        Włącza starsze wiadomości do streszczenia, jeśli konwersacja przekroczyła próg tokenów
+
+        Returns:
+            bool: True, jeśli streszczenie zostało zaktualizowane
+        """
+        if conversation_id in self._in_progress:
+            return False
+
+        self._in_progress.add(conversation_id)
+        try:
+            conversation = await self.conversation_repository.get_by_id(conversation_id)
+            if not conversation:
+                return False
+
+            pending = await self._load_unsummarized(conversation_id, conversation.summary_until_message_id)
+
+            encoding_name = get_encoding_name(SUMMARY_MODEL)
+            total_tokens = sum(count_message_tokens(msg, encoding_name) for msg in pending)
+            if total_tokens < SUMMARY_TRIGGER_TOKENS:
+                return False
+
+            # Najnowsze wiadomości zostają w prompcie w oryginalnej postaci
+            to_fold = pending[:-SUMMARY_KEEP_RECENT_MESSAGES]
+            if not to_fold or to_fold[-1].id is None:
+                return False
+
+            summary = await self.api_service.chat_completion_text(
+                self._build_summary_prompt(conversation.summary, to_fold),
+                SUMMARY_MODEL
+            )
+
+            await self.conversation_repository.update_summary(conversation_id, summary, to_fold[-1].id)
+            logger.info(f"Zaktualizowano streszczenie konwersacji {conversation_id} ({len(to_fold)} wiadomości)")
+            return True
+        except Exception as e:
+            logger.error(f"Błąd streszczania konwersacji {conversation_id}: {e}")
+            return False
+        finally:
+            self._in_progress.discard(conversation_id)
+
+    async def _load_unsummarized(self, conversation_id: int, summary_until_message_id: Optional[int]) -> List[Message]:
+        """
+        Pobiera wszystkie wiadomości nowsze niż streszczenie (od najstarszej do najnowszej)
+
+        Historia jest pobierana stronami od końca (kursor before_id), aż do wiadomości
+        objętej streszczeniem lub początku konwersacji - żadna wiadomość nie wypada
+        z kontekstu bez włączenia jej do streszczenia.
+        """
+        page = await self.message_repository.get_conversation_history(conversation_id, limit=SUMMARY_PAGE_SIZE)
+        history = page
+        while len(page) >= SUMMARY_PAGE_SIZE:
+            # Wiadomości bez id czekają na zapis w tle - kursorem jest najstarsza zapisana
+            oldest_id = next((msg.id for msg in history if msg.id is not None), None)
+            if oldest_id is None or (summary_until_message_id and oldest_id <= summary_until_message_id):
+                break
+
+            page = await self.message_repository.get_conversation_history(
+                conversation_id, limit=SUMMARY_PAGE_SIZE, before_id=oldest_id
+            )
+            history = page + history
+
+        return self.unsummarized(history, summary_until_message_id)
+
+    @staticmethod
+    def _build_summary_prompt(previous_summary: Optional[str], messages: List[Message]) -> List[dict]:
+        """Przygotowuje wiadomości dla modelu streszczającego"""
+        transcript = "\n".join(
+            f"{'Użytkownik' if msg.is_from_user else 'Asystent'}: {msg.content}" for msg in messages
+        )
+
+        content = ""
+        if previous_summary:
+            content += f"Dotychczasowe streszczenie:\n{previous_summary}\n\n"
+        content += f"Nowe wiadomości:\n{transcript}\n\nPodaj zaktualizowane streszczenie całej rozmowy."
+
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": content}
+        ]
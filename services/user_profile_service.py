@@ -0,0 +1,125 @@
+# services/user_profile_service.py
+"""
+Cache profili użytkowników (język, tryb, model, subskrypcja) z pobieraniem zbiorczym
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, Optional
+from database.models import UserProfile
+from utils.cache import TTLCache
+from config import (
+    USER_PROFILE_CACHE_MAX_SIZE, USER_PROFILE_TTL, USER_PROFILE_REFRESH_AFTER,
+    USER_PROFILE_MISSING_TTL, USER_PROFILE_BATCH_DELAY, USER_PROFILE_BATCH_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+class UserProfileService:
+    """
+    Profile użytkowników w pamięci procesu
+
+    Brakujące profile są pobierane zbiorczo: zgłoszenia z krótkiego okna czasu
+    (USER_PROFILE_BATCH_DELAY) trafiają do jednego zapytania. Profil starszy niż
+    USER_PROFILE_REFRESH_AFTER jest nadal zwracany, a w tle pobierana jest jego nowa wersja.
+    """
+
+    def __init__(self, user_repository):
+        self.user_repository = user_repository
+        self.cache = TTLCache(maxsize=USER_PROFILE_CACHE_MAX_SIZE, ttl=USER_PROFILE_TTL)
+        # Czas pobrania profilu - do odświeżania w tle
+        self._loaded_at: Dict[int, float] = {}
+        # Użytkownicy oczekujący na pobranie w najbliższej partii
+        self._waiting: Dict[int, asyncio.Future] = {}
+        self._batch_task: Optional[asyncio.Task] = None
+
+    def peek(self, user_id: int) -> Optional[UserProfile]:
+        """
+        Zwraca profil z cache bez zapytań do bazy
+
+        Jeśli profil jest nieaktualny, a działa pętla zdarzeń, zleca jego odświeżenie w tle.
+        """
+        profile = self.cache.get(user_id)
+        if profile is not None and time.monotonic() - self._loaded_at.get(user_id, 0) > USER_PROFILE_REFRESH_AFTER:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return profile
+            self._request(user_id)
+        return profile
+
+    async def get(self, user_id: int) -> Optional[UserProfile]:
+        """Zwraca profil z cache lub pobiera go (razem z innymi oczekującymi profilami)"""
+        profile = self.peek(user_id)
+        if profile is not None:
+            return profile
+        return await self._request(user_id)
+
+    async def prefetch(self, user_ids: Iterable[int]) -> None:
+        """Pobiera zbiorczo profile, których nie ma w cache"""
+        missing = [user_id for user_id in set(user_ids) if user_id not in self.cache]
+        for start in range(0, len(missing), USER_PROFILE_BATCH_SIZE):
+            await self._load(missing[start:start + USER_PROFILE_BATCH_SIZE])
+
+        if missing:
+            logger.info(f"Wczytano profile {len(missing)} użytkowników")
+
+    def invalidate(self, user_id: int) -> None:
+        """Usuwa profil z cache (np. po zmianie ustawień użytkownika)"""
+        self.cache.invalidate(user_id)
+        self._loaded_at.pop(user_id, None)
+
+    def _request(self, user_id: int) -> asyncio.Future:
+        """Dopisuje użytkownika do najbliższej partii pobierania"""
+        future = self._waiting.get(user_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._waiting[user_id] = future
+        if self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._run_batches())
+        return future
+
+    async def _run_batches(self) -> None:
+        await asyncio.sleep(USER_PROFILE_BATCH_DELAY)
+        while self._waiting:
+            user_ids = list(self._waiting)[:USER_PROFILE_BATCH_SIZE]
+            futures = {user_id: self._waiting.pop(user_id) for user_id in user_ids}
+            try:
+                profiles = await self._load(user_ids)
+            except Exception as e:
+                logger.error(f"Błąd pobierania profili użytkowników: {e}")
+                profiles = {user_id: self.cache.get(user_id) for user_id in user_ids}
+
+            for user_id, future in futures.items():
+                if not future.done():
+                    future.set_result(profiles.get(user_id))
+
+    async def _load(self, user_ids: List[int]) -> Dict[int, UserProfile]:
+        profiles = {profile.user_id: profile for profile in await self.user_repository.get_profiles(user_ids)}
+        now = time.monotonic()
+        for user_id in user_ids:
+            profile = profiles.get(user_id)
+            if profile is None:
+                # Brak wiersza (lub błąd zapytania) - krótko pamiętany pusty profil,
+                # aby kolejne wiadomości nie ponawiały zapytania
+                profile = profiles[user_id] = UserProfile(user_id=user_id)
+                self.cache.set(user_id, profile, ttl=USER_PROFILE_MISSING_TTL)
+            else:
+                self.cache.set(user_id, profile)
+            self._loaded_at[user_id] = now
+
+        # Słownik czasów pobrania nie może rosnąć ponad rozmiar cache
+        if len(self._loaded_at) > 2 * USER_PROFILE_CACHE_MAX_SIZE:
+            self._loaded_at = {user_id: loaded_at for user_id, loaded_at in self._loaded_at.items() if user_id in self.cache}
+
+        return profiles
+
+_user_profile_service = None
+
+def get_user_profile_service() -> UserProfileService:
+    """Zwraca współdzieloną (jedną na proces) instancję UserProfileService"""
+    global _user_profile_service
+    if _user_profile_service is None:
+        from services.repository_service import get_repository_service
+        _user_profile_service = UserProfileService(get_repository_service().user_repository)
+    return _user_profile_service
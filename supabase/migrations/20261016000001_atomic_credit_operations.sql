@@ -0,0 +1,126 @@
+-- Atomowe operacje na kredytach wywoływane jako RPC z CreditRepository.
+-- Każda funkcja sprawdza saldo, zmienia je i zapisuje wpis w credit_transactions
+-- w jednej transakcji, zwracając stan kredytów przed i po operacji.
+
+create or replace function public.deduct_user_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null
+)
+returns table (success boolean, credits_before integer, credits_after integer)
+language plpgsql
+as $$
+declare
+    v_before integer;
+begin
+    -- Blokada wiersza eliminuje wyścig przy równoległych wiadomościach jednego użytkownika
+    select uc.credits_amount into v_before
+    from public.user_credits uc
+    where uc.user_id = p_user_id
+    for update;
+
+    if not found then
+        return query select false, 0, 0;
+        return;
+    end if;
+
+    if v_before < p_amount then
+        return query select false, v_before, v_before;
+        return;
+    end if;
+
+    update public.user_credits
+    set credits_amount = v_before - p_amount
+    where user_id = p_user_id;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_before, v_before - p_amount, p_description, now());
+
+    return query select true, v_before, v_before - p_amount;
+end;
+$$;
+
+create or replace function public.add_user_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null
+)
+returns table (success boolean, credits_before integer, credits_after integer)
+language plpgsql
+as $$
+declare
+    v_before integer;
+begin
+    insert into public.user_credits (user_id, credits_amount, total_credits_purchased, total_spent)
+    values (p_user_id, 0, 0, 0)
+    on conflict (user_id) do nothing;
+
+    select uc.credits_amount into v_before
+    from public.user_credits uc
+    where uc.user_id = p_user_id
+    for update;
+
+    update public.user_credits
+    set credits_amount = v_before + p_amount,
+        total_credits_purchased = total_credits_purchased + p_amount,
+        last_purchase_date = now()
+    where user_id = p_user_id;
+
+    if p_amount <> 0 then
+        insert into public.credit_transactions
+            (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+        values
+            (p_user_id, 'add', p_amount, v_before, v_before + p_amount, p_description, now());
+    end if;
+
+    return query select true, v_before, v_before + p_amount;
+end;
+$$;
+
+create or replace function public.purchase_credits(
+    p_user_id bigint,
+    p_package_id bigint
+)
+returns table (success boolean, credits_before integer, credits_after integer, package jsonb)
+language plpgsql
+as $$
+declare
+    v_package public.credit_packages%rowtype;
+    v_before integer;
+begin
+    select * into v_package
+    from public.credit_packages cp
+    where cp.id = p_package_id and cp.is_active = true;
+
+    if not found then
+        return query select false, 0, 0, null::jsonb;
+        return;
+    end if;
+
+    insert into public.user_credits (user_id, credits_amount, total_credits_purchased, total_spent)
+    values (p_user_id, 0, 0, 0)
+    on conflict (user_id) do nothing;
+
+    select uc.credits_amount into v_before
+    from public.user_credits uc
+    where uc.user_id = p_user_id
+    for update;
+
+    update public.user_credits
+    set credits_amount = v_before + v_package.credits,
+        total_credits_purchased = total_credits_purchased + v_package.credits,
+        total_spent = total_spent + v_package.price,
+        last_purchase_date = now()
+    where user_id = p_user_id;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description, created_at)
+    values
+        (p_user_id, 'purchase', v_package.credits, v_before, v_before + v_package.credits,
+         'Zakup pakietu ' || v_package.name, now());
+
+    return query select true, v_before, v_before + v_package.credits, to_jsonb(v_package);
+end;
+$$;
@@ -0,0 +1,4 @@
+-- Liczba tokenów treści wiadomości dla poszczególnych tokenizerów,
+-- używana przy składaniu promptu w budżecie tokenów.
+alter table public.messages
+    add column if not exists token_counts jsonb;
@@ -0,0 +1,5 @@
+-- Przyrostowe streszczenie starszej części konwersacji.
+-- summary_until_message_id wskazuje ostatnią wiadomość ujętą w streszczeniu.
+alter table public.conversations
+    add column if not exists summary text,
+    add column if not exists summary_until_message_id bigint;
@@ -0,0 +1,61 @@
+-- Zbiorczy zapis wiadomości i liczników messages_used (MessageWriter).
+-- Każda partia ma identyfikator nadany po stronie bota, a wiadomości - client_id,
+-- więc ponowne wysłanie partii (np. odtworzenie z dziennika) nie tworzy duplikatów.
+alter table public.messages
+    add column if not exists client_id uuid;
+
+create unique index if not exists messages_client_id_key
+    on public.messages (client_id);
+
+create table if not exists public.applied_write_batches (
+    batch_id uuid primary key,
+    applied_at timestamptz not null default now()
+);
+
+create or replace function public.apply_message_batch(
+    p_batch_id uuid,
+    p_messages jsonb,
+    p_message_counts jsonb default '{}'::jsonb
+)
+returns table (client_id uuid, id bigint)
+language plpgsql
+as $$
+#variable_conflict use_column
+begin
+    insert into public.applied_write_batches (batch_id)
+    values (p_batch_id)
+    on conflict (batch_id) do nothing;
+
+    -- Partia zapisana wcześniej zwraca tylko identyfikatory wiadomości
+    if found then
+        -- Kolejność wstawiania odpowiada kolejności w partii, więc id rosną chronologicznie
+        insert into public.messages
+            (client_id, conversation_id, user_id, content, is_from_user, model_used, token_counts, created_at)
+        select r.client_id, r.conversation_id, r.user_id, r.content, r.is_from_user,
+               r.model_used, r.token_counts, r.created_at
+        -- Lista kolumn musi być wewnątrz rows from - with ordinality jej nie przyjmuje
+        from rows from (
+            jsonb_to_recordset(p_messages) as (
+                client_id uuid, conversation_id bigint, user_id bigint, content text,
+                is_from_user boolean, model_used text, token_counts jsonb, created_at timestamptz
+            )
+        ) with ordinality as r(
+            client_id, conversation_id, user_id, content, is_from_user, model_used, token_counts, created_at, ord
+        )
+        order by r.ord
+        on conflict (client_id) do nothing;
+
+        update public.users u
+        set messages_used = coalesce(u.messages_used, 0) + c.value::integer
+        from jsonb_each_text(p_message_counts) as c(key, value)
+        where u.id = c.key::bigint;
+    end if;
+
+    return query
+    select m.client_id, m.id
+    from public.messages m
+    where m.client_id in (
+        select r.client_id from jsonb_to_recordset(p_messages) as r(client_id uuid)
+    );
+end;
+$$;
@@ -0,0 +1,141 @@
+-- Dzienne podsumowania transakcji kredytowych dla analiz (wykresy, statystyki).
+-- Tabela credit_daily_rollup jest aktualizowana wyzwalaczem przy każdej nowej transakcji,
+-- więc zapytania analityczne czytają najwyżej (liczba dni x liczba kategorii) wierszy,
+-- niezależnie od długości historii użytkownika.
+
+-- Kategoria operacji na podstawie typu i opisu transakcji
+create or replace function public.credit_category(p_transaction_type text, p_description text)
+returns text
+language sql
+immutable
+as $$
+    select case
+        when p_transaction_type in ('add', 'purchase', 'subscription', 'subscription_renewal') then 'added'
+        when p_transaction_type <> 'deduct' then 'adjustment'
+        when lower(coalesce(p_description, '')) ~ '(wiadomość|message|chat|gpt)' then 'messages'
+        when lower(coalesce(p_description, '')) ~ '(obraz|dall-e|image|dall)' then 'images'
+        when lower(coalesce(p_description, '')) ~ '(dokument|document|pdf|plik)' then 'documents'
+        when lower(coalesce(p_description, '')) ~ '(zdjęci|zdjęc|photo|foto)' then 'photos'
+        else 'other'
+    end
+$$;
+
+create table if not exists public.credit_daily_rollup (
+    user_id bigint not null,
+    day date not null,
+    category text not null,
+    spent integer not null default 0,
+    added integer not null default 0,
+    transactions integer not null default 0,
+    max_spent integer not null default 0,
+    max_description text,
+    closing_balance integer,
+    closing_at timestamptz,
+    primary key (user_id, day, category)
+);
+
+create or replace function public.credit_daily_rollup_apply()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_at timestamptz := coalesce(new.created_at, now());
+    v_spent integer := case when new.transaction_type = 'deduct' then new.amount else 0 end;
+    v_added integer := case when new.transaction_type in ('add', 'purchase', 'subscription', 'subscription_renewal')
+                            then new.amount else 0 end;
+begin
+    insert into public.credit_daily_rollup as r
+        (user_id, day, category, spent, added, transactions, max_spent, max_description, closing_balance, closing_at)
+    values
+        (new.user_id, (v_at at time zone 'utc')::date, public.credit_category(new.transaction_type, new.description),
+         v_spent, v_added, 1, v_spent, case when v_spent > 0 then new.description end, new.credits_after, v_at)
+    on conflict (user_id, day, category) do update set
+        spent = r.spent + excluded.spent,
+        added = r.added + excluded.added,
+        transactions = r.transactions + 1,
+        max_spent = greatest(r.max_spent, excluded.max_spent),
+        max_description = case when excluded.max_spent > r.max_spent then excluded.max_description else r.max_description end,
+        closing_balance = case when excluded.closing_at >= r.closing_at then excluded.closing_balance else r.closing_balance end,
+        closing_at = greatest(r.closing_at, excluded.closing_at);
+    return new;
+end;
+$$;
+
+-- Wyzwalacz i uzupełnienie danych historycznych w jednej transakcji, bez równoległych zapisów
+lock table public.credit_transactions in share row exclusive mode;
+
+drop trigger if exists credit_daily_rollup_apply on public.credit_transactions;
+create trigger credit_daily_rollup_apply
+    after insert on public.credit_transactions
+    for each row execute function public.credit_daily_rollup_apply();
+
+insert into public.credit_daily_rollup
+    (user_id, day, category, spent, added, transactions, max_spent, max_description, closing_balance, closing_at)
+select
+    t.user_id,
+    t.day,
+    t.category,
+    sum(t.spent),
+    sum(t.added),
+    count(*),
+    max(t.spent),
+    (array_agg(t.description order by t.spent desc))[1],
+    (array_agg(t.credits_after order by t.at desc))[1],
+    max(t.at)
+from (
+    select
+        ct.user_id,
+        (coalesce(ct.created_at, now()) at time zone 'utc')::date as day,
+        public.credit_category(ct.transaction_type, ct.description) as category,
+        case when ct.transaction_type = 'deduct' then ct.amount else 0 end as spent,
+        case when ct.transaction_type in ('add', 'purchase', 'subscription', 'subscription_renewal')
+             then ct.amount else 0 end as added,
+        ct.description,
+        ct.credits_after,
+        coalesce(ct.created_at, now()) as at
+    from public.credit_transactions ct
+) t
+group by t.user_id, t.day, t.category
+on conflict (user_id, day, category) do nothing;
+
+-- Ostatnie transakcje użytkownika (historia w menu kredytów)
+create index if not exists credit_transactions_user_created_at
+    on public.credit_transactions (user_id, created_at desc);
+
+-- Dzienne sumy wydanych i dodanych kredytów oraz saldo na koniec dnia (dzień bieżący włącznie)
+create or replace function public.get_credit_daily_usage(p_user_id bigint, p_days integer)
+returns table (day date, spent bigint, added bigint, closing_balance integer)
+language sql
+stable
+as $$
+    select
+        r.day,
+        sum(r.spent),
+        sum(r.added),
+        (array_agg(r.closing_balance order by r.closing_at desc))[1]
+    from public.credit_daily_rollup r
+    where r.user_id = p_user_id
+      and r.day > (now() at time zone 'utc')::date - p_days
+    group by r.day
+    order by r.day;
+$$;
+
+-- Zużycie kredytów według kategorii operacji wraz z najdroższą operacją
+create or replace function public.get_credit_usage_by_category(p_user_id bigint, p_days integer)
+returns table (category text, spent bigint, transactions bigint, max_spent integer, max_description text)
+language sql
+stable
+as $$
+    select
+        r.category,
+        sum(r.spent),
+        sum(r.transactions),
+        max(r.max_spent),
+        (array_agg(r.max_description order by r.max_spent desc))[1]
+    from public.credit_daily_rollup r
+    where r.user_id = p_user_id
+      and r.day > (now() at time zone 'utc')::date - p_days
+      and r.spent > 0
+    group by r.category
+    order by sum(r.spent) desc;
+$$;
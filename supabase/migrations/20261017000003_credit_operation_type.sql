@@ -0,0 +1,162 @@
+-- Rodzaj operacji i model zapisywane w transakcjach kredytowych.
+-- Kategoria w credit_daily_rollup pochodzi z kolumny operation_type zamiast z opisu
+-- transakcji (opisy są tłumaczone na język użytkownika). Rodzaje operacji odpowiadają
+-- kluczom CREDIT_COSTS: message, image, document, photo oraz other.
+alter table public.credit_transactions
+    add column if not exists operation_type text,
+    add column if not exists model text;
+
+-- Rodzaj operacji odgadywany z opisu - tylko dla starszych wpisów i wywołań bez operation_type
+create or replace function public.credit_operation_type(p_description text)
+returns text
+language sql
+immutable
+as $$
+    select case
+        when lower(coalesce(p_description, '')) ~ '(wiadomość|message|chat|gpt)' then 'message'
+        when lower(coalesce(p_description, '')) ~ '(obraz|dall-e|image|dall)' then 'image'
+        when lower(coalesce(p_description, '')) ~ '(dokument|document|pdf|plik)' then 'document'
+        when lower(coalesce(p_description, '')) ~ '(zdjęci|zdjęc|photo|foto)' then 'photo'
+        else 'other'
+    end
+$$;
+
+create or replace function public.credit_category(p_transaction_type text, p_operation_type text, p_description text)
+returns text
+language sql
+immutable
+as $$
+    select case
+        when p_transaction_type in ('add', 'purchase', 'subscription', 'subscription_renewal') then 'added'
+        when p_transaction_type <> 'deduct' then 'adjustment'
+        else coalesce(p_operation_type, public.credit_operation_type(p_description))
+    end
+$$;
+
+create or replace function public.credit_daily_rollup_apply()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_at timestamptz := coalesce(new.created_at, now());
+    v_spent integer := case when new.transaction_type = 'deduct' then new.amount else 0 end;
+    v_added integer := case when new.transaction_type in ('add', 'purchase', 'subscription', 'subscription_renewal')
+                            then new.amount else 0 end;
+begin
+    insert into public.credit_daily_rollup as r
+        (user_id, day, category, spent, added, transactions, max_spent, max_description, closing_balance, closing_at)
+    values
+        (new.user_id, (v_at at time zone 'utc')::date,
+         public.credit_category(new.transaction_type, new.operation_type, new.description),
+         v_spent, v_added, 1, v_spent, case when v_spent > 0 then new.description end, new.credits_after, v_at)
+    on conflict (user_id, day, category) do update set
+        spent = r.spent + excluded.spent,
+        added = r.added + excluded.added,
+        transactions = r.transactions + 1,
+        max_spent = greatest(r.max_spent, excluded.max_spent),
+        max_description = case when excluded.max_spent > r.max_spent then excluded.max_description else r.max_description end,
+        closing_balance = case when excluded.closing_at >= r.closing_at then excluded.closing_balance else r.closing_balance end,
+        closing_at = greatest(r.closing_at, excluded.closing_at);
+    return new;
+end;
+$$;
+
+drop function if exists public.credit_category(text, text);
+
+-- Kategorie podsumowań dziennych przyjmują nazwy rodzajów operacji
+lock table public.credit_transactions in share row exclusive mode;
+
+update public.credit_daily_rollup
+set category = case category
+    when 'messages' then 'message'
+    when 'images' then 'image'
+    when 'documents' then 'document'
+    when 'photos' then 'photo'
+end
+where category in ('messages', 'images', 'documents', 'photos');
+
+-- Nowa sygnatura z rodzajem operacji i modelem
+drop function if exists public.deduct_user_credits(bigint, integer, text);
+
+create or replace function public.deduct_user_credits(
+    p_user_id bigint,
+    p_amount integer,
+    p_description text default null,
+    p_operation_type text default null,
+    p_model text default null
+)
+returns table (success boolean, credits_before integer, credits_after integer)
+language plpgsql
+as $$
+declare
+    v_before integer;
+begin
+    -- Blokada wiersza eliminuje wyścig przy równoległych wiadomościach jednego użytkownika
+    select uc.credits_amount into v_before
+    from public.user_credits uc
+    where uc.user_id = p_user_id
+    for update;
+
+    if not found then
+        return query select false, 0, 0;
+        return;
+    end if;
+
+    if v_before < p_amount then
+        return query select false, v_before, v_before;
+        return;
+    end if;
+
+    update public.user_credits
+    set credits_amount = v_before - p_amount
+    where user_id = p_user_id;
+
+    insert into public.credit_transactions
+        (user_id, transaction_type, amount, credits_before, credits_after, description,
+         operation_type, model, created_at)
+    values
+        (p_user_id, 'deduct', p_amount, v_before, v_before - p_amount, p_description,
+         coalesce(p_operation_type, public.credit_operation_type(p_description)), p_model, now());
+
+    return query select true, v_before, v_before - p_amount;
+end;
+$$;
+
+-- Wpisy wydatków, których rodzaj nie został jeszcze ustalony (indeks pustoszeje po uzupełnieniu)
+create index if not exists credit_transactions_unclassified
+    on public.credit_transactions (id)
+    where transaction_type = 'deduct' and operation_type is null;
+
+-- Jednorazowe uzupełnienie rodzaju operacji i modelu w starszych wpisach, partiami.
+-- Kategoria w credit_daily_rollup się nie zmienia - ustalana jest tą samą funkcją.
+-- Zwraca liczbę uzupełnionych wpisów (0 oznacza koniec).
+create or replace function public.classify_credit_transactions(p_batch_size integer default 1000)
+returns integer
+language plpgsql
+as $$
+declare
+    v_count integer;
+begin
+    with batch as (
+        select ct.id
+        from public.credit_transactions ct
+        where ct.transaction_type = 'deduct' and ct.operation_type is null
+        order by ct.id
+        limit p_batch_size
+        for update skip locked
+    )
+    update public.credit_transactions ct
+    set operation_type = public.credit_operation_type(ct.description),
+        -- Opisy wiadomości mają postać "Wiadomość (model)"
+        model = coalesce(
+            ct.model,
+            case when public.credit_operation_type(ct.description) = 'message'
+                 then substring(ct.description from '\(([^()]+)\)\s*$') end
+        )
+    from batch
+    where ct.id = batch.id;
+
+    get diagnostics v_count = row_count;
+    return v_count;
+end;
+$$;
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import httpx
+
+from api.openai_client import OpenAIClient
+from services.model_scheduler import ModelScheduler
+from services.response_cache import ResponseCache
+from services.semantic_cache import SemanticCache
+
+try:
+    from services.api_service import APIService
+except ImportError as e:
+    # APIService importuje klienta Supabase (supabase-py)
+    raise unittest.SkipTest(f"Brak zależności serwisu API: {e}")
+
+TRANSLATION_TEXT = "Dzień dobry, chciałbym zarezerwować stolik na dwie osoby na dzisiejszy wieczór."
+
+
+class FakeOpenAI:
+    """Odpowiedzi API OpenAI (czat i embeddingi) z licznikiem zapytań"""
+
+    def __init__(self):
+        self.completions = 0
+        self.embeddings = 0
+
+    def handler(self, request):
+        body = json.loads(request.content)
+        if request.url.path.endswith("/embeddings"):
+            self.embeddings += 1
+            # Ten sam wektor dla niemal identycznych tekstów
+            return httpx.Response(200, json={
+                "object": "list",
+                "model": body["model"],
+                "data": [{"object": "embedding", "index": 0, "embedding": [1.0, 0.0, 0.0]}],
+                "usage": {"prompt_tokens": 1, "total_tokens": 1}
+            })
+
+        self.completions += 1
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"Tłumaczenie {self.completions}"}}]
+        })
+
+
+class CachedChatCompletionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fake = FakeOpenAI()
+
+        service = APIService.__new__(APIService)
+        service.claude_models = []
+        service.openai = OpenAIClient(
+            api_key="test", http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.fake.handler))
+        )
+        service.scheduler = ModelScheduler()
+        service.response_cache = ResponseCache(db_path=os.path.join(self.directory.name, "responses.sqlite3"))
+        service.semantic_cache = SemanticCache()
+        self.service = service
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def translate(self, text):
+        messages = [{"role": "system", "content": "Przetłumacz na angielski."}, {"role": "user", "content": text}]
+        return asyncio.run(self.service.cached_chat_completion_text(
+            messages, "gpt-3.5-turbo", semantic_partition="translate:en", semantic_text=text
+        ))
+
+    def test_exact_hit_is_returned(self):
+        first = self.translate(TRANSLATION_TEXT)
+        second = self.translate(TRANSLATION_TEXT)
+
+        self.assertEqual(first, ("Tłumaczenie 1", False))
+        self.assertEqual(second, ("Tłumaczenie 1", True))
+        self.assertEqual(self.fake.completions, 1)
+
+    def test_semantic_hit_is_returned(self):
+        first = self.translate(TRANSLATION_TEXT)
+        # Różnica w interpunkcji - inny klucz cache dokładnego
+        second = self.translate(TRANSLATION_TEXT.rstrip(".") + "!")
+
+        self.assertEqual(first, ("Tłumaczenie 1", False))
+        self.assertEqual(second, ("Tłumaczenie 1", True))
+        self.assertEqual(self.fake.completions, 1)
+        self.assertEqual(self.fake.embeddings, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
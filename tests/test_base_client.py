@@ -0,0 +1,62 @@
+import asyncio
+import unittest
+
+import httpx
+
+from api.openai_client import OpenAIClient
+
+
+def completion_response(content):
+    return httpx.Response(200, json={
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}]
+    })
+
+
+def make_client(handler):
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return OpenAIClient(api_key="test", retry_delay=0, http_client=http_client)
+
+
+class RequestWithRetryTest(unittest.TestCase):
+    def test_sdk_method_is_awaited(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return completion_response("Cześć")
+
+        client = make_client(handler)
+        text = asyncio.run(client.chat_completion_text([{"role": "user", "content": "Hej"}], "gpt-4o"))
+
+        self.assertEqual(text, "Cześć")
+        self.assertEqual(len(requests), 1)
+
+    def test_retryable_error_is_retried(self):
+        responses = [httpx.Response(429, headers={"retry-after": "0"}, json={"error": {"message": "limit"}}),
+                     completion_response("OK")]
+
+        client = make_client(lambda request: responses.pop(0))
+        text = asyncio.run(client.chat_completion_text([{"role": "user", "content": "Hej"}], "gpt-4o"))
+
+        self.assertEqual(text, "OK")
+        self.assertEqual(responses, [])
+
+    def test_non_retryable_error_is_raised(self):
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+        client = make_client(handler)
+        with self.assertRaises(Exception):
+            asyncio.run(client.chat_completion_text([{"role": "user", "content": "Hej"}], "gpt-4o"))
+        self.assertEqual(len(requests), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+
+import httpx
+
+from api.openai_client import OpenAIClient
+from database.models import Conversation, Message
+from services.summary_service import SummaryService
+from utils.token_counter import get_encoding_name
+from config import SUMMARY_MODEL, SUMMARY_KEEP_RECENT_MESSAGES
+
+
+class FakeConversationRepository:
+    def __init__(self, conversation):
+        self.conversation = conversation
+        self.updates = []
+
+    async def get_by_id(self, conversation_id):
+        return self.conversation
+
+    async def update_summary(self, conversation_id, summary, until_message_id):
+        self.updates.append((conversation_id, summary, until_message_id))
+        return True
+
+
+class FakeMessageRepository:
+    """Historia w bazie: zwraca ostatnie `limit` wiadomości starszych niż before_id"""
+
+    def __init__(self, messages):
+        self.messages = messages
+        self.calls = []
+
+    async def get_conversation_history(self, conversation_id, limit=20, before_id=None):
+        self.calls.append(before_id)
+        messages = [msg for msg in self.messages if before_id is None or msg.id < before_id]
+        return messages[-limit:]
+
+
+def make_messages(count, tokens_per_message):
+    encoding_name = get_encoding_name(SUMMARY_MODEL)
+    return [
+        Message(id=index, conversation_id=1, content=f"Wiadomość {index}", is_from_user=index % 2 == 1,
+                token_counts={encoding_name: tokens_per_message})
+        for index in range(1, count + 1)
+    ]
+
+
+def make_api_service(summary, requests):
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": SUMMARY_MODEL,
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": summary}}]
+        })
+
+    http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return OpenAIClient(api_key="test", http_client=http_client)
+
+
+class SummaryServiceTest(unittest.TestCase):
+    def make_service(self, conversation, messages, requests):
+        repository_service = SimpleNamespace(
+            conversation_repository=FakeConversationRepository(conversation),
+            message_repository=FakeMessageRepository(messages)
+        )
+        service = SummaryService(make_api_service("Streszczenie rozmowy", requests), repository_service)
+        return service, repository_service
+
+    def test_summary_is_written(self):
+        requests = []
+        # Próg tokenów przekraczają dopiero wiadomości spoza ostatnich 20
+        messages = make_messages(250, 20)
+        service, repositories = self.make_service(Conversation(id=1, user_id=1), messages, requests)
+
+        self.assertTrue(asyncio.run(service.summarize_if_needed(1)))
+
+        folded_until = messages[-SUMMARY_KEEP_RECENT_MESSAGES - 1].id
+        self.assertEqual(repositories.conversation_repository.updates, [(1, "Streszczenie rozmowy", folded_until)])
+        self.assertEqual(len(requests), 1)
+        # Streszczenie obejmuje całą historię, także najstarszą wiadomość
+        self.assertIn("Wiadomość 1\n", requests[0]["messages"][1]["content"])
+
+    def test_history_is_read_back_to_previous_summary(self):
+        requests = []
+        messages = make_messages(400, 20)
+        conversation = Conversation(id=1, user_id=1, summary="Wcześniej", summary_until_message_id=150)
+        service, repositories = self.make_service(conversation, messages, requests)
+
+        self.assertTrue(asyncio.run(service.summarize_if_needed(1)))
+
+        prompt = requests[0]["messages"][1]["content"]
+        self.assertIn("Wcześniej", prompt)
+        self.assertIn("Wiadomość 151\n", prompt)
+        self.assertNotIn("Wiadomość 150\n", prompt)
+        # Stronicowanie kończy się na wiadomości objętej streszczeniem
+        self.assertEqual(repositories.message_repository.calls, [None, 301, 201])
+
+    def test_short_history_is_not_summarized(self):
+        requests = []
+        service, repositories = self.make_service(Conversation(id=1, user_id=1), make_messages(10, 20), requests)
+
+        self.assertFalse(asyncio.run(service.summarize_if_needed(1)))
+        self.assertEqual(requests, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,202 +1,120 @@
 """
 Ulepszony moduł do analizy wykorzystania kredytów
 """
-import io
-import matplotlib.pyplot as plt
-import numpy as np
 import datetime
 import pytz
 import logging
-from matplotlib.dates import DateFormatter
-from database.supabase_client import get_credit_transactions, get_user_credits
+import pandas as pd
+from telegram.error import BadRequest
+from database.supabase_client import (
+    get_credit_daily_usage, get_credit_usage_by_type, get_credit_ledger_version, get_user_credits
+)
+from services.chart_cache import get_chart_cache
+from services.media_registry import is_file_id_error
+from services.chart_renderer import (
+    get_chart_renderer, render_message_chart, render_usage_chart, render_breakdown_chart, ChartRenderError
+)
 from utils.translations import get_text
 from utils.user_utils import get_user_language
 
 # Dodaję loggera dla lepszej diagnostyki
 logger = logging.getLogger(__name__)
 
-async def generate_credit_usage_chart(user_id, days=30, language="pl"):
-    """Generuje wykres użycia kredytów w czasie"""
+# Domyślne nazwy kategorii - rodzajów operacji (credit_transactions.operation_type)
+CATEGORY_NAMES = {
+    "message": "Wiadomości",
+    "image": "Obrazy",
+    "document": "Dokumenty",
+    "photo": "Zdjęcia",
+    "other": "Inne",
+}
+
+def _daily_frame(daily_usage, days):
+    """
+    Zamienia dzienne podsumowania z bazy na ciągłą serię dni (kolumny spent, added, closing_balance)
+
+    Dni bez transakcji mają zerowe zużycie i saldo z poprzedniego dnia; seria zaczyna się
+    od pierwszego dnia z transakcją w analizowanym okresie.
+    """
+    frame = pd.DataFrame.from_records(daily_usage, columns=['day', 'spent', 'added', 'closing_balance'])
+    frame['day'] = pd.to_datetime(frame['day'], utc=True)
+    frame = frame.set_index('day')
+
+    today = pd.Timestamp.now(tz='UTC').normalize()
+    frame = frame.reindex(pd.date_range(end=today, periods=days, freq='D'))
+    frame[['spent', 'added']] = frame[['spent', 'added']].fillna(0)
+    frame['closing_balance'] = frame['closing_balance'].ffill()
+
+    first_day = frame['closing_balance'].first_valid_index()
+    if first_day is None:
+        return frame.iloc[0:0]
+    return frame.loc[first_day:]
+
+async def _render_error_chart(text, figsize=(10, 6)):
+    """Renderuje wykres z komunikatem błędu; None, jeśli renderowanie również zawiodło"""
     try:
-        # Dodane await przed wywołaniem funkcji asynchronicznej
-        transactions = await get_credit_transactions(user_id, days)
-        
-        if not transactions:
-            logger.warning(f"Brak transakcji dla użytkownika {user_id} w okresie {days} dni")
-            # Generujemy prosty wykres informacyjny zamiast zwracać None
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, get_text("no_transaction_data", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=20, color='gray', transform=plt.gca().transAxes)
-            
-            # Zapisz wykres do bufora
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            return buf
-        
-        # Przygotuj dane do wykresu
-        dates = []
-        balances = []
-        usage_amounts = []
-        purchase_amounts = []
-        
-        logger.info(f"Znaleziono {len(transactions)} transakcji do analizy")
-        
-        for trans in transactions:
-            try:
-                # Konwersja formatu daty
-                created_at = trans.get('created_at')
-                if isinstance(created_at, str):
-                    dt = datetime.datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                else:
-                    dt = created_at
-                    
-                dates.append(dt)
-                balances.append(trans.get('credits_after', 0))
-                
-                amount = trans.get('amount', 0)
-                
-                if trans.get('transaction_type') == 'deduct':
-                    usage_amounts.append(amount)
-                    purchase_amounts.append(0)
-                elif trans.get('transaction_type') in ['add', 'purchase', 'subscription', 'subscription_renewal']:
-                    usage_amounts.append(0)
-                    purchase_amounts.append(amount)
-            except Exception as e:
-                logger.error(f"Błąd przy przetwarzaniu transakcji: {e}", exc_info=True)
-        
-        if not dates:
-            logger.warning(f"Nie udało się przetworzyć żadnej transakcji")
-            # Generujemy prosty wykres informacyjny
-            plt.figure(figsize=(10, 6))
-            plt.text(0.5, 0.5, get_text("transaction_processing_error", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=20, color='gray', transform=plt.gca().transAxes)
-            plt.gca().set_axis_off()
-            
-            # Zapisz wykres do bufora
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            return buf
-        
-        plt.figure(figsize=(10, 6))
-        
-        # Wykres salda
-        plt.subplot(2, 1, 1)
-        plt.plot(dates, balances, 'b-', label='Saldo kredytów')
-        plt.xlabel(get_text("date", language))
-        plt.ylabel(get_text("credits", language))
-        plt.title(get_text("credit_balance_history", language))
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.gca().xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
-        plt.gcf().autofmt_xdate()
-        plt.legend()
-        
-        # Wykres użycia/zakupów
-        plt.subplot(2, 1, 2)
-        
-        # Użyj matplotlib.dates zamiast timestamp
-        import matplotlib.dates as mdates
-        dates_num = mdates.date2num(dates)
-        
-        # Oblicz szerokość słupków (w jednostkach daty Matplotlib)
-        width = min(1.0, (max(dates_num) - min(dates_num)) / len(dates_num) * 0.4) if len(dates_num) > 1 else 1.0
-        
-        # Wykres słupkowy użycia
-        usage_bars = plt.bar([d - width/2 for d in dates_num], usage_amounts, width=width, color='r', alpha=0.6, label='Wydane kredyty')
-        
-        # Wykres słupkowy zakupów
-        purchase_bars = plt.bar([d + width/2 for d in dates_num], purchase_amounts, width=width, color='g', alpha=0.6, label='Dodane kredyty')
-        
-        # Formatowanie osi X
-        plt.gca().xaxis.set_major_formatter(DateFormatter('%d-%m-%Y'))
-        plt.gcf().autofmt_xdate()
-        
-        # Etykiety i legenda
-        plt.xlabel(get_text("date", language))
-        plt.ylabel(get_text("credits", language))
-        plt.title(get_text("transaction_details", language))
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.legend()
-        
-        # Dopasowanie układu
-        plt.tight_layout()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+        return await get_chart_renderer().render(render_message_chart, text, 'red', 12, figsize)
+    except ChartRenderError:
+        return None
+
+async def _render_credit_usage_chart(user_id, days, language):
+    # Dzienne podsumowania liczone w bazie - najwyżej jeden wiersz na dzień
+    daily_usage = await get_credit_daily_usage(user_id, days)
+    
+    if not daily_usage:
+        logger.warning(f"Brak transakcji dla użytkownika {user_id} w okresie {days} dni")
+        # Generujemy prosty wykres informacyjny zamiast zwracać None
+        return await get_chart_renderer().render(render_message_chart, get_text("no_transaction_data", language))
     
+    # Przygotuj dane do wykresu - ciągła seria dni od pierwszej transakcji
+    frame = _daily_frame(daily_usage, days)
+    
+    if frame.empty:
+        logger.warning(f"Nie udało się przetworzyć żadnej transakcji")
+        # Generujemy prosty wykres informacyjny
+        return await get_chart_renderer().render(render_message_chart, get_text("transaction_processing_error", language))
+    
+    return await get_chart_renderer().render(render_usage_chart, {
+        "dates": list(frame.index.to_pydatetime()),
+        "balances": frame['closing_balance'].tolist(),
+        "usage_amounts": frame['spent'].tolist(),
+        "purchase_amounts": frame['added'].tolist(),
+        "date_label": get_text("date", language),
+        "credits_label": get_text("credits", language),
+        "balance_title": get_text("credit_balance_history", language),
+        "details_title": get_text("transaction_details", language)
+    })
+
+async def generate_credit_usage_chart(user_id, days=30, language="pl", cache_key=None):
+    """
+    Generuje wykres użycia kredytów w czasie (obraz PNG renderowany poza pętlą zdarzeń)
+    
+    Poprawnie wygenerowany wykres jest zapisywany w cache wykresów pod kluczem cache_key (jeśli podano).
+    """
+    try:
+        png = await _render_credit_usage_chart(user_id, days, language)
+    except ChartRenderError as e:
+        logger.error(f"Nie udało się wyrenderować wykresu użycia kredytów: {e}")
+        return None
     except Exception as e:
         logger.error(f"Błąd przy generowaniu wykresu: {e}", exc_info=True)
         # Generujemy wykres błędu
-        plt.figure(figsize=(10, 6))
-        plt.text(0.5, 0.5, get_text("chart_generation_error", language, error=str(e)), 
-                horizontalalignment='center', verticalalignment='center', 
-                fontsize=12, color='red', transform=plt.gca().transAxes)
-        plt.gca().set_axis_off()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        return buf
+        return await _render_error_chart(get_text("chart_generation_error", language, error=str(e)))
+    
+    if cache_key is not None:
+        get_chart_cache().put(cache_key, png)
+    return png
 
 async def get_credit_usage_breakdown(user_id, days=30, language="pl"):
-    """Pobiera rozkład zużycia kredytów według rodzaju operacji z dodatkową obsługą błędów"""
+    """Pobiera rozkład zużycia kredytów według rodzaju operacji (kategorie liczone w bazie)"""
     try:
-        from database.supabase_client import get_credit_usage_by_type
-        # Dodane await przed wywołaniem funkcji asynchronicznej
-        breakdown = await get_credit_usage_by_type(user_id, days)
+        usage_by_type = await get_credit_usage_by_type(user_id, days)
         
-        # Jeśli brak kategorii, stwórz podstawowy rozkład
-        if not breakdown:
-            logger.warning(f"Brak danych rozkładu dla użytkownika {user_id} - wykorzystujemy dane transakcji")
-            # Dodane await przed wywołaniem funkcji asynchronicznej
-            transactions = await get_credit_transactions(user_id, days)
-            
-            # Nazwy kategorii w odpowiednim języku
-            messages_category = get_text("messages_category", language, default="Wiadomości")
-            images_category = get_text("images_category", language, default="Obrazy")
-            documents_category = get_text("documents_category", language, default="Dokumenty")
-            photos_category = get_text("photos_category", language, default="Zdjęcia")
-            other_category = get_text("other_category", language, default="Inne")
-            
-            # Ręczna kategoryzacja
-            breakdown = {other_category: 0}
-            for trans in transactions:
-                if trans.get('transaction_type') != 'deduct':
-                    continue
-                    
-                description = trans.get('description', '').lower()
-                amount = trans.get('amount', 0)
-                
-                if any(term in description for term in ['wiadomość', 'message', 'chat', 'gpt']):
-                    if messages_category not in breakdown:
-                        breakdown[messages_category] = 0
-                    breakdown[messages_category] += amount
-                elif any(term in description for term in ['obraz', 'dall-e', 'image', 'dall']):
-                    if images_category not in breakdown:
-                        breakdown[images_category] = 0
-                    breakdown[images_category] += amount
-                elif any(term in description for term in ['dokument', 'document', 'pdf', 'plik']):
-                    if documents_category not in breakdown:
-                        breakdown[documents_category] = 0
-                    breakdown[documents_category] += amount
-                elif any(term in description for term in ['zdjęci', 'zdjęc', 'photo', 'foto']):
-                    if photos_category not in breakdown:
-                        breakdown[photos_category] = 0
-                    breakdown[photos_category] += amount
-                else:
-                    breakdown[other_category] += amount
+        # Nazwy kategorii w odpowiednim języku
+        breakdown = {}
+        for category, spent in usage_by_type.items():
+            label = get_text(f"{category}_category", language, default=CATEGORY_NAMES.get(category, category))
+            breakdown[label] = breakdown.get(label, 0) + spent
         
         return breakdown
     except Exception as e:
@@ -205,96 +123,104 @@ async def get_credit_usage_breakdown(user_id, days=30, language="pl"):
         error_category = get_text("error_category", language, default="Błąd analizy")
         return {error_category: 1}
 
-async def generate_usage_breakdown_chart(user_id, days=30, language="pl"):
-    """Generuje wykres kołowy rozkładu zużycia kredytów z lepszą obsługą błędów"""
-    try:
-        # Dodane await przed wywołaniem funkcji asynchronicznej
-        usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
-        
-        if not usage_breakdown:
-            logger.warning(f"Brak danych rozkładu dla użytkownika {user_id}")
-            # Generujemy prosty wykres informacyjny zamiast zwracać None
-            plt.figure(figsize=(8, 6))
-            plt.text(0.5, 0.5, get_text("no_analysis_data", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=20, color='gray', transform=plt.gca().transAxes)
+async def _render_usage_breakdown_chart(user_id, days, language):
+    usage_breakdown = await get_credit_usage_breakdown(user_id, days, language)
+    
+    if not usage_breakdown:
+        logger.warning(f"Brak danych rozkładu dla użytkownika {user_id}")
+        # Generujemy prosty wykres informacyjny zamiast zwracać None
+        return await get_chart_renderer().render(render_message_chart, get_text("no_analysis_data", language), 'gray', 20, (8, 6))
+    
+    return await get_chart_renderer().render(render_breakdown_chart, {
+        "labels": list(usage_breakdown.keys()),
+        "sizes": list(usage_breakdown.values()),
+        "title": get_text("credit_usage_breakdown_days", language, days=days),
+        "empty_text": get_text("no_credit_usage_transactions", language)
+    })
 
-            plt.gca().set_axis_off()
-            
-            # Zapisz wykres do bufora
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            return buf
-        
-        plt.figure(figsize=(8, 6))
-        
-        labels = list(usage_breakdown.keys())
-        sizes = list(usage_breakdown.values())
-        
-        # Ustaw kolory dla wykresów
-        colors = ['#ff9999', '#66b3ff', '#99ff99', '#ffcc99', '#c2c2f0', '#ffb366', '#ff6666']
-        
-        if sum(sizes) > 0:  # Sprawdź, czy są dane do wykreślenia
-            plt.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90, shadow=True)
-            plt.axis('equal')
-            plt.title(get_text("credit_usage_breakdown_days", language, days=days))
-        else:
-            plt.text(0.5, 0.5, get_text("no_credit_usage_transactions", language), 
-                    horizontalalignment='center', verticalalignment='center', 
-                    fontsize=16, color='gray', transform=plt.gca().transAxes)
-            plt.gca().set_axis_off()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        
-        return buf
+async def generate_usage_breakdown_chart(user_id, days=30, language="pl", cache_key=None):
+    """
+    Generuje wykres kołowy rozkładu zużycia kredytów (obraz PNG renderowany poza pętlą zdarzeń)
     
+    Poprawnie wygenerowany wykres jest zapisywany w cache wykresów pod kluczem cache_key (jeśli podano).
+    """
+    try:
+        png = await _render_usage_breakdown_chart(user_id, days, language)
+    except ChartRenderError as e:
+        logger.error(f"Nie udało się wyrenderować wykresu rozkładu: {e}")
+        return None
     except Exception as e:
         logger.error(f"Błąd przy generowaniu wykresu rozkładu: {e}", exc_info=True)
         # Generujemy wykres błędu
-        plt.figure(figsize=(8, 6))
-        plt.text(0.5, 0.5, get_text("chart_generation_error", language, error=str(e)), 
-                horizontalalignment='center', verticalalignment='center', 
-                fontsize=12, color='red', transform=plt.gca().transAxes)
-        plt.gca().set_axis_off()
-        
-        # Zapisz wykres do bufora
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        plt.close()
-        return buf
+        return await _render_error_chart(get_text("chart_generation_error", language, error=str(e)), figsize=(8, 6))
+    
+    if cache_key is not None:
+        get_chart_cache().put(cache_key, png)
+    return png
+
+# Wykresy wysyłane przez send_credit_chart
+CHART_GENERATORS = {
+    "usage": generate_credit_usage_chart,
+    "breakdown": generate_usage_breakdown_chart,
+}
+
+async def send_credit_chart(bot, chat_id, chart, user_id, days=30, language="pl", caption=None):
+    """
+    Wysyła wykres kredytów ("usage" lub "breakdown"), korzystając z cache wykresów
+    
+    Klucz cache zawiera ostatnią transakcję użytkownika i bieżący dzień, więc wykres jest
+    renderowany ponownie dopiero po nowej transakcji lub zmianie dnia. Po pierwszym
+    wysłaniu ponownie używany jest file_id zwrócony przez Telegram. Gdy nie udało się
+    ustalić ostatniej transakcji, wykres jest renderowany bez użycia cache.
+    
+    Returns:
+        Message: Wysłana wiadomość lub None, jeśli nie udało się wygenerować wykresu
+    """
+    ledger_version = await get_credit_ledger_version(user_id)
+    if ledger_version is None:
+        photo = await CHART_GENERATORS[chart](user_id, days, language)
+        if photo is None:
+            return None
+        return await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)
+    
+    today = datetime.datetime.now(pytz.UTC).date().isoformat()
+    cache_key = (chart, user_id, days, language, ledger_version, today)
+    cache = get_chart_cache()
+    
+    cached = cache.get(cache_key)
+    if cached is not None and cached.file_id:
+        try:
+            return await bot.send_photo(chat_id=chat_id, photo=cached.file_id, caption=caption)
+        except BadRequest as e:
+            if not is_file_id_error(e):
+                raise
+            logger.warning(f"Telegram odrzucił zapisany file_id wykresu: {e}")
+            cache.invalidate(cache_key)
+            cached = None
+    
+    photo = cached.png if cached is not None else None
+    if photo is None:
+        photo = await CHART_GENERATORS[chart](user_id, days, language, cache_key=cache_key)
+        if photo is None:
+            return None
+    
+    message = await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)
+    # Wykresy błędów nie trafiają do cache - zapamiętujemy file_id tylko dla zapisanych
+    if message.photo and cache_key in cache:
+        cache.set_file_id(cache_key, message.photo[-1].file_id)
+    return message
 
 async def predict_credit_depletion(user_id, days=30, language="pl"):
     """Przewiduje, kiedy skończą się kredyty użytkownika z ulepszoną logiką"""
     try:
-        # Bezpośredni import, aby uniknąć problemów z importami cyklicznymi
-        from database.supabase_client import get_credit_transactions
+        daily_usage = await get_credit_daily_usage(user_id, days)
+        current_balance = await get_user_credits(user_id)
         
-        # Używamy await!
-        transactions = await get_credit_transactions(user_id, days)
-        current_balance = get_user_credits(user_id)
-        
-        # Poprawiono logikę sprawdzania danych
-        if not transactions:
-            logger.warning(f"Brak transakcji dla użytkownika {user_id}")
-            return {
-                "days_left": None, 
-                "average_daily_usage": 0, 
-                "current_balance": current_balance,
-                "depletion_date": None
-            }
-        
-        # Wyfiltruj transakcje typu 'deduct'
-        deduct_transactions = [t for t in transactions if t.get('transaction_type') == 'deduct']
+        # Oblicz całkowite zużycie w okresie
+        total_usage = float(_daily_frame(daily_usage, days)['spent'].sum()) if daily_usage else 0
         
         # Jeśli brak transakcji wydatkowych, zwróć None dla days_left
-        if not deduct_transactions:
+        if not total_usage:
             logger.info(f"Brak transakcji wydatkowych dla użytkownika {user_id}")
             return {
                 "days_left": None, 
@@ -303,9 +229,6 @@ async def predict_credit_depletion(user_id, days=30, language="pl"):
                 "depletion_date": None
             }
         
-        # Oblicz całkowite zużycie w okresie
-        total_usage = sum(trans.get('amount', 0) for trans in deduct_transactions)
-        
         # Średnie dzienne zużycie nie może być 0
         average_daily_usage = max(total_usage / days, 0.01)
         
@@ -332,5 +255,5 @@ async def predict_credit_depletion(user_id, days=30, language="pl"):
             "days_left": None,
             "depletion_date": None,
             "average_daily_usage": 0,
-            "current_balance": get_user_credits(user_id)
+            "current_balance": await get_user_credits(user_id)
         }
\ No newline at end of file
@@ -5,8 +5,10 @@ Unified module for menu management and UI handling
 import logging
 from telegram import InlineKeyboardMarkup
 from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
 from utils.translations import get_text
 from utils.user_utils import get_user_language
+from utils.rate_limiter import PRIORITY_HIGH
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +56,9 @@ class MenuState:
             if 'menu_message_id' in user_data:
                 self.set_message_id(user_id, user_data['menu_message_id'])
 
+# Menus are answered before other queued Bot API calls
+MENU_RATE_LIMIT_ARGS = {"priority": PRIORITY_HIGH}
+
 # Create a global instance for tracking menu state
 menu_state = MenuState()
 
@@ -120,26 +125,27 @@ async def update_menu(query, text, keyboard, parse_mode=None):
         
         # Try to update with formatting
         if is_caption:
-            if parse_mode:
-                await query.edit_message_caption(
-                    caption=text, reply_markup=keyboard, parse_mode=parse_mode
-                )
-            else:
-                await query.edit_message_caption(
-                    caption=text, reply_markup=keyboard
-                )
+            await query.edit_message_caption(
+                caption=text, reply_markup=keyboard, parse_mode=parse_mode,
+                rate_limit_args=MENU_RATE_LIMIT_ARGS
+            )
         else:
-            if parse_mode:
-                await query.edit_message_text(
-                    text=text, reply_markup=keyboard, parse_mode=parse_mode
-                )
-            else:
-                await query.edit_message_text(
-                    text=text, reply_markup=keyboard
-                )
+            await query.edit_message_text(
+                text=text, reply_markup=keyboard, parse_mode=parse_mode,
+                rate_limit_args=MENU_RATE_LIMIT_ARGS
+            )
         return True
     
+    except RetryAfter as e:
+        # The rate limiter already retried - further sends would only hit the limit again
+        logger.warning(f"Menu update rate limited: {e}")
+        return False
+    
     except Exception as e:
+        if isinstance(e, BadRequest) and "not modified" in str(e).lower():
+            # The menu already shows this content
+            return True
+        
         logger.error(f"Menu update error: {e}")
         
         # If there was a formatting error, try without formatting
@@ -150,13 +156,16 @@ async def update_menu(query, text, keyboard, parse_mode=None):
                 
                 if is_caption:
                     await query.edit_message_caption(
-                        caption=text, reply_markup=keyboard
+                        caption=text, reply_markup=keyboard, rate_limit_args=MENU_RATE_LIMIT_ARGS
                     )
                 else:
                     await query.edit_message_text(
-                        text=text, reply_markup=keyboard
+                        text=text, reply_markup=keyboard, rate_limit_args=MENU_RATE_LIMIT_ARGS
                     )
                 return True
+            except RetryAfter as e2:
+                logger.warning(f"Menu update rate limited: {e2}")
+                return False
             except Exception as e2:
                 logger.error(f"Second menu update error: {e2}")
         
@@ -169,7 +178,8 @@ async def update_menu(query, text, keyboard, parse_mode=None):
             await query.bot.send_message(
                 chat_id=chat_id,
                 text=text.replace("*", "").replace("_", "").replace("`", "").replace("[", "").replace("]", ""),
-                reply_markup=keyboard
+                reply_markup=keyboard,
+                rate_limit_args=MENU_RATE_LIMIT_ARGS
             )
             return True
         except Exception as e3:
@@ -1,41 +1,40 @@
 # utils/openai_client.py
-from services.api_service import APIService
+from services.api_service import get_api_service
+from utils.token_counter import get_encoding_name, count_tokens, count_message_tokens, get_context_token_budget, MESSAGE_OVERHEAD_TOKENS
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Utworzenie globalnej instancji
-api_service = APIService()
+# Współdzielona instancja serwisu API
+api_service = get_api_service()
 
 # Funkcje kompatybilne ze starym kodem
 async def chat_completion(messages, model=None):
     """Funkcja dla kompatybilności wstecznej"""
     return await api_service.chat_completion_text(messages, model)
 
-async def chat_completion_stream(messages, model=None):
+async def cached_chat_completion(messages, model=None, semantic_partition=None, semantic_text=None, **kwargs):
     """
-    Funkcja dla kompatybilności wstecznej zwracająca asynchroniczny generator
+    Generuje odpowiedź z użyciem cache; zwraca (tekst, czy odpowiedź pochodzi z cache)
+    
+    semantic_partition i semantic_text włączają wyszukiwanie odpowiedzi dla niemal identycznego tekstu
     """
-    # Bezpośrednia implementacja generatora aby obejść problemy z korutynami
-    try:
-        from openai import AsyncOpenAI
-        
-        # Bezpośrednie utworzenie klienta OpenAI
-        from config import OPENAI_API_KEY
-        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
-        
-        response = await client.chat.completions.create(
-            model=model or "gpt-4o",
-            messages=messages,
-            stream=True
-        )
-        
-        async for chunk in response:
-            if chunk.choices and chunk.choices[0].delta.content:
-                yield chunk.choices[0].delta.content
-    except Exception as e:
-        logger.error(f"Błąd w chat_completion_stream: {e}")
-        yield "Wystąpił błąd podczas generowania odpowiedzi."
+    return await api_service.cached_chat_completion_text(
+        messages, model, semantic_partition=semantic_partition, semantic_text=semantic_text, **kwargs
+    )
+
+def chat_completion_stream(messages, model=None, mode=None, use_cache=False):
+    """
+    Zwraca strumień odpowiedzi (iterowany przez async for) z przełączaniem na model zapasowy
+    
+    Po zakończeniu iteracji atrybut model strumienia zawiera model, który faktycznie
+    odpowiedział. Przy use_cache=True odpowiedź może pochodzić z cache (atrybut cached).
+    Błędy (także ModelOverloadedError) są zgłaszane wywołującemu.
+    """
+    # Współdzielony serwis API - bez tworzenia nowego klienta (i połączenia TLS) dla każdej wiadomości
+    if use_cache:
+        return api_service.cached_chat_completion_stream(messages, model or "gpt-4o", mode)
+    return api_service.routed_chat_completion_stream(messages, model or "gpt-4o", mode)
 
 async def generate_image_dall_e(prompt):
     """Funkcja dla kompatybilności wstecznej"""
@@ -49,16 +48,35 @@ async def analyze_image(file_bytes, file_name, mode="analyze", target_language=N
     """Funkcja dla kompatybilności wstecznej"""
     return await api_service.document_service.analyze_image(file_bytes, file_name, mode, target_language)
 
-def prepare_messages_from_history(history, user_message, system_prompt):
+def prepare_messages_from_history(history, user_message, system_prompt, model=None, token_budget=None, summary=None):
     """
     Przygotowuje wiadomości dla API OpenAI na podstawie historii konwersacji
     
-    Wspiera zarówno obiekty Message jak i słowniki
+    Wspiera zarówno obiekty Message jak i słowniki. Historia jest dobierana od najnowszej
+    wiadomości, dopóki mieści się w budżecie tokenów dla danego modelu. Streszczenie
+    wcześniejszej części rozmowy (jeśli podane) trafia do wiadomości systemowej.
     """
+    if summary:
+        system_prompt = f"{system_prompt}\n\nStreszczenie wcześniejszej części rozmowy:\n{summary}"
+    
     messages = [{"role": "system", "content": system_prompt}]
     
+    encoding_name = get_encoding_name(model)
+    budget = get_context_token_budget(model, token_budget)
+    budget -= count_tokens(system_prompt, encoding_name) + MESSAGE_OVERHEAD_TOKENS
+    budget -= count_tokens(user_message, encoding_name) + MESSAGE_OVERHEAD_TOKENS
+    
+    # Wybierz najnowsze wiadomości mieszczące się w budżecie
+    selected = []
+    for msg in reversed(history):
+        tokens = count_message_tokens(msg, encoding_name)
+        if tokens > budget:
+            break
+        budget -= tokens
+        selected.append(msg)
+    
     # Dodaj historię konwersacji
-    for msg in history:
+    for msg in reversed(selected):
         # Sprawdzamy typ obiektu i odpowiednio pobieramy dane
         if hasattr(msg, 'is_from_user') and hasattr(msg, 'content'):
             # Obiekt Message
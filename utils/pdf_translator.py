@@ -5,7 +5,7 @@ import io
 import PyPDF2
 import re
 import logging
-from utils.openai_client import client
+from utils.openai_client import cached_chat_completion
 
 logger = logging.getLogger(__name__)
 
@@ -79,15 +79,17 @@ async def translate_paragraph(text, source_lang="pl", target_lang="en"):
             }
         ]
         
-        # Wyślij zapytanie do API
-        response = await client.chat.completions.create(
+        # Wyślij zapytanie do API (ten sam akapit tłumaczony ponownie pochodzi z cache)
+        translation, _ = await cached_chat_completion(
+            messages,
             model="gpt-4o",  # Używamy GPT-4o dla lepszej jakości tłumaczenia
-            messages=messages,
+            semantic_partition=f"pdf:{source_lang}:{target_lang}",
+            semantic_text=text,
             max_tokens=1500  # Zwiększamy limit tokenów dla dłuższych tekstów
         )
         
         # Zwróć tłumaczenie
-        return response.choices[0].message.content
+        return translation
     
     except Exception as e:
         logger.error(f"Błąd podczas tłumaczenia tekstu: {e}")
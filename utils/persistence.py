@@ -0,0 +1,203 @@
+# utils/persistence.py
+"""
+Trwałe przechowywanie chat_data między restartami bota (SQLite)
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+from config import PERSISTENCE_UPDATE_INTERVAL, PERSISTENCE_FLUSH_DELAY
+
+logger = logging.getLogger(__name__)
+
+# Dane większe niż ten próg (w bajtach) są kompresowane
+COMPRESSION_THRESHOLD = 512
+
+# Pierwszy bajt zapisu określa format danych
+FORMAT_PICKLE = b"p"
+FORMAT_ZLIB_PICKLE = b"z"
+
+def serialize(data: Any) -> bytes:
+    """Serializuje dane do zwartej postaci binarnej (pickle, kompresja zlib dla większych danych)"""
+    payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(payload) > COMPRESSION_THRESHOLD:
+        return FORMAT_ZLIB_PICKLE + zlib.compress(payload)
+    return FORMAT_PICKLE + payload
+
+def deserialize(blob: bytes) -> Any:
+    """Odtwarza dane zapisane przez serialize"""
+    if blob[:1] == FORMAT_ZLIB_PICKLE:
+        return pickle.loads(zlib.decompress(blob[1:]))
+    return pickle.loads(blob[1:])
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persystencja chat_data w bazie SQLite
+
+    Zmiany zgłaszane przez Application są zbierane i zapisywane zbiorczo w jednej transakcji
+    (w osobnym wątku, aby nie blokować pętli zdarzeń). Czaty, których dane nie zmieniły się
+    od ostatniego zapisu (ten sam skrót serializacji), są pomijane.
+    """
+
+    def __init__(self, db_path: str, update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+                 flush_delay: float = PERSISTENCE_FLUSH_DELAY):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=False, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db_path = db_path
+        self.flush_delay = flush_delay
+        self._connection: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        # Skróty ostatnio zapisanych danych - do pomijania zapisów bez zmian
+        self._digests: Dict[int, bytes] = {}
+        # Dane oczekujące na zapis (None oznacza usunięcie)
+        self._pending: Dict[int, Optional[bytes]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        def load():
+            with self._lock:
+                return self._get_connection().execute("SELECT chat_id, data FROM chat_data").fetchall()
+
+        chat_data = {}
+        for chat_id, blob in await asyncio.to_thread(load):
+            try:
+                chat_data[chat_id] = deserialize(blob)
+                self._digests[chat_id] = hashlib.blake2b(blob, digest_size=16).digest()
+            except Exception as e:
+                logger.warning(f"Nie udało się odczytać chat_data czatu {chat_id}: {e}")
+
+        logger.info(f"Wczytano chat_data dla {len(chat_data)} czatów")
+        return chat_data
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        try:
+            blob = serialize(data)
+        except Exception as e:
+            logger.warning(f"Nie udało się zserializować chat_data czatu {chat_id}: {e}")
+            return
+
+        digest = hashlib.blake2b(blob, digest_size=16).digest()
+        if self._digests.get(chat_id) == digest:
+            return
+
+        self._digests[chat_id] = digest
+        self._pending[chat_id] = blob
+        self._schedule_flush()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._digests.pop(chat_id, None)
+        self._pending[chat_id] = None
+        self._schedule_flush()
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        # Jeden proces bota - dane w pamięci są zawsze aktualne
+        pass
+
+    def _schedule_flush(self) -> None:
+        """Planuje zbiorczy zapis wszystkich zmian zgłoszonych w krótkim odstępie czasu"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        await self._write_pending()
+
+    async def _write_pending(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._write, pending)
+        except sqlite3.Error as e:
+            logger.error(f"Błąd zapisu chat_data: {e}")
+            # Niezapisane zmiany wracają do kolejki (chyba że w międzyczasie pojawiły się nowsze)
+            for chat_id, blob in pending.items():
+                self._pending.setdefault(chat_id, blob)
+            for chat_id in pending:
+                self._digests.pop(chat_id, None)
+
+    def _write(self, pending: Dict[int, Optional[bytes]]) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            with connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO chat_data (chat_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(chat_id, blob, now) for chat_id, blob in pending.items() if blob is not None]
+                )
+                connection.executemany(
+                    "DELETE FROM chat_data WHERE chat_id = ?",
+                    [(chat_id,) for chat_id, blob in pending.items() if blob is None]
+                )
+        logger.debug(f"Zapisano chat_data dla {len(pending)} czatów")
+
+    async def flush(self) -> None:
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+        await self._write_pending()
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # Pozostałe rodzaje danych nie są przechowywane (store_data)
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> Dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_user_data(self, user_id: int, data) -> None:
+        pass
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
@@ -0,0 +1,281 @@
+# utils/rate_limiter.py
+"""
+Centralne kolejkowanie wywołań Bot API z limitami Telegrama
+"""
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, Optional
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from utils.cache import TTLCache
+from config import (
+    TELEGRAM_GLOBAL_RATE_LIMIT, TELEGRAM_CHAT_RATE_LIMIT, TELEGRAM_CHAT_BURST,
+    TELEGRAM_GROUP_RATE_LIMIT, TELEGRAM_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# Priorytety wysyłki - niższa wartość jest obsługiwana wcześniej
+PRIORITY_HIGH = 0  # menu i ostateczne odpowiedzi
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # pośrednie edycje odpowiedzi strumieniowych, akcje czatu
+
+# Metody wysyłające lub zmieniające wiadomości, objęte limitami Telegrama
+LIMITED_METHOD_PREFIXES = ("send", "edit", "copy", "forward")
+
+def _retry_after_seconds(error):
+    """Zwraca czas oczekiwania z wyjątku RetryAfter (int lub timedelta zależnie od wersji biblioteki)"""
+    retry_after = error.retry_after
+    if isinstance(retry_after, datetime.timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class TokenBucket:
+    """Kubełek żetonów: rate żetonów na sekundę, maksymalnie capacity naraz"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Zwraca czas (s) do dostępności żetonu; 0, jeśli żeton jest dostępny"""
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """Wstrzymuje wydawanie żetonów (po odpowiedzi 429)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class _QueuedRequest:
+    """Wywołanie Bot API oczekujące w kolejce wysyłki"""
+
+    __slots__ = ("priority", "chat_id", "coalesce_key", "max_retries", "callback", "args", "kwargs",
+                 "futures", "attempts", "dispatched")
+
+    def __init__(self, priority, chat_id, coalesce_key, max_retries, callback, args, kwargs):
+        self.priority = priority
+        self.chat_id = chat_id
+        self.coalesce_key = coalesce_key
+        self.max_retries = max_retries
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.futures = []
+        self.attempts = 0
+        self.dispatched = False
+
+    def resolve(self, result=None, error=None) -> None:
+        for future in self.futures:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Ogranicza wysyłkę do Bot API globalnie i per czat (kubełki żetonów) z kolejką priorytetową
+
+    Wywołania z rate_limit_args={"coalesce": True} (edycje tej samej wiadomości) zastępują
+    oczekujące w kolejce starsze wywołanie - wysyłana jest tylko najnowsza treść. Odpowiedzi
+    429 (RetryAfter) wstrzymują wysyłkę do czatu i wywołanie jest ponawiane.
+
+    Obsługiwane rate_limit_args: priority, coalesce, max_retries.
+    """
+
+    def __init__(self,
+                 global_rate: float = TELEGRAM_GLOBAL_RATE_LIMIT,
+                 chat_rate: float = TELEGRAM_CHAT_RATE_LIMIT,
+                 chat_burst: float = TELEGRAM_CHAT_BURST,
+                 group_rate: float = TELEGRAM_GROUP_RATE_LIMIT,
+                 max_retries: int = TELEGRAM_MAX_RETRIES):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+
+        # Nieużywane przez minutę kubełki są i tak pełne - można je zapomnieć
+        self.chat_buckets = TTLCache(maxsize=100000, ttl=60)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._coalescable: Dict[Any, _QueuedRequest] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._running = set()
+
+    async def initialize(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for _, _, request in self._queue:
+            for future in request.futures:
+                future.cancel()
+        self._queue.clear()
+        self._coalescable.clear()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(LIMITED_METHOD_PREFIXES) or self._worker is None:
+            return await callback(*args, **kwargs)
+
+        options = rate_limit_args or {}
+        chat_id = data.get("chat_id")
+        priority = options.get("priority", PRIORITY_LOW if endpoint == "sendChatAction" else PRIORITY_NORMAL)
+
+        coalesce_key = None
+        if options.get("coalesce"):
+            coalesce_key = (endpoint, chat_id, data.get("message_id"), data.get("inline_message_id"))
+
+        future = asyncio.get_running_loop().create_future()
+
+        pending = self._coalescable.get(coalesce_key) if coalesce_key else None
+        if pending is not None:
+            # Nowsza edycja tej samej wiadomości zastępuje oczekującą
+            pending.callback, pending.args, pending.kwargs = callback, args, kwargs
+            pending.futures.append(future)
+            if priority < pending.priority:
+                pending.priority = priority
+                self._push(pending)
+        else:
+            request = _QueuedRequest(
+                priority, chat_id, coalesce_key, options.get("max_retries", self.max_retries),
+                callback, args, kwargs
+            )
+            request.futures.append(future)
+            self._enqueue(request)
+
+        return await future
+
+    def _enqueue(self, request: _QueuedRequest) -> None:
+        request.dispatched = False
+        if request.coalesce_key:
+            self._coalescable[request.coalesce_key] = request
+        self._push(request)
+
+    def _push(self, request: _QueuedRequest) -> None:
+        heapq.heappush(self._queue, (request.priority, next(self._sequence), request))
+        self._wakeup.set()
+
+    def _get_chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+        self.chat_buckets.set(chat_id, bucket)
+        return bucket
+
+    def _next_request(self):
+        """
+        Wybiera najpilniejsze wywołanie, które można wysłać bez przekroczenia limitów
+
+        Returns:
+            tuple: (wywołanie lub None, czas oczekiwania w sekundach lub None przy pustej kolejce)
+        """
+        global_delay = self.global_bucket.delay()
+        if global_delay > 0:
+            return None, global_delay
+
+        min_delay = None
+        # Wpisy czatów, które muszą jeszcze poczekać - wracają do kolejki po wyborze wywołania
+        blocked = []
+        try:
+            while self._queue:
+                item = heapq.heappop(self._queue)
+                request = item[2]
+                if request.dispatched or item[0] != request.priority:
+                    # Nieaktualny wpis (wywołanie wysłane lub przeniesione na wyższy priorytet)
+                    continue
+
+                bucket = self._get_chat_bucket(request.chat_id) if request.chat_id is not None else None
+                delay = bucket.delay() if bucket else 0.0
+                if delay == 0:
+                    self.global_bucket.consume()
+                    if bucket:
+                        bucket.consume()
+                    return request, None
+
+                blocked.append(item)
+                min_delay = delay if min_delay is None else min(min_delay, delay)
+
+            return None, min_delay
+        finally:
+            for item in blocked:
+                heapq.heappush(self._queue, item)
+
+    async def _run(self) -> None:
+        while True:
+            request, delay = self._next_request()
+            if request is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            request.dispatched = True
+            if request.coalesce_key and self._coalescable.get(request.coalesce_key) is request:
+                del self._coalescable[request.coalesce_key]
+
+            task = asyncio.create_task(self._execute(request))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, request: _QueuedRequest) -> None:
+        try:
+            result = await request.callback(*request.args, **request.kwargs)
+        except RetryAfter as e:
+            retry_after = _retry_after_seconds(e)
+            if request.chat_id is not None:
+                self._get_chat_bucket(request.chat_id).pause(retry_after)
+            else:
+                self.global_bucket.pause(retry_after)
+            self._wakeup.set()
+
+            request.attempts += 1
+            if request.attempts > request.max_retries:
+                request.resolve(error=e)
+                return
+
+            logger.info(f"Limit Telegrama dla czatu {request.chat_id} - ponowienie za {retry_after:.1f} s")
+            newer = self._coalescable.get(request.coalesce_key) if request.coalesce_key else None
+            if newer is not None:
+                # W międzyczasie pojawiła się nowsza edycja - ponowienie starej nie ma sensu
+                newer.futures.extend(request.futures)
+            else:
+                self._enqueue(request)
+        except Exception as e:
+            request.resolve(error=e)
+        else:
+            request.resolve(result)
@@ -0,0 +1,232 @@
+# utils/stream_renderer.py
+"""
+Renderowanie odpowiedzi strumieniowych w wiadomościach Telegrama
+"""
+import asyncio
+import logging
+import time
+from telegram.constants import ParseMode
+from telegram.error import BadRequest, RetryAfter
+from utils.rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, _retry_after_seconds
+from config import (
+    TELEGRAM_MESSAGE_LIMIT, STREAM_EDIT_MIN_INTERVAL, STREAM_EDIT_MAX_INTERVAL, STREAM_FINAL_EDIT_ATTEMPTS
+)
+
+logger = logging.getLogger(__name__)
+
+STREAM_CURSOR = "▌"
+
+def is_markdown_safe(text):
+    """
+    Sprawdza, czy tekst kończy się w miejscu bezpiecznym dla parsera Markdown Telegrama
+
+    Args:
+        text (str): Tekst do sprawdzenia
+
+    Returns:
+        bool: True, jeśli bloki kodu i znaczniki formatowania są domknięte
+    """
+    if text.count("```") % 2:
+        return False
+
+    # Wewnątrz bloków kodu znaczniki formatowania nie są interpretowane
+    outside_code = "".join(text.split("```")[::2])
+    if outside_code.count("`") % 2:
+        return False
+
+    inline_parts = outside_code.split("`")[::2]
+    plain = "".join(inline_parts)
+    if any(plain.count(marker) % 2 for marker in ("*", "_")):
+        return False
+
+    return plain.count("[") == plain.count("]")
+
+def find_split_point(text, limit):
+    """
+    Wyznacza miejsce podziału tekstu przekraczającego limit długości wiadomości
+
+    Preferowany jest koniec akapitu, potem koniec linii, a na końcu spacja.
+
+    Args:
+        text (str): Tekst do podziału
+        limit (int): Maksymalna długość pierwszej części
+
+    Returns:
+        int: Indeks podziału
+    """
+    if len(text) <= limit:
+        return len(text)
+
+    for separator in ("\n\n", "\n", " "):
+        index = text.rfind(separator, 0, limit)
+        # Zbyt wczesny podział marnowałby miejsce w wiadomości
+        if index > limit // 2:
+            return index + len(separator)
+
+    return limit
+
+class StreamRenderer:
+    """
+    Wyświetla odpowiedź generowaną strumieniowo, edytując wiadomość w miarę napływu tekstu
+
+    Częstotliwość edycji dostosowuje się do limitów Telegrama (429 wydłuża odstęp,
+    kolejne udane edycje go skracają), edycje bez zmian tekstu są pomijane, a odpowiedź
+    dłuższa niż limit wiadomości jest kontynuowana w kolejnej wiadomości. Markdown jest
+    wysyłany tylko wtedy, gdy znaczniki są domknięte - w przeciwnym razie zwykły tekst.
+    """
+
+    def __init__(self, message, header="", parse_mode=ParseMode.MARKDOWN,
+                 min_interval=STREAM_EDIT_MIN_INTERVAL, max_interval=STREAM_EDIT_MAX_INTERVAL):
+        """
+        Args:
+            message: Wysłana wcześniej wiadomość bota, w której pojawi się odpowiedź
+            header (str): Nagłówek wyświetlany nad odpowiedzią w pierwszej wiadomości
+            parse_mode: Tryb formatowania odpowiedzi
+            min_interval (float): Minimalny odstęp między edycjami (s)
+            max_interval (float): Maksymalny odstęp między edycjami (s)
+        """
+        self.message = message
+        self.messages = [message]
+        self.header = header
+        self.parse_mode = parse_mode
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+
+        self.interval = min_interval
+        self.text = ""
+        # Początek fragmentu odpowiedzi wyświetlanego w bieżącej wiadomości
+        self.offset = 0
+        self.last_sent = None
+        self.last_edit = 0.0
+        self.blocked_until = 0.0
+
+    @property
+    def prefix(self):
+        """Nagłówek jest wyświetlany tylko w pierwszej wiadomości odpowiedzi"""
+        return self.header if len(self.messages) == 1 else ""
+
+    @property
+    def segment(self):
+        """Fragment odpowiedzi należący do bieżącej wiadomości"""
+        return self.text[self.offset:]
+
+    async def append(self, chunk):
+        """Dodaje fragment odpowiedzi i w razie potrzeby aktualizuje wiadomość"""
+        if not chunk:
+            return
+
+        self.text += chunk
+
+        while len(self.prefix) + len(self.segment) + len(STREAM_CURSOR) > TELEGRAM_MESSAGE_LIMIT:
+            await self._rollover()
+
+        now = time.monotonic()
+        if now < self.blocked_until or now - self.last_edit < self.interval:
+            return
+
+        await self._edit(self.prefix + self.segment + STREAM_CURSOR, final=False)
+
+    async def finish(self):
+        """
+        Wyświetla ostateczną postać odpowiedzi (bez kursora)
+
+        Returns:
+            str: Pełna treść odpowiedzi
+        """
+        await self._deliver(self.prefix + self.segment)
+        return self.text
+
+    async def _rollover(self):
+        """Zamyka bieżącą wiadomość i kontynuuje odpowiedź w nowej"""
+        limit = TELEGRAM_MESSAGE_LIMIT - len(self.prefix) - len(STREAM_CURSOR)
+        split = find_split_point(self.segment, limit)
+
+        await self._deliver(self.prefix + self.segment[:split])
+        self.offset += split
+
+        continuation = self.segment[:limit] + STREAM_CURSOR
+        self.message = await self._send_continuation(continuation)
+        self.messages.append(self.message)
+        self.last_sent = continuation
+        self.last_edit = time.monotonic()
+
+    async def _send_continuation(self, text):
+        """Wysyła nową wiadomość kontynuującą odpowiedź, czekając na limit w razie 429"""
+        while True:
+            try:
+                return await self.message.get_bot().send_message(
+                    chat_id=self.message.chat_id, text=text, rate_limit_args={"priority": PRIORITY_HIGH}
+                )
+            except RetryAfter as e:
+                await self._wait_retry_after(e)
+
+    async def _deliver(self, text):
+        """Edytuje wiadomość do ostatecznej postaci, ponawiając próbę po 429"""
+        for _ in range(STREAM_FINAL_EDIT_ATTEMPTS):
+            delay = self.blocked_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if await self._edit(text, final=True):
+                return
+        logger.warning("Nie udało się dostarczyć ostatecznej treści odpowiedzi strumieniowej")
+
+    async def _edit(self, text, final):
+        """
+        Edytuje bieżącą wiadomość
+
+        Returns:
+            bool: True, jeśli wiadomość ma aktualną treść
+        """
+        if not text.strip() or text == self.last_sent:
+            return True
+
+        # W trakcie strumieniowania kursor nie wpływa na poprawność znaczników
+        parse_mode = self.parse_mode if is_markdown_safe(text.rstrip(STREAM_CURSOR)) else None
+
+        try:
+            await self._edit_text(text, parse_mode, final)
+        except RetryAfter as e:
+            self._on_rate_limited(e)
+            return False
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                self.last_sent = text
+                return True
+            logger.debug(f"Błąd edycji wiadomości strumieniowej: {e}")
+            if not parse_mode:
+                return False
+            # Tekst, którego Telegram nie przyjął jako Markdown, wysyłamy bez formatowania
+            try:
+                await self._edit_text(text, None, final)
+            except RetryAfter as retry_error:
+                self._on_rate_limited(retry_error)
+                return False
+            except BadRequest as plain_error:
+                logger.debug(f"Błąd edycji wiadomości strumieniowej bez formatowania: {plain_error}")
+                return False
+
+        self.last_sent = text
+        self.last_edit = time.monotonic()
+        if not final:
+            # Udane edycje stopniowo przywracają minimalny odstęp
+            self.interval = max(self.min_interval, self.interval * 0.9)
+        return True
+
+    async def _edit_text(self, text, parse_mode, final):
+        if final:
+            rate_limit_args = {"priority": PRIORITY_HIGH}
+        else:
+            # Pośrednia edycja jest zastępowana przez kolejną, a 429 ma spowolnić renderowanie
+            rate_limit_args = {"priority": PRIORITY_LOW, "coalesce": True, "max_retries": 0}
+        await self.message.edit_text(text, parse_mode=parse_mode, rate_limit_args=rate_limit_args)
+
+    def _on_rate_limited(self, error):
+        """Wstrzymuje edycje na czas wskazany przez Telegram i wydłuża odstęp między nimi"""
+        retry_after = _retry_after_seconds(error)
+        self.blocked_until = time.monotonic() + retry_after
+        self.interval = min(self.max_interval, max(self.interval * 2, self.min_interval))
+        logger.info(f"Limit edycji Telegrama - wstrzymanie na {retry_after:.1f} s, nowy odstęp {self.interval:.1f} s")
+
+    async def _wait_retry_after(self, error):
+        self._on_rate_limited(error)
+        await asyncio.sleep(max(0.0, self.blocked_until - time.monotonic()))
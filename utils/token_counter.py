@@ -0,0 +1,118 @@
+# utils/token_counter.py
+"""
+Liczenie tokenów dla modeli OpenAI i Claude
+"""
+import logging
+from functools import lru_cache
+from config import MODEL_CONTEXT_WINDOWS, CONTEXT_TOKEN_BUDGET, RESPONSE_TOKEN_RESERVE
+
+logger = logging.getLogger(__name__)
+
+# tiktoken jest opcjonalny - bez niego używamy przybliżenia na podstawie liczby znaków
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+    logger.warning("Brak biblioteki tiktoken - liczba tokenów będzie szacowana")
+
+# Narzut formatu czatu na każdą wiadomość (rola, separatory)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Średnia liczba znaków na token używana, gdy nie ma dokładnego tokenizera
+CHARS_PER_TOKEN = {
+    "claude": 3.5,
+    "default": 4.0
+}
+
+def get_encoding_name(model):
+    """
+    Zwraca nazwę tokenizera dla modelu
+
+    Args:
+        model (str): Identyfikator modelu z config.AVAILABLE_MODELS
+
+    Returns:
+        str: Nazwa kodowania (np. o200k_base, cl100k_base, claude)
+    """
+    if not model:
+        return "o200k_base"
+    if model.startswith("claude"):
+        # Anthropic nie udostępnia lokalnego tokenizera dla modeli Claude 3
+        return "claude"
+    if model.startswith("gpt-4o") or model.startswith("o1") or model.startswith("o3"):
+        return "o200k_base"
+    return "cl100k_base"
+
+@lru_cache(maxsize=None)
+def _get_tiktoken_encoding(encoding_name):
+    """Ładuje (jednorazowo) kodowanie tiktoken"""
+    if tiktoken is None or encoding_name == "claude":
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        logger.warning(f"Nie udało się załadować kodowania {encoding_name}: {e}")
+        return None
+
+def count_tokens(text, encoding_name):
+    """
+    Liczy tokeny tekstu dla podanego kodowania
+
+    Args:
+        text (str): Tekst
+        encoding_name (str): Nazwa kodowania z get_encoding_name
+
+    Returns:
+        int: Liczba tokenów
+    """
+    if not text:
+        return 0
+
+    encoding = _get_tiktoken_encoding(encoding_name)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+
+    chars_per_token = CHARS_PER_TOKEN.get(encoding_name, CHARS_PER_TOKEN["default"])
+    return int(len(text) / chars_per_token) + 1
+
+def count_message_tokens(message, encoding_name):
+    """
+    Liczy tokeny wiadomości z historii, zapamiętując wynik w obiekcie Message
+
+    Args:
+        message: Obiekt Message lub słownik z polem content
+        encoding_name (str): Nazwa kodowania
+
+    Returns:
+        int: Liczba tokenów wraz z narzutem formatu
+    """
+    token_counts = getattr(message, 'token_counts', None)
+    if token_counts and encoding_name in token_counts:
+        return token_counts[encoding_name] + MESSAGE_OVERHEAD_TOKENS
+
+    if hasattr(message, 'content'):
+        content = message.content
+    else:
+        content = message.get("content", "")
+
+    tokens = count_tokens(content, encoding_name)
+
+    if token_counts is not None:
+        token_counts[encoding_name] = tokens
+
+    return tokens + MESSAGE_OVERHEAD_TOKENS
+
+def get_context_token_budget(model, token_budget=None):
+    """
+    Zwraca budżet tokenów na prompt dla modelu
+
+    Args:
+        model (str): Identyfikator modelu
+        token_budget (int, optional): Budżet żądany przez wywołującego
+
+    Returns:
+        int: Budżet nieprzekraczający okna kontekstu modelu
+    """
+    budget = token_budget or CONTEXT_TOKEN_BUDGET
+    context_window = MODEL_CONTEXT_WINDOWS.get(model, MODEL_CONTEXT_WINDOWS["default"])
+    return min(budget, context_window - RESPONSE_TOKEN_RESERVE)
@@ -332,6 +332,7 @@ translations = {
         "photo_analysis": "Analiza zdjęcia",
         "image_generation": "Generowanie obrazu",
         "openai_response_error": "Przepraszam, wystąpił błąd podczas generowania odpowiedzi: {error}",
+        "model_overloaded": "Model jest teraz przeciążony. Spróbuj ponownie za chwilę lub wybierz inny model - kredyty nie zostały pobrane.",
         "conversation_error": "Wystąpił błąd przy pobieraniu konwersacji. Spróbuj /newchat aby utworzyć nową.",
         "message_model": "Wiadomość ({model})",
         "response_error": "Wystąpił błąd podczas generowania odpowiedzi: {error}",
@@ -799,6 +800,7 @@ translations = {
         "photo_analysis": "Photo analysis",
         "image_generation": "Image generation",
         "openai_response_error": "Sorry, an error occurred while generating a response: {error}",
+        "model_overloaded": "The model is overloaded right now. Please try again in a moment or choose another model - no credits were charged.",
         "conversation_error": "An error occurred while retrieving the conversation. Try /newchat to create a new one.",
         "message_model": "Message ({model})",
         "response_error": "An error occurred while generating the response: {error}",
@@ -1266,6 +1268,7 @@ translations = {
         "photo_analysis": "Анализ фото",
         "image_generation": "Генерация изображения",
         "openai_response_error": "Извините, произошла ошибка при генерации ответа: {error}",
+        "model_overloaded": "Модель сейчас перегружена. Попробуйте ещё раз через минуту или выберите другую модель - кредиты не списаны.",
         "conversation_error": "Произошла ошибка при получении разговора. Попробуйте /newchat, чтобы создать новый.",
         "message_model": "Сообщение ({model})",
         "response_error": "Произошла ошибка при генерации ответа: {error}",
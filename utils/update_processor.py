@@ -0,0 +1,71 @@
+# utils/update_processor.py
+"""
+Współbieżne przetwarzanie aktualizacji Telegrama z zachowaniem kolejności w obrębie użytkownika
+"""
+import logging
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Przetwarza aktualizacje różnych użytkowników równolegle (do max_concurrent_updates naraz),
+    a aktualizacje jednego użytkownika/czatu - po kolei, w kolejności otrzymania
+
+    Aktualizacje użytkownika, dla którego trwa już przetwarzanie, trafiają do jego kolejki
+    i zwalniają miejsce w globalnym limicie - seria wiadomości jednego użytkownika zajmuje
+    jedno miejsce i nie blokuje pozostałych użytkowników.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # klucz -> aktualizacje czekające na zakończenie bieżącej
+        self._pending: Dict[Any, Deque[Awaitable[Any]]] = {}
+
+    @staticmethod
+    def _get_key(update: object) -> Optional[Any]:
+        """Zwraca klucz kolejkowania: ID użytkownika, a w razie jego braku ID czatu"""
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return ('user', user.id)
+        chat = getattr(update, 'effective_chat', None)
+        if chat is not None:
+            return ('chat', chat.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        # process_update (oznaczone w PTB jako final) pilnuje globalnego limitu
+        key = self._get_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            # Aktualizację wykona trwające już przetwarzanie tego użytkownika
+            pending.append(coroutine)
+            return
+
+        pending = self._pending[key] = deque()
+        try:
+            while coroutine is not None:
+                try:
+                    await coroutine
+                except Exception as e:
+                    logger.error(f"Błąd przetwarzania aktualizacji ({key}): {e}")
+                coroutine = pending.popleft() if pending else None
+        finally:
+            del self._pending[key]
+            # Przerwane przetwarzanie (np. zamknięcie bota) - pozostałe aktualizacje nie zostaną wykonane
+            for queued in pending:
+                close = getattr(queued, 'close', None)
+                if close is not None:
+                    close()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
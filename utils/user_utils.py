@@ -1,9 +1,35 @@
 # utils/user_utils.py
-from database.supabase_client import supabase
+from services.user_profile_service import get_user_profile_service
+
+def apply_user_profile(context, user_id, profile):
+    """
+    Przenosi ustawienia z profilu użytkownika do kontekstu, nie nadpisując bieżących
+    
+    Args:
+        context: Kontekst bota
+        user_id: ID użytkownika
+        profile: Profil użytkownika (UserProfile)
+    """
+    if context.chat_data is None:
+        return
+    
+    if 'user_data' not in context.chat_data:
+        context.chat_data['user_data'] = {}
+    
+    if user_id not in context.chat_data['user_data']:
+        context.chat_data['user_data'][user_id] = {}
+    
+    user_data = context.chat_data['user_data'][user_id]
+    
+    # Do kontekstu trafia tylko język wybrany w bocie - język klienta Telegram jest jedynie podpowiedzią
+    for key in ('language', 'current_mode', 'current_model'):
+        value = getattr(profile, key)
+        if value and key not in user_data:
+            user_data[key] = value
 
 def get_user_language(context, user_id):
     """
-    Pobiera język użytkownika z kontekstu lub bazy danych
+    Pobiera język użytkownika z kontekstu lub cache profili (bez zapytań do bazy)
     
     Args:
         context: Kontekst bota
@@ -13,49 +39,37 @@ def get_user_language(context, user_id):
         str: Kod języka (pl, en, ru)
     """
     # Sprawdź, czy język jest zapisany w kontekście
-    if 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
+    if context.chat_data and 'user_data' in context.chat_data and user_id in context.chat_data['user_data'] and 'language' in context.chat_data['user_data'][user_id]:
         return context.chat_data['user_data'][user_id]['language']
     
-    # Jeśli nie, pobierz z bazy danych
-    try:
-        response = supabase.table('users').select('language, language_code').eq('id', user_id).execute()
-        
-        if response.data:
-            user_data = response.data[0]
-            
-            # Najpierw sprawdź pole language
-            if user_data.get('language'):
-                language = user_data.get('language')
-                
-                # Zapisz w kontekście na przyszłość
-                if 'user_data' not in context.chat_data:
-                    context.chat_data['user_data'] = {}
-                
-                if user_id not in context.chat_data['user_data']:
-                    context.chat_data['user_data'][user_id] = {}
-                
-                context.chat_data['user_data'][user_id]['language'] = language
-                return language
-                
-            # Jeśli language nie znaleziono, sprawdź language_code
-            if user_data.get('language_code'):
-                language_code = user_data.get('language_code')
-                
-                # Zapisz w kontekście na przyszłość
-                if 'user_data' not in context.chat_data:
-                    context.chat_data['user_data'] = {}
-                
-                if user_id not in context.chat_data['user_data']:
-                    context.chat_data['user_data'][user_id] = {}
-                
-                context.chat_data['user_data'][user_id]['language'] = language_code
-                return language_code
-    except Exception as e:
-        print(f"Błąd pobierania języka z bazy: {e}")
+    # Jeśli nie, skorzystaj z profilu wczytanego przez prefetch_user_profile
+    profile = get_user_profile_service().peek(user_id)
+    if profile and profile.preferred_language:
+        apply_user_profile(context, user_id, profile)
+        return profile.preferred_language
     
     # Domyślny język, jeśli wszystkie metody zawiodły
     return "pl"
 
+async def prefetch_user_profile(update, context):
+    """
+    Wczytuje profil użytkownika przed obsługą aktualizacji
+    
+    Rejestrowana jako pierwsza grupa handlerów - profile nowych użytkowników
+    są pobierane zbiorczo, a get_user_language korzysta już tylko z pamięci.
+    """
+    user = update.effective_user
+    if user is None or context.chat_data is None:
+        return
+    
+    user_data = context.chat_data.get('user_data', {}).get(user.id, {})
+    if 'language' in user_data:
+        return
+    
+    profile = await get_user_profile_service().get(user.id)
+    if profile:
+        apply_user_profile(context, user.id, profile)
+
 def mark_chat_initialized(context, user_id):
     """
     Oznacza czat jako zainicjowany przez użytkownika.